@@ -121,13 +121,14 @@ LIMIT 5;
        - **Зачем:** Это переносит всю вычислительную нагрузку с операции чтения (SELECT)
          на фоновый процесс. Запрос топа товаров превращается в простейший `SELECT` из
          маленькой, уже посчитанной таблицы, что обеспечивает максимальную скорость.
-       - **Как:** Реализовано с помощью таблицы `daily_product_sales` и функции `refresh_daily_sales`,
-         которую вызывает периодический сервис `etl-cron` в Docker.
+       - **Как:** Реализовано с помощью таблиц `hourly_product_sales` и `daily_product_sales` и функции
+         `refresh_sales_rollups`, которую сервис периодически вызывает фоновой задачей
+         (service/jobs/rollups.py): пересчитываются только часы с изменившимися заказами.
 */
 
 -- Благодаря Денормализация и ETL-процесс у нас новый, молниеносный запрос для "Топ-5 за последний месяц",
 -- использующий предварительно агрегированные данные из витрины.
--- данные отличаются потому что он берет данные за вчерашний день
+-- данные могут отставать на интервал пересчета витрин (SALES_ROLLUP_INTERVAL)
 SELECT
     p.name AS product_name,
     -- Мы больше не соединяем 5 таблиц, а берем готовые данные
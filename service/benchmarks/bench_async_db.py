@@ -0,0 +1,66 @@
+"""
+Бенчмарк пропускной способности GET /products/ и POST /orders/{id}/items.
+
+Для сравнения "до/после" запустите его дважды: против сервиса, собранного из коммита
+с синхронными обработчиками (psycopg2 + SimpleConnectionPool), и против текущего
+асинхронного (psycopg3 + AsyncConnectionPool), с одинаковыми --concurrency и --duration.
+
+    python -m benchmarks.bench_async_db --base-url http://localhost:8000 --concurrency 100
+"""
+import asyncio
+
+import httpx
+
+from benchmarks.common import base_arg_parser, print_report, run_load
+
+PRODUCTS_IN_POOL = 50
+
+
+async def _prepare(client: httpx.AsyncClient, concurrency: int):
+    """Создает клиента, набор товаров с большим остатком и по одному заказу на воркер."""
+    client_id = (await client.post("/clients/", json={"name": "Bench Client", "address": "Bench"})).json()["id"]
+    category_id = (await client.post("/categories/", json={"name": f"Bench {id(client)}"})).json()["id"]
+    product_ids = []
+    for i in range(PRODUCTS_IN_POOL):
+        response = await client.post("/products/", json={
+            "name": f"Bench Product {i}",
+            "price": 10,
+            "category_id": category_id,
+            "initial_stock": 1_000_000,
+        })
+        product_ids.append(response.json()["id"])
+    order_ids = []
+    for _ in range(concurrency):
+        response = await client.post("/orders/", json={"client_id": client_id})
+        order_ids.append(response.json()["id"])
+    return product_ids, order_ids
+
+
+async def main():
+    args = base_arg_parser(__doc__).parse_args()
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        product_ids, order_ids = await _prepare(client, args.concurrency)
+
+        stats = await run_load(
+            lambda worker_id: client.get("/products/", params={"limit": 100}),
+            args.concurrency, args.duration,
+        )
+        print_report("GET /products/?limit=100", stats)
+
+        counters = [0] * args.concurrency
+
+        def add_item(worker_id: int):
+            counters[worker_id] += 1
+            product_id = product_ids[(worker_id + counters[worker_id]) % len(product_ids)]
+            return client.post(
+                f"/orders/{order_ids[worker_id]}/items",
+                json={"product_id": product_id, "quantity": 1},
+            )
+
+        stats = await run_load(add_item, args.concurrency, args.duration)
+        print_report("POST /orders/{id}/items", stats)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
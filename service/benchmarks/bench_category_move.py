@@ -0,0 +1,77 @@
+"""
+Бенчмарк перемещения ветки категорий через PATCH /categories/{id}.
+
+Строит ветку из --categories узлов (как bench_category_subtree) и --repeats раз
+перемещает ее под другой корень и обратно в корень. Для сравнения тот же перенос выполняется
+"наивно" - отдельным UPDATE на каждый узел поддерева (в откатываемой транзакции).
+
+    python -m benchmarks.bench_category_move --categories 10000
+"""
+import argparse
+import os
+import statistics
+import time
+
+import httpx
+import psycopg
+from dotenv import load_dotenv
+
+from benchmarks.bench_category_subtree import _cleanup, _populate
+
+load_dotenv()
+
+
+def _naive_move_ms(conn: psycopg.Connection, branch_id: int, parent_id: int) -> float:
+    """Переписывает путь каждого узла отдельным запросом, как без set-based UPDATE."""
+    started = time.perf_counter()
+    with conn.transaction(force_rollback=True):
+        parent_path, branch_path = conn.execute(
+            "SELECT (SELECT path::text FROM categories WHERE id = %s), (SELECT path::text FROM categories WHERE id = %s)",
+            (parent_id, branch_id),
+        ).fetchone()
+        nodes = conn.execute("SELECT id, path::text FROM categories WHERE path <@ %s::ltree", (branch_path,)).fetchall()
+        prefix = branch_path.rsplit(".", 1)[0] if "." in branch_path else ""
+        with conn.cursor() as cursor:
+            for node_id, path in nodes:
+                new_path = parent_path + path[len(prefix):] if prefix else f"{parent_path}.{path}"
+                cursor.execute("UPDATE categories SET path = %s::ltree WHERE id = %s", (new_path, node_id))
+        conn.execute("UPDATE categories SET parent_id = %s WHERE id = %s", (parent_id, branch_id))
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--categories", type=int, default=10_000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    with psycopg.connect(args.database_url) as conn, httpx.Client(base_url=args.base_url, timeout=60) as client:
+        branch_id = _populate(conn, args.categories, args.fanout, 0)
+        target_id = client.post("/categories/", json={"name": "bench-move-target"}).json()["id"]
+        try:
+            size = conn.execute(
+                "SELECT count(*) FROM categories WHERE path <@ (SELECT path FROM categories WHERE id = %s)", (branch_id,)
+            ).fetchone()[0]
+
+            samples = []
+            for i in range(args.repeats):
+                parent_id = target_id if i % 2 == 0 else None
+                started = time.perf_counter()
+                client.patch(f"/categories/{branch_id}", json={"parent_id": parent_id}).raise_for_status()
+                samples.append((time.perf_counter() - started) * 1000)
+            naive = [_naive_move_ms(conn, branch_id, target_id) for _ in range(max(1, args.repeats // 5))]
+
+            print(f"branch size: {size} nodes")
+            print(f"PATCH (one UPDATE):   median {statistics.median(samples):10.1f} ms")
+            print(f"row-by-row UPDATE:    median {statistics.median(naive):10.1f} ms")
+        finally:
+            _cleanup(conn, branch_id)
+            conn.execute("DELETE FROM categories WHERE id = %s", (target_id,))
+            conn.commit()
+
+
+if __name__ == "__main__":
+    main()
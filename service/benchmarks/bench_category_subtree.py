@@ -0,0 +1,144 @@
+"""
+Бенчмарк чтения поддерева категорий на большом дереве.
+
+Создает отдельную ветку из --categories категорий (по --fanout детей на узел) и
+--products товаров, размазанных по ее узлам, после чего замеряет медианную задержку
+GET /categories/{id}/subtree и GET /categories/{id}/products для узлов разной глубины.
+Для сравнения приводится полная выгрузка /categories/tree - то, что фронтенд
+скачивал раньше. В конце ветка удаляется (если не передан --keep).
+
+    python -m benchmarks.bench_category_subtree --categories 50000 --products 200000
+"""
+import argparse
+import os
+import statistics
+import time
+
+import httpx
+import psycopg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT_NAME = "bench-subtree-root"
+
+
+def _populate(conn: psycopg.Connection, categories: int, fanout: int, products: int) -> int:
+    """Строит ветку уровень за уровнем и раскладывает товары по ее узлам."""
+    root_id = conn.execute(
+        """
+        WITH n AS (SELECT nextval(pg_get_serial_sequence('categories', 'id')) AS id)
+        INSERT INTO categories (id, name, path)
+        SELECT id, %s, id::text::ltree FROM n
+        RETURNING id
+        """,
+        (ROOT_NAME,),
+    ).fetchone()[0]
+    level, created = [root_id], 1
+    while created < categories:
+        width = min(len(level) * fanout, categories - created)
+        level = [row[0] for row in conn.execute(
+            """
+            WITH parents AS (SELECT id, path FROM categories WHERE id = ANY(%s)),
+            children AS (
+                SELECT nextval(pg_get_serial_sequence('categories', 'id')) AS id, p.id AS parent_id, p.path
+                FROM parents p, generate_series(1, %s)
+                LIMIT %s
+            )
+            INSERT INTO categories (id, name, parent_id, path)
+            SELECT id, 'bench-' || id, parent_id, path || id::text FROM children
+            RETURNING id
+            """,
+            (level, fanout, width),
+        ).fetchall()]
+        created += width
+    conn.execute(
+        """
+        WITH cats AS (
+            SELECT array_agg(c.id) AS ids FROM categories r JOIN categories c ON c.path <@ r.path WHERE r.id = %s
+        ),
+        new_products AS (
+            INSERT INTO products (name, price, category_id)
+            SELECT 'bench-product-' || g, 1 + g %% 1000, cats.ids[1 + g %% cardinality(cats.ids)]
+            FROM cats, generate_series(1, %s) AS g
+            RETURNING id
+        )
+        INSERT INTO inventory (product_id, stock)
+        SELECT id, CASE WHEN id %% 3 = 0 THEN 0 ELSE 10 END FROM new_products
+        """,
+        (root_id, products),
+    )
+    conn.execute("ANALYZE categories")
+    conn.execute("ANALYZE products")
+    conn.execute("ANALYZE inventory")
+    conn.commit()
+    return root_id
+
+
+def _cleanup(conn: psycopg.Connection, root_id: int):
+    conn.execute(
+        """
+        DELETE FROM products WHERE category_id IN (
+            SELECT c.id FROM categories r JOIN categories c ON c.path <@ r.path WHERE r.id = %s
+        )
+        """,
+        (root_id,),
+    )
+    conn.execute("DELETE FROM categories WHERE id = %s", (root_id,))
+    conn.commit()
+
+
+def _median_ms(client: httpx.Client, url: str, params: dict, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        client.get(url, params=params).raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--categories", type=int, default=50_000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="Не удалять созданную ветку")
+    args = parser.parse_args()
+
+    with psycopg.connect(args.database_url) as conn, httpx.Client(base_url=args.base_url, timeout=60) as client:
+        root_id = _populate(conn, args.categories, args.fanout, args.products)
+        try:
+            # По одному узлу с каждой глубины: корень ветки, его первый ребенок и т.д.
+            targets = conn.execute(
+                """
+                SELECT DISTINCT ON (nlevel(c.path)) c.id, nlevel(c.path) - nlevel(r.path) AS depth,
+                       (SELECT count(*) FROM categories d WHERE d.path <@ c.path) AS size
+                FROM categories r JOIN categories c ON c.path <@ r.path
+                WHERE r.id = %s
+                ORDER BY nlevel(c.path), c.id
+                """,
+                (root_id,),
+            ).fetchall()
+
+            print(f"{'endpoint':<32}{'depth':>6}{'nodes':>8}{'median ms':>12}")
+            full_tree_ms = _median_ms(client, "/categories/tree", {}, args.repeats)
+            print(f"{'/categories/tree':<32}{'-':>6}{'-':>8}{full_tree_ms:>12.2f}")
+            for category_id, depth, size in targets:
+                for label, url, params in (
+                    ("subtree", f"/categories/{category_id}/subtree", {}),
+                    ("subtree?max_depth=1", f"/categories/{category_id}/subtree", {"max_depth": 1}),
+                    ("products?limit=100", f"/categories/{category_id}/products", {"limit": 100}),
+                    ("products?in_stock=true", f"/categories/{category_id}/products", {"in_stock": True}),
+                ):
+                    elapsed = _median_ms(client, url, params, args.repeats)
+                    print(f"{label:<32}{depth:>6}{size:>8}{elapsed:>12.2f}")
+        finally:
+            if not args.keep:
+                _cleanup(conn, root_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Бенчмарк распродажи: --buyers параллельных покупателей берут по одной штуке одного товара.
+
+Покупатели вызывают обработчик add_item_to_order напрямую, каждый на своем соединении
+с БД, минуя HTTP: генератор HTTP-нагрузки на одной машине упирается в CPU раньше, чем
+проявляется очередь за блокировкой строки остатка. Прогон выполняется дважды: с обычным
+остатком (одна строка inventory) и в режиме горячего товара (--shards шардов). После
+каждого прогона проверяется, что начальный остаток минус проданное равен текущему.
+Нужно max_connections >= --buyers + несколько служебных соединений:
+
+    python -m benchmarks.bench_hot_sku --buyers 200 --shards 32 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import psycopg
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from benchmarks.common import percentile
+from routes.order_router import add_item_to_order
+from schemas.order import OrderItemCreate
+
+load_dotenv()
+
+INITIAL_STOCK = 10_000_000
+
+
+def _prepare(database_url: str, buyers: int, shards: int) -> tuple[int, list[int]]:
+    with psycopg.connect(database_url) as conn:
+        client_id = conn.execute(
+            "INSERT INTO clients (name, address) VALUES ('Flash Buyer', 'Flash St') RETURNING id"
+        ).fetchone()[0]
+        category_id = conn.execute(
+            "INSERT INTO categories (name, path) VALUES ('Flash Sale', 'tmp') RETURNING id"
+        ).fetchone()[0]
+        conn.execute("UPDATE categories SET path = id::text::ltree WHERE id = %s", (category_id,))
+        product_id = conn.execute(
+            "INSERT INTO products (name, price, category_id) VALUES ('Flash SKU', 10, %s) RETURNING id", (category_id,)
+        ).fetchone()[0]
+        conn.execute(
+            "INSERT INTO inventory (product_id, stock, shard_count) VALUES (%s, %s, %s)",
+            (product_id, INITIAL_STOCK, shards),
+        )
+        conn.execute("SELECT rebalance_inventory(%s)", (product_id,))
+        order_ids = [row[0] for row in conn.execute(
+            "INSERT INTO orders (client_id) SELECT %s FROM generate_series(1, %s) RETURNING id", (client_id, buyers)
+        ).fetchall()]
+    return product_id, order_ids
+
+
+def _cleanup(database_url: str, product_id: int, order_ids: list[int]):
+    with psycopg.connect(database_url) as conn:
+        sold = conn.execute("SELECT COALESCE(SUM(qty), 0) FROM order_items WHERE product_id = %s", (product_id,)).fetchone()[0]
+        stock = conn.execute("SELECT stock FROM inventory_stock WHERE product_id = %s", (product_id,)).fetchone()[0]
+        category_id, client_id = conn.execute(
+            "SELECT p.category_id, o.client_id FROM products p, orders o WHERE p.id = %s AND o.id = %s",
+            (product_id, order_ids[0]),
+        ).fetchone()
+        conn.execute("DELETE FROM orders WHERE id = ANY(%s)", (order_ids,))
+        conn.execute("DELETE FROM products WHERE id = %s", (product_id,))
+        conn.execute("DELETE FROM categories WHERE id = %s", (category_id,))
+        conn.execute("DELETE FROM clients WHERE id = %s", (client_id,))
+    return sold, stock
+
+
+async def _buyer(database_url: str, order_id: int, product_id: int, deadline: float, latencies: list, errors: list):
+    item = OrderItemCreate(product_id=product_id, quantity=1)
+    async with await psycopg.AsyncConnection.connect(database_url) as conn:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await add_item_to_order(order_id, item, conn)
+                await conn.commit()
+            except (HTTPException, psycopg.Error):
+                await conn.rollback()
+                errors.append(1)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def _run(args, shards: int):
+    product_id, order_ids = _prepare(args.database_url, args.buyers, shards)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _buyer(args.database_url, order_id, product_id, deadline, latencies, errors) for order_id in order_ids
+    ))
+    elapsed = time.perf_counter() - started
+    sold, stock = _cleanup(args.database_url, product_id, order_ids)
+
+    label = f"{args.buyers} buyers, " + (f"{shards} shards" if shards else "single row")
+    print(
+        f"{label:<28} {len(latencies) / elapsed:>8.1f} tx/s  p50={percentile(latencies, 50):.1f}ms "
+        f"p95={percentile(latencies, 95):.1f}ms p99={percentile(latencies, 99):.1f}ms  errors={len(errors)}  "
+        f"consistent={INITIAL_STOCK - sold == stock}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--buyers", type=int, default=200)
+    parser.add_argument("--shards", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+    await _run(args, 0)
+    await _run(args, args.shards)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Бенчмарк накладных расходов метрик (без сети и БД, чтобы шум не перекрывал микросекунды).
+
+1. ASGI-приложение, которое сразу отвечает 200, вызывается --requests раз напрямую:
+   без MetricsMiddleware и с ним. Разница - стоимость middleware на запрос.
+2. Учет одного SQL-запроса так, как его делает InstrumentedCursor: отпечаток
+   (повторный запрос - поиск в словаре), гистограмма времени и счетчик строк.
+
+    python -m benchmarks.bench_metrics --requests 200000
+"""
+import argparse
+import asyncio
+import time
+
+from db.session import DB_STATEMENT_DURATION, DB_STATEMENT_ROWS, statement_fingerprint
+from utils.metrics import MetricsMiddleware
+
+
+class _Route:
+    path = "/orders/{order_id}"
+
+
+async def _app(scope, receive, send):
+    # Как маршрутизатор FastAPI: шаблон маршрута попадает в scope.
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def _per_request_us(app, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app({"type": "http", "method": "GET", "path": "/orders/1"}, _receive, _send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def _statement_us(statements: int) -> float:
+    query = "SELECT id, client_id, status, created_at FROM orders WHERE id = %s"
+    started = time.perf_counter()
+    for _ in range(statements):
+        fingerprint = statement_fingerprint(query)
+        observed = time.perf_counter()
+        DB_STATEMENT_DURATION.observe(time.perf_counter() - observed, (fingerprint,))
+        DB_STATEMENT_ROWS.inc((fingerprint,), 1)
+    return (time.perf_counter() - started) / statements * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200_000)
+    args = parser.parse_args()
+
+    instrumented = MetricsMiddleware(_app)
+    # Прогрев, затем лучший из трех прогонов каждого варианта.
+    await _per_request_us(_app, 1000)
+    await _per_request_us(instrumented, 1000)
+    bare = min([await _per_request_us(_app, args.requests) for _ in range(3)])
+    wrapped = min([await _per_request_us(instrumented, args.requests) for _ in range(3)])
+    statement = min(_statement_us(args.requests) for _ in range(3))
+
+    print(f"ASGI request without metrics {bare:8.2f} us")
+    print(f"ASGI request with metrics    {wrapped:8.2f} us  (+{wrapped - bare:.2f} us per request)")
+    print(f"SQL statement accounting     {statement:8.2f} us per statement")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Микробенчмарк чтения заказа: прежний путь (два запроса + Pydantic + json)
+против одного запроса, возвращающего готовый JSON-документ.
+
+Создает в БД (DATABASE_URL) заказы из 1, 50 и 500 позиций, замеряет оба пути
+и откатывает транзакцию, так что данные после прогона не остаются.
+
+    python -m benchmarks.bench_order_read --iterations 500
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import psycopg
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from routes.order_router import _fetch_order_details
+from schemas.order import OrderItemResponse, OrderResponse
+
+load_dotenv()
+
+ORDER_SIZES = (1, 50, 500)
+
+
+async def _legacy_fetch(order_id: int, cursor: psycopg.AsyncCursor) -> bytes:
+    """Путь до оптимизации: заголовок и позиции отдельными запросами, сборка в Python."""
+    await cursor.execute("SELECT id, client_id, status, created_at FROM orders WHERE id = %s", (order_id,))
+    order_row = await cursor.fetchone()
+    await cursor.execute(
+        """
+        SELECT oi.product_id, p.name, oi.qty, oi.price_at_moment, oi.amount
+        FROM order_items oi
+        JOIN products p ON oi.product_id = p.id
+        WHERE oi.order_id = %s
+        ORDER BY p.name
+        """,
+        (order_id,),
+    )
+    items = [
+        OrderItemResponse(
+            product_id=row[0], product_name=row[1], quantity=row[2],
+            price_at_moment=float(row[3]), amount=float(row[4]),
+        )
+        for row in await cursor.fetchall()
+    ]
+    order = OrderResponse(
+        id=order_row[0], client_id=order_row[1], status=order_row[2], created_at=order_row[3],
+        items=items, total_amount=round(sum(item.amount for item in items), 2),
+    )
+    # FastAPI повторно валидирует ответ по response_model и кодирует его stdlib json
+    validated = OrderResponse.model_validate(order.model_dump())
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+async def _create_order(cursor: psycopg.AsyncCursor, client_id: int, category_id: int, lines: int) -> int:
+    await cursor.execute(
+        """
+        INSERT INTO products (name, price, category_id)
+        SELECT 'Bench product ' || g, 10 + g %% 100, %s FROM generate_series(1, %s) AS g
+        RETURNING id
+        """,
+        (category_id, lines),
+    )
+    product_ids = [row[0] for row in await cursor.fetchall()]
+    await cursor.execute("INSERT INTO orders (client_id) VALUES (%s) RETURNING id", (client_id,))
+    order_id = (await cursor.fetchone())[0]
+    await cursor.execute(
+        """
+        INSERT INTO order_items (order_id, product_id, qty, price_at_moment)
+        SELECT %s, u.id, 1 + u.id %% 5, 9.99 FROM unnest(%s::bigint[]) AS u(id)
+        """,
+        (order_id, product_ids),
+    )
+    return order_id
+
+
+async def _time_us(fetch, order_id: int, cursor: psycopg.AsyncCursor, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await fetch(order_id, cursor)
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    async with await psycopg.AsyncConnection.connect(args.database_url) as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute("INSERT INTO clients (name, address) VALUES ('Bench', 'Bench') RETURNING id")
+            client_id = (await cursor.fetchone())[0]
+            await cursor.execute("INSERT INTO categories (name, path) VALUES ('Bench', 'bench') RETURNING id")
+            category_id = (await cursor.fetchone())[0]
+            print(f"{'lines':>6} {'legacy, us':>12} {'document, us':>14} {'speedup':>8}")
+            for lines in ORDER_SIZES:
+                order_id = await _create_order(cursor, client_id, category_id, lines)
+                legacy = await _time_us(_legacy_fetch, order_id, cursor, args.iterations)
+                document = await _time_us(_fetch_order_details, order_id, cursor, args.iterations)
+                print(f"{lines:>6} {legacy:>12.0f} {document:>14.0f} {legacy / document:>7.1f}x")
+        await conn.rollback()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Бенчмарк глубоких страниц GET /orders/: OFFSET против keyset-курсора.
+
+Для каждой глубины страницы замеряется медианная задержка запроса с skip=N и запроса
+с курсором, указывающим на ту же позицию. Курсор для глубины N берется прямо из БД
+(DATABASE_URL), чтобы не проходить все страницы по очереди.
+
+    python -m benchmarks.bench_pagination --populate 1000000 --depths 0 1000 10000 100000 1000000
+"""
+import argparse
+import os
+import statistics
+import time
+
+import httpx
+import psycopg
+from dotenv import load_dotenv
+
+from utils.pagination import encode_cursor
+
+load_dotenv()
+
+
+def _populate(conn: psycopg.Connection, count: int):
+    """Досоздает `count` пустых заказов первого клиента, размазанных по времени."""
+    conn.execute(
+        """
+        INSERT INTO orders (client_id, created_at)
+        SELECT (SELECT min(id) FROM clients), now() - g * interval '1 second'
+        FROM generate_series(1, %s) AS g
+        """,
+        (count,),
+    )
+    conn.execute("ANALYZE orders")
+    conn.commit()
+
+
+def _median_ms(client: httpx.Client, params: dict, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = client.get("/orders/", params=params)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--populate", type=int, default=0, help="Сколько заказов досоздать перед замером")
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1_000, 10_000, 100_000])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with psycopg.connect(args.database_url) as conn, httpx.Client(base_url=args.base_url, timeout=60) as client:
+        if args.populate:
+            _populate(conn, args.populate)
+        print(f"{'depth':>10} {'offset, ms':>12} {'cursor, ms':>12}")
+        for depth in args.depths:
+            row = conn.execute(
+                "SELECT created_at, id FROM orders ORDER BY created_at DESC, id DESC OFFSET %s LIMIT 1",
+                (max(depth - 1, 0),),
+            ).fetchone()
+            if row is None:
+                print(f"{depth:>10} -- в таблице меньше заказов")
+                continue
+            offset_ms = _median_ms(client, {"skip": depth, "limit": args.limit}, args.repeats)
+            cursor_params = {"limit": args.limit}
+            if depth:
+                cursor_params["cursor"] = encode_cursor(*row)
+            cursor_ms = _median_ms(client, cursor_params, args.repeats)
+            print(f"{depth:>10} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Бенчмарк подготовленных запросов (prepared_statement в db/session.py).
+
+1. Время планирования каждого горячего запроса на сервере (Planning Time из EXPLAIN
+   (SUMMARY)) - столько экономит каждое выполнение подготовленного запроса с общим планом.
+2. Запросы двух типичных HTTP-запросов на одном соединении, --requests раз без
+   подготовки и с ней:
+   *   карточка товара - get_product;
+   *   добавление позиции - lock_order, reserve_product, upsert_order_item, order_details
+       в транзакции (бенчмарк создает себе заказ и товар и удаляет их в конце).
+
+Время планирования растет с числом индексов и статистикой таблиц, поэтому лучше
+запускать на данных реального размера, например из python -m db.generate:
+
+    python -m benchmarks.bench_prepared --requests 5000
+"""
+import argparse
+import os
+import re
+import time
+
+import psycopg
+from dotenv import load_dotenv
+
+from cache.products import _GET_PRODUCT
+from routes.order_router import _LOCK_ORDER, _ORDER_DETAILS, _RESERVE_PRODUCT, _UPSERT_ORDER_ITEM
+
+load_dotenv()
+
+_PLANNING_TIME = re.compile(r"Planning Time: ([\d.]+) ms")
+
+
+def _create_fixtures(conn: psycopg.Connection) -> tuple[int, int]:
+    """Отдельные заказ и товар с большим остатком: бенчмарк фиксирует каждый запрос, как сервис."""
+    client_id = conn.execute(
+        "INSERT INTO clients (name, address) VALUES ('Prepared Bench', 'Bench St') RETURNING id"
+    ).fetchone()[0]
+    category_id = conn.execute(
+        "INSERT INTO categories (name, path) VALUES ('Prepared Bench', 'tmp') RETURNING id"
+    ).fetchone()[0]
+    conn.execute("UPDATE categories SET path = id::text::ltree WHERE id = %s", (category_id,))
+    product_id = conn.execute(
+        "INSERT INTO products (name, price, category_id) VALUES ('Prepared Bench', 10, %s) RETURNING id",
+        (category_id,),
+    ).fetchone()[0]
+    conn.execute("INSERT INTO inventory (product_id, stock) VALUES (%s, 1000000000)", (product_id,))
+    order_id = conn.execute("INSERT INTO orders (client_id) VALUES (%s) RETURNING id", (client_id,)).fetchone()[0]
+    return order_id, product_id
+
+
+def _drop_fixtures(conn: psycopg.Connection, order_id: int, product_id: int):
+    client_id = conn.execute("DELETE FROM orders WHERE id = %s RETURNING client_id", (order_id,)).fetchone()[0]
+    category_id = conn.execute(
+        "DELETE FROM products WHERE id = %s RETURNING category_id", (product_id,)
+    ).fetchone()[0]
+    conn.execute("DELETE FROM categories WHERE id = %s", (category_id,))
+    conn.execute("DELETE FROM clients WHERE id = %s", (client_id,))
+
+
+def _planning_ms(conn: psycopg.Connection, statement, params) -> float:
+    """Лучшее из 20 планирований: первое в сессии еще и заполняет кэш каталога."""
+    timings = []
+    for _ in range(20):
+        with conn.transaction(force_rollback=True):
+            rows = conn.execute("EXPLAIN (SUMMARY) " + statement.sql, params).fetchall()
+        timings.append(float(_PLANNING_TIME.search("\n".join(row[0] for row in rows)).group(1)))
+    return min(timings)
+
+
+def _product_page(conn: psycopg.Connection, order_id: int, product_id: int, prepare: bool):
+    conn.execute(_GET_PRODUCT.sql, (product_id,), prepare=prepare).fetchone()
+
+
+def _add_item(conn: psycopg.Connection, order_id: int, product_id: int, prepare: bool):
+    # Транзакция фиксируется: любой ROLLBACK заставляет psycopg сбросить подготовленные
+    # на соединении запросы (в сервисе так происходит только при ошибке обработчика).
+    with conn.transaction():
+        conn.execute(_LOCK_ORDER.sql, (order_id,), prepare=prepare).fetchone()
+        price, _ = conn.execute(_RESERVE_PRODUCT.sql, (1, product_id), prepare=prepare).fetchone()
+        conn.execute(_UPSERT_ORDER_ITEM.sql, (order_id, product_id, 1, price), prepare=prepare)
+        conn.execute(_ORDER_DETAILS.sql, (order_id,), prepare=prepare).fetchone()
+
+
+def _per_request_us(conn, request, order_id: int, product_id: int, prepare: bool, requests: int) -> float:
+    for _ in range(10):
+        request(conn, order_id, product_id, prepare)
+    started = time.perf_counter()
+    for _ in range(requests):
+        request(conn, order_id, product_id, prepare)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def _run(args, conn: psycopg.Connection, order_id: int, product_id: int):
+    planning = {
+        statement.name: _planning_ms(conn, statement, params)
+        for statement, params in (
+            (_GET_PRODUCT, (product_id,)),
+            (_LOCK_ORDER, (order_id,)),
+            (_RESERVE_PRODUCT, (1, product_id)),
+            (_UPSERT_ORDER_ITEM, (order_id, product_id, 1, 1)),
+            (_ORDER_DETAILS, (order_id,)),
+        )
+    }
+    for name, ms in planning.items():
+        print(f"planning {name:<20} {ms * 1000:8.1f} us")
+
+    for label, request, statements in (
+        ("product page", _product_page, ("get_product",)),
+        ("add order item", _add_item, ("lock_order", "reserve_product", "upsert_order_item", "order_details")),
+    ):
+        # Каждый вариант - на свежем соединении, чтобы не мешал кэш подготовленных запросов.
+        results = {}
+        for prepare in (False, True):
+            with psycopg.connect(args.database_url, autocommit=True) as bench_conn:
+                results[prepare] = min(
+                    _per_request_us(bench_conn, request, order_id, product_id, prepare, args.requests)
+                    for _ in range(3)
+                )
+                if prepare:
+                    # При plan_cache_mode = auto сервер переходит на общий план, только
+                    # если тот не дороже индивидуальных; иначе планирует каждый вызов.
+                    generic, custom = bench_conn.execute(
+                        "SELECT SUM(generic_plans), SUM(custom_plans) FROM pg_prepared_statements"
+                    ).fetchone()
+        planned = sum(planning[name] for name in statements) * 1000
+        print(
+            f"{label:<16} unprepared {results[False]:8.1f} us  prepared {results[True]:8.1f} us  "
+            f"saved {results[False] - results[True]:6.1f} us per request (server planning {planned:.1f} us, "
+            f"generic plans {generic}, custom plans {custom})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    with psycopg.connect(args.database_url, autocommit=True) as conn:
+        order_id, product_id = _create_fixtures(conn)
+        try:
+            _run(args, conn, order_id, product_id)
+        finally:
+            _drop_fixtures(conn, order_id, product_id)
+
+
+if __name__ == "__main__":
+    main()
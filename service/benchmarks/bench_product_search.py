@@ -0,0 +1,118 @@
+"""
+Бенчмарк поиска товаров (GET /products/search, db/product_search.py).
+
+Для каждого сочетания фильтров (название: нет / подстрока / нечетко, диапазон цены,
+категория: нет / одна / поддерево, только в наличии) и сортировки выполняет запрос
+первой страницы под EXPLAIN (ANALYZE) (лучшее из --repeats) и печатает время выполнения
+и последовательно читаемые таблицы. Запрос подсчета total проверяется там, где сервис его
+выполняет (оценка планировщика меньше EXACT_COUNT_LIMIT). Таблицы меньше --min-table-rows
+строк (inventory_shards, пока горячих товаров мало) читать целиком дешевле, чем по индексу,
+и не учитываются. Если хоть одно сочетание читает большую таблицу последовательно,
+бенчмарк завершается с кодом 1.
+
+Планы зависят от статистики, поэтому запускать нужно на данных реального размера:
+
+    python -m db.generate --truncate --products 300000 --orders 20000
+    python -m benchmarks.bench_product_search
+"""
+import argparse
+import itertools
+import os
+import sys
+from decimal import Decimal
+
+import psycopg
+from dotenv import load_dotenv
+
+from db.product_search import EXACT_COUNT_LIMIT, ProductSearch, seq_scanned_tables
+
+load_dotenv()
+
+
+def _pick_parameters(conn: psycopg.Connection) -> tuple[Decimal, Decimal, int, int]:
+    """Диапазон цены (между 40-м и 50-м перцентилями), самая наполненная категория и ее корень."""
+    min_price, max_price = conn.execute(
+        "SELECT percentile_disc(0.4) WITHIN GROUP (ORDER BY price),"
+        " percentile_disc(0.5) WITHIN GROUP (ORDER BY price) FROM products"
+    ).fetchone()
+    category_id, root_id = conn.execute(
+        """
+        SELECT c.id, r.id
+        FROM (SELECT category_id FROM products GROUP BY category_id ORDER BY count(*) DESC LIMIT 1) top
+        JOIN categories c ON c.id = top.category_id
+        JOIN categories r ON r.path = subpath(c.path, 0, 1)
+        """
+    ).fetchone()
+    return min_price, max_price, category_id, root_id
+
+
+def _explain(conn: psycopg.Connection, sql: str, params: list) -> dict:
+    return conn.execute(f"EXPLAIN (FORMAT JSON) {sql}", params).fetchone()[0][0]["Plan"]
+
+
+def _best_ms(conn: psycopg.Connection, sql: str, params: list, repeats: int) -> float:
+    return min(
+        conn.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params).fetchone()[0][0]["Execution Time"]
+        for _ in range(repeats)
+    )
+
+
+def _large_tables(conn: psycopg.Connection, min_rows: int) -> set[str]:
+    rows = conn.execute(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples >= %s", (min_rows,)
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--query", default="ultra", help="подстрока названия")
+    parser.add_argument("--fuzzy", default="ultr", help="слово для нечеткого поиска")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--min-table-rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    failures = 0
+    with psycopg.connect(args.database_url, autocommit=True) as conn:
+        min_price, max_price, category_id, root_id = _pick_parameters(conn)
+        large_tables = _large_tables(conn, args.min_table_rows)
+        print(f"price {min_price}..{max_price}, category {category_id}, subtree of {root_id}")
+        print(
+            f"{'name':<10}{'price':<7}{'category':<10}{'stock':<7}{'sort':<13}"
+            f"{'page ms':>9}{'total':>9}{'count ms':>10}  seq scans"
+        )
+        for name, price, category, in_stock, sort in itertools.product(
+            (None, "substring", "fuzzy"), (False, True), (None, "exact", "subtree"), (False, True),
+            ("name", "price", "-total_sold"),
+        ):
+            search = ProductSearch(
+                q={"substring": args.query, "fuzzy": args.fuzzy}.get(name), match=name or "substring",
+                min_price=min_price if price else None, max_price=max_price if price else None,
+                category_id={"exact": category_id, "subtree": root_id}.get(category),
+                subtree=category == "subtree", in_stock=in_stock, sort=sort,
+            )
+            page_sql, page_params = search.page_query(None, args.limit)
+            seq_scans = seq_scanned_tables(_explain(conn, page_sql, page_params))
+            page_ms = _best_ms(conn, page_sql, page_params, args.repeats)
+            count_sql, count_params = search.count_query()
+            total, count_ms = int(_explain(conn, count_sql, count_params)["Plan Rows"]), 0.0
+            if total < EXACT_COUNT_LIMIT:
+                count_sql, count_params = f"SELECT count(*) FROM ({count_sql} LIMIT %s) t", [*count_params, EXACT_COUNT_LIMIT]
+                seq_scans += seq_scanned_tables(_explain(conn, count_sql, count_params))
+                count_ms = _best_ms(conn, count_sql, count_params, args.repeats)
+                total = conn.execute(count_sql, count_params).fetchone()[0]
+            seq_scans = sorted(set(seq_scans) & large_tables)
+            failures += bool(seq_scans)
+            print(
+                f"{name or '-':<10}{'yes' if price else '-':<7}{category or '-':<10}{'yes' if in_stock else '-':<7}"
+                f"{sort:<13}{page_ms:>9.2f}{total:>9}{count_ms:>10.2f}  {', '.join(seq_scans) or '-'}"
+            )
+    if failures:
+        print(f"{failures} combinations use a sequential scan", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
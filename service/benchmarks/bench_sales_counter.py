@@ -0,0 +1,167 @@
+"""
+Бенчмарк счетчика продаж: --buyers параллельных покупателей оформляют заказы с одним
+и тем же товаром (INSERT заказа и позиции в одной транзакции), а редактор каталога
+раз в --editor-interval секунд меняет этот товар, как update_product_info.
+
+Прогон выполняется дважды: со старым построчным триггером (UPDATE products на каждую
+позицию; на время прогона он создается заново, а триггеры дельт отключаются) и с
+дельтами в product_sales_deltas, которые сжимает фоновый цикл, как задача сервиса.
+После прогона проверяется, что счетчик равен сумме проданного. Бенчмарк меняет
+триггеры order_items - запускайте его только на тестовой БД:
+
+    python -m benchmarks.bench_sales_counter --buyers 100 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import psycopg
+from dotenv import load_dotenv
+
+from benchmarks.common import percentile
+
+load_dotenv()
+
+DELTA_TRIGGERS = (
+    "order_items_sales_insert_trigger",
+    "order_items_sales_update_trigger",
+    "order_items_sales_delete_trigger",
+)
+
+LEGACY_TRIGGER = """
+CREATE OR REPLACE FUNCTION bench_legacy_sales_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'INSERT') THEN
+        UPDATE products SET total_sold = total_sold + NEW.qty WHERE id = NEW.product_id;
+    ELSIF (TG_OP = 'UPDATE') THEN
+        UPDATE products SET total_sold = total_sold + (NEW.qty - OLD.qty) WHERE id = NEW.product_id;
+    ELSIF (TG_OP = 'DELETE') THEN
+        UPDATE products SET total_sold = total_sold - OLD.qty WHERE id = OLD.product_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER bench_legacy_sales_trigger
+AFTER INSERT OR UPDATE OR DELETE ON order_items
+FOR EACH ROW EXECUTE FUNCTION bench_legacy_sales_count();
+"""
+
+
+def _set_legacy_trigger(database_url: str, enabled: bool):
+    with psycopg.connect(database_url) as conn:
+        if enabled:
+            conn.execute(LEGACY_TRIGGER)
+        else:
+            conn.execute("DROP TRIGGER IF EXISTS bench_legacy_sales_trigger ON order_items")
+            conn.execute("DROP FUNCTION IF EXISTS bench_legacy_sales_count()")
+        for trigger in DELTA_TRIGGERS:
+            conn.execute(f"ALTER TABLE order_items {'DISABLE' if enabled else 'ENABLE'} TRIGGER {trigger}")
+
+
+def _prepare(database_url: str) -> tuple[int, int]:
+    with psycopg.connect(database_url) as conn:
+        client_id = conn.execute(
+            "INSERT INTO clients (name, address) VALUES ('Counter Buyer', 'Counter St') RETURNING id"
+        ).fetchone()[0]
+        category_id = conn.execute(
+            "INSERT INTO categories (name, path) VALUES ('Counter Bench', 'tmp') RETURNING id"
+        ).fetchone()[0]
+        conn.execute("UPDATE categories SET path = id::text::ltree WHERE id = %s", (category_id,))
+        product_id = conn.execute(
+            "INSERT INTO products (name, price, category_id) VALUES ('Counter SKU', 10, %s) RETURNING id", (category_id,)
+        ).fetchone()[0]
+    return client_id, product_id
+
+
+def _cleanup(database_url: str, client_id: int, product_id: int) -> tuple[int, int]:
+    with psycopg.connect(database_url) as conn:
+        conn.execute("SELECT compact_product_sales_deltas()")
+        sold = conn.execute("SELECT COALESCE(SUM(qty), 0) FROM order_items WHERE product_id = %s", (product_id,)).fetchone()[0]
+        counter = conn.execute("SELECT product_total_sold(%s)", (product_id,)).fetchone()[0]
+        category_id = conn.execute("SELECT category_id FROM products WHERE id = %s", (product_id,)).fetchone()[0]
+        conn.execute("DELETE FROM orders WHERE client_id = %s", (client_id,))
+        conn.execute("DELETE FROM products WHERE id = %s", (product_id,))
+        conn.execute("DELETE FROM categories WHERE id = %s", (category_id,))
+        conn.execute("DELETE FROM clients WHERE id = %s", (client_id,))
+        conn.execute("DELETE FROM product_sales_deltas WHERE product_id = %s", (product_id,))
+    return sold, counter
+
+
+async def _buyer(database_url: str, client_id: int, product_id: int, deadline: float, latencies: list, errors: list):
+    async with await psycopg.AsyncConnection.connect(database_url) as conn:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                order_id = (await (await conn.execute(
+                    "INSERT INTO orders (client_id) VALUES (%s) RETURNING id", (client_id,)
+                )).fetchone())[0]
+                await conn.execute(
+                    "INSERT INTO order_items (order_id, product_id, qty, price_at_moment) VALUES (%s, %s, 1, 10)",
+                    (order_id, product_id),
+                )
+                await conn.commit()
+            except psycopg.Error:
+                await conn.rollback()
+                errors.append(1)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def _editor(database_url: str, product_id: int, interval: float, deadline: float, latencies: list):
+    async with await psycopg.AsyncConnection.connect(database_url, autocommit=True) as conn:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await conn.execute("UPDATE products SET name = name, price = price WHERE id = %s", (product_id,))
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(interval)
+
+
+async def _compactor(database_url: str, interval: float, deadline: float):
+    async with await psycopg.AsyncConnection.connect(database_url, autocommit=True) as conn:
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(interval)
+            await conn.execute("SELECT compact_product_sales_deltas()")
+
+
+async def _run(args, legacy: bool):
+    client_id, product_id = _prepare(args.database_url)
+    _set_legacy_trigger(args.database_url, legacy)
+    latencies, errors, editor_latencies = [], [], []
+    deadline = time.perf_counter() + args.duration
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(
+            _editor(args.database_url, product_id, args.editor_interval, deadline, editor_latencies),
+            _compactor(args.database_url, args.compact_interval, deadline),
+            *(_buyer(args.database_url, client_id, product_id, deadline, latencies, errors) for _ in range(args.buyers)),
+        )
+    finally:
+        elapsed = time.perf_counter() - started
+        if legacy:
+            _set_legacy_trigger(args.database_url, False)
+    sold, counter = _cleanup(args.database_url, client_id, product_id)
+
+    label = "row trigger" if legacy else "deltas + compaction"
+    print(
+        f"{label:<22} {len(latencies) / elapsed:>8.1f} tx/s  p50={percentile(latencies, 50):.1f}ms "
+        f"p99={percentile(latencies, 99):.1f}ms  catalog update p99={percentile(editor_latencies, 99):.1f}ms  "
+        f"errors={len(errors)}  exact={sold == counter}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--buyers", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--editor-interval", type=float, default=0.05)
+    parser.add_argument("--compact-interval", type=float, default=1.0)
+    args = parser.parse_args()
+    await _run(args, legacy=True)
+    await _run(args, legacy=False)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
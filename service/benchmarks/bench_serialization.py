@@ -0,0 +1,79 @@
+"""
+Бенчмарк сериализации списков: строки в секунду для каждого списочного эндпоинта.
+
+Каждый эндпоинт нагружается страницами по --limit строк (по умолчанию 1000, где
+сериализация занимает большую часть CPU). Для сравнения "до/после" запустите его против
+сервиса из коммита с Pydantic-моделями на каждую строку и против текущего, с одинаковыми
+--concurrency и --duration. --populate досоздает клиентов и товары с остатками, чтобы
+страницы были полными.
+
+    python -m benchmarks.bench_serialization --populate 10000 --limit 1000 --concurrency 10
+"""
+import asyncio
+import os
+
+import httpx
+import psycopg
+from dotenv import load_dotenv
+
+from benchmarks.common import base_arg_parser, run_load
+
+load_dotenv()
+
+ENDPOINTS = ["/products/", "/clients/", "/inventory/", "/orders/"]
+
+
+def _populate(database_url: str, count: int):
+    with psycopg.connect(database_url) as conn:
+        conn.execute(
+            "INSERT INTO clients (name, address) SELECT 'bench-client-' || g, 'Bench St ' || g FROM generate_series(1, %s) g",
+            (count,),
+        )
+        conn.execute(
+            """
+            WITH new_products AS (
+                INSERT INTO products (name, price, category_id)
+                SELECT 'bench-product-' || g, 1 + g %% 1000 + 0.99, (SELECT min(id) FROM categories)
+                FROM generate_series(1, %s) g
+                RETURNING id
+            )
+            INSERT INTO inventory (product_id, stock) SELECT id, 100 FROM new_products
+            """,
+            (count,),
+        )
+        conn.execute(
+            """
+            INSERT INTO orders (client_id, created_at)
+            SELECT (SELECT min(id) FROM clients), now() - g * interval '1 second'
+            FROM generate_series(1, %s) g
+            """,
+            (count,),
+        )
+
+
+async def main():
+    parser = base_arg_parser(__doc__)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--populate", type=int, default=0)
+    parser.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+    if args.populate:
+        _populate(args.database_url, args.populate)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        print(f"{'endpoint':<16}{'rows/page':>10}{'rps':>10}{'rows/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+        for endpoint in ENDPOINTS:
+            rows = len((await client.get(endpoint, params={"limit": args.limit})).json())
+            stats = await run_load(
+                lambda worker_id: client.get(endpoint, params={"limit": args.limit}),
+                args.concurrency, args.duration,
+            )
+            print(
+                f"{endpoint:<16}{rows:>10}{stats['rps']:>10}{stats['rps'] * rows:>12.0f}"
+                f"{stats['p50_ms']:>10}{stats['p99_ms']:>10}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Общие утилиты для бенчмарков.
+
+Бенчмарки запускаются против уже поднятого сервиса (docker-compose или uvicorn)
+из каталога service/, например: python -m benchmarks.bench_async_db --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable, List
+
+import httpx
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Возвращает q-й перцентиль (0..100) по методу ближайшего ранга."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def base_arg_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность прогона в секундах")
+    return parser
+
+
+async def run_load(
+    worker: Callable[[int], Awaitable[httpx.Response]],
+    concurrency: int,
+    duration: float,
+) -> dict:
+    """
+    Запускает `concurrency` корутин, каждая из которых в цикле вызывает worker(номер_воркера)
+    в течение `duration` секунд. Возвращает сводку по пропускной способности и задержкам.
+    """
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def loop(worker_id: int):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await worker(worker_id)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def print_report(name: str, stats: dict):
+    print(
+        f"{name:<40} {stats['rps']:>10} rps  "
+        f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms  "
+        f"errors={stats['errors']}/{stats['requests']}"
+    )
@@ -0,0 +1,364 @@
+"""
+Нагрузочный тест сервиса смесью сценариев с весами.
+
+Сценарии (вес задается --mix, по умолчанию browse=60,basket=20,inventory=10,orders=10):
+
+*   browse - страница каталога GET /products/, дерево GET /categories/tree и несколько
+    карточек GET /products/{id};
+*   basket - POST /orders/, затем от 1 до --max-items позиций POST /orders/{id}/items
+    и GET /orders/{id};
+*   inventory - поступление и списание одного и того же количества
+    PATCH /inventory/{id}/adjust (остаток в итоге не меняется) и GET /inventory/{id};
+*   orders - первая страница GET /orders/ и следующая по X-Next-Cursor.
+
+Товары выбираются с распределением Ципфа (--skew), как в живом каталоге: несколько
+популярных товаров получают большую часть покупок и упираются в блокировки остатков.
+Выбор сценариев и товаров детерминирован при одинаковом --seed.
+
+Отчет: пропускная способность и p50/p95/p99 по каждому эндпоинту (шаблон маршрута) и
+сценарию, ошибки по классам: pool_exhausted (503 от пула), conflict (409), http_4xx,
+server_error (остальные 5xx), timeout и transport. Если доступна БД (--database-url,
+по умолчанию DATABASE_URL), дополнительно считаются взаимоблокировки и отмены по
+конфликтам из pg_stat_database за время прогона - сервис отдает их как 500.
+Результат сохраняется в JSON, два прогона сравнивает compare:
+
+    python -m benchmarks.loadtest run --base-url http://localhost:8000 --concurrency 50 --duration 60 --output before.json
+    python -m benchmarks.loadtest run --spawn --workers 2 --output after.json
+    python -m benchmarks.loadtest compare before.json after.json --max-regression 10
+
+--spawn поднимает uvicorn main:app на --port из каталога service/ и останавливает его
+после прогона. compare завершается с кодом 1, если на каком-то эндпоинте p99 вырос или
+пропускная способность упала больше чем на --max-regression процентов.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import httpx
+import psycopg
+from dotenv import load_dotenv
+
+from benchmarks.common import percentile
+
+load_dotenv()
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_MIX = "browse=60,basket=20,inventory=10,orders=10"
+
+
+class Stats:
+    """Задержки и ошибки одного эндпоинта или сценария."""
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def summary(self, elapsed: float) -> dict:
+        requests = len(self.latencies)
+        errors = sum(self.errors.values())
+        return {
+            "requests": requests,
+            "rps": round(requests / elapsed, 1),
+            "p50_ms": round(percentile(self.latencies, 50), 2),
+            "p95_ms": round(percentile(self.latencies, 95), 2),
+            "p99_ms": round(percentile(self.latencies, 99), 2),
+            "max_ms": round(max(self.latencies, default=0.0), 2),
+            "errors": errors,
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "error_classes": dict(sorted(self.errors.items())),
+        }
+
+
+def classify(response: Optional[httpx.Response], error: Optional[Exception] = None) -> Optional[str]:
+    """Класс ошибки запроса или None, если запрос успешен."""
+    if error is not None:
+        return "timeout" if isinstance(error, httpx.TimeoutException) else "transport"
+    code = response.status_code
+    if code < 400:
+        return None
+    if code == 503 and "pool exhausted" in response.text:
+        return "pool_exhausted"
+    if code == 409:
+        return "conflict"
+    return "http_4xx" if code < 500 else "server_error"
+
+
+class ScenarioFailed(Exception):
+    """Запрос сценария завершился ошибкой; остаток сценария пропускается."""
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.endpoints: dict[str, Stats] = defaultdict(Stats)
+        self.scenarios: dict[str, Stats] = defaultdict(Stats)
+        self.product_ids: list[int] = []
+        self.product_weights: list[float] = []
+        self.client_id = 0
+        self.category_id = 0
+
+    async def prepare(self):
+        """Создает клиента, категорию и --products товаров с большим остатком."""
+        suffix = f"{os.getpid()}-{int(time.time())}"
+        client = await self.client.post("/clients/", json={"name": "Loadtest Buyer", "address": "Loadtest St"})
+        self.client_id = client.json()["id"]
+        category = await self.client.post("/categories/", json={"name": f"Loadtest {suffix}"})
+        self.category_id = category.json()["id"]
+        for i in range(self.args.products):
+            product = await self.client.post("/products/", json={
+                "name": f"Loadtest Product {i}",
+                "price": 10 + i % 90,
+                "category_id": self.category_id,
+                "initial_stock": 10_000_000,
+            })
+            self.product_ids.append(product.json()["id"])
+        self.product_weights = [1 / (rank + 1) ** self.args.skew for rank in range(len(self.product_ids))]
+
+    async def request(self, method: str, endpoint: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response, error = None, None
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            error = e
+        stats = self.endpoints[f"{method} {endpoint}"]
+        stats.latencies.append((time.perf_counter() - started) * 1000)
+        error_class = classify(response, error)
+        if error_class is not None:
+            stats.errors[error_class] += 1
+            raise ScenarioFailed(error_class)
+        return response
+
+    def product(self, rng: random.Random) -> int:
+        return rng.choices(self.product_ids, self.product_weights)[0]
+
+    async def browse(self, rng: random.Random):
+        await self.request("GET", "/products/", "/products/", params={"limit": 50, "skip": rng.randrange(0, 500, 50)})
+        await self.request("GET", "/categories/tree", "/categories/tree")
+        for _ in range(3):
+            await self.request("GET", "/products/{product_id}", f"/products/{self.product(rng)}")
+
+    async def basket(self, rng: random.Random):
+        order = await self.request("POST", "/orders/", "/orders/", json={"client_id": self.client_id})
+        order_id = order.json()["id"]
+        for _ in range(rng.randint(1, self.args.max_items)):
+            await self.request(
+                "POST", "/orders/{order_id}/items", f"/orders/{order_id}/items",
+                json={"product_id": self.product(rng), "quantity": rng.randint(1, 3)},
+            )
+        await self.request("GET", "/orders/{order_id}", f"/orders/{order_id}")
+
+    async def inventory(self, rng: random.Random):
+        product_id, change = self.product(rng), rng.randint(1, 10)
+        url = f"/inventory/{product_id}/adjust"
+        await self.request("PATCH", "/inventory/{product_id}/adjust", url, json={"change_by": change})
+        await self.request("PATCH", "/inventory/{product_id}/adjust", url, json={"change_by": -change})
+        await self.request("GET", "/inventory/{product_id}", f"/inventory/{product_id}")
+
+    async def orders(self, rng: random.Random):
+        page = await self.request("GET", "/orders/", "/orders/", params={"limit": 20})
+        next_cursor = page.headers.get("X-Next-Cursor")
+        if next_cursor:
+            await self.request("GET", "/orders/", "/orders/", params={"limit": 20, "cursor": next_cursor})
+
+    async def worker(self, worker_id: int, mix: dict[str, int], deadline: float):
+        rng = random.Random(self.args.seed * 1_000_003 + worker_id)
+        names, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            stats = self.scenarios[name]
+            started = time.perf_counter()
+            try:
+                await getattr(self, name)(rng)
+            except ScenarioFailed as e:
+                stats.errors[str(e)] += 1
+            stats.latencies.append((time.perf_counter() - started) * 1000)
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("browse", "basket", "inventory", "orders"):
+            raise argparse.ArgumentTypeError(f"unknown scenario: {name}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def _database_counters(database_url: Optional[str]) -> Optional[dict]:
+    if not database_url:
+        return None
+    try:
+        with psycopg.connect(database_url) as conn:
+            deadlocks, conflicts, rollbacks = conn.execute(
+                "SELECT deadlocks, conflicts, xact_rollback FROM pg_stat_database WHERE datname = current_database()"
+            ).fetchone()
+    except psycopg.Error:
+        return None
+    return {"deadlocks": deadlocks, "conflicts": conflicts, "rollbacks": rollbacks}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _wait_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=1) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if (await client.get("/categories/tree")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"service at {base_url} did not start in {timeout:.0f}s")
+
+
+async def run(args) -> dict:
+    server = None
+    if args.spawn:
+        args.base_url = f"http://127.0.0.1:{args.port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--workers", str(args.workers),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=SERVICE_DIR,
+        )
+    try:
+        await _wait_ready(args.base_url)
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+            test = LoadTest(client, args)
+            await test.prepare()
+            db_before = _database_counters(args.database_url)
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(*(test.worker(i, args.mix, deadline) for i in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            db_after = _database_counters(args.database_url)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    endpoints = {name: stats.summary(elapsed) for name, stats in sorted(test.endpoints.items())}
+    total = Stats()
+    for stats in test.endpoints.values():
+        total.latencies.extend(stats.latencies)
+        for error_class, count in stats.errors.items():
+            total.errors[error_class] += count
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration": round(elapsed, 2),
+            "seed": args.seed,
+            "mix": args.mix,
+            "products": args.products,
+            "skew": args.skew,
+        },
+        "total": total.summary(elapsed),
+        "scenarios": {name: stats.summary(elapsed) for name, stats in sorted(test.scenarios.items())},
+        "endpoints": endpoints,
+        "database": (
+            {key: db_after[key] - db_before[key] for key in db_after} if db_before and db_after else None
+        ),
+    }
+
+
+def print_results(results: dict):
+    print(f"{'endpoint':<40} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}  errors")
+    for name, stats in [*results["endpoints"].items(), ("total", results["total"])]:
+        classes = ", ".join(f"{key}={value}" for key, value in stats["error_classes"].items())
+        print(
+            f"{name:<40} {stats['rps']:>9} {stats['p50_ms']:>7}ms {stats['p95_ms']:>7}ms {stats['p99_ms']:>7}ms  "
+            f"{stats['error_rate']:.2%}{f' ({classes})' if classes else ''}"
+        )
+    if results["database"] is not None:
+        print("database: " + ", ".join(f"{key}={value}" for key, value in results["database"].items()))
+
+
+def _change(before: float, after: float) -> Optional[float]:
+    return (after - before) / before * 100 if before else None
+
+
+def compare(before: dict, after: dict, max_regression: float) -> bool:
+    """Печатает изменения по эндпоинтам; возвращает False, если есть регрессия больше порога."""
+    ok = True
+    print(f"{'endpoint':<40} {'rps':>20} {'p99 ms':>20} {'error rate':>18}")
+    for name in sorted(before["endpoints"].keys() | after["endpoints"].keys()):
+        old, new = before["endpoints"].get(name), after["endpoints"].get(name)
+        if old is None or new is None:
+            print(f"{name:<40} {'only in ' + ('after' if old is None else 'before'):>20}")
+            continue
+        rps, p99 = _change(old["rps"], new["rps"]), _change(old["p99_ms"], new["p99_ms"])
+        regressed = (rps is not None and rps < -max_regression) or (p99 is not None and p99 > max_regression)
+        ok = ok and not regressed
+        print(
+            f"{name:<40} {old['rps']:>8}->{new['rps']:<8}{'' if rps is None else f'{rps:+.0f}%':>6} "
+            f"{old['p99_ms']:>8}->{new['p99_ms']:<8}{'' if p99 is None else f'{p99:+.0f}%':>6} "
+            f"{old['error_rate']:>8.2%}->{new['error_rate']:<8.2%}{'  REGRESSION' if regressed else ''}"
+        )
+    if before.get("database") and after.get("database"):
+        print("database: " + ", ".join(
+            f"{key} {before['database'][key]}->{after['database'][key]}" for key in after["database"]
+        ))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Прогнать нагрузку и сохранить результат")
+    run_parser.add_argument("--base-url", default="http://localhost:8000")
+    run_parser.add_argument("--spawn", action="store_true", help="Поднять uvicorn main:app на время прогона")
+    run_parser.add_argument("--port", type=int, default=8099)
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--concurrency", type=int, default=50)
+    run_parser.add_argument("--duration", type=float, default=30.0, help="Длительность прогона в секундах")
+    run_parser.add_argument("--timeout", type=float, default=30.0, help="Таймаут одного HTTP-запроса")
+    run_parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    run_parser.add_argument("--products", type=int, default=200)
+    run_parser.add_argument("--skew", type=float, default=1.1, help="Показатель распределения Ципфа")
+    run_parser.add_argument("--max-items", type=int, default=5, help="Максимум позиций в корзине")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    run_parser.add_argument("--output", type=Path, help="Куда сохранить результат в JSON")
+
+    compare_parser = commands.add_parser("compare", help="Сравнить два сохраненных прогона")
+    compare_parser.add_argument("before", type=Path)
+    compare_parser.add_argument("after", type=Path)
+    compare_parser.add_argument("--max-regression", type=float, default=10.0, help="Допустимая регрессия, %%")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        ok = compare(json.loads(args.before.read_text()), json.loads(args.after.read_text()), args.max_regression)
+        sys.exit(0 if ok else 1)
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Процессный кэш сериализованного дерева категорий.
+
+Дерево меняется несколько раз в день, а читается на каждой странице витрины,
+поэтому готовый JSON хранится в памяти воркера вместе со счетчиком версий.
+Кэш сбрасывается роутером категорий при изменениях и уведомлением
+category_tree_changed, которое шлет триггер на таблице categories, так что
+все воркеры остаются согласованными.
+"""
+import asyncio
+import hashlib
+from typing import Optional, Sequence
+
+import orjson
+
+from db.session import db_connection
+
+CATEGORY_TREE_CHANNEL = "category_tree_changed"
+
+
+def build_category_tree(rows: Sequence[tuple]) -> list[dict]:
+    """
+    Связывает строки (id, name, path, parent_id), отсортированные по path, в дерево
+    из словарей. Корнями считаются узлы, чьего родителя нет среди строк, - так же
+    функция собирает и поддерево от произвольной категории.
+    """
+    nodes = {
+        row[0]: {"id": row[0], "name": row[1], "path": row[2], "parent_id": row[3], "children": []}
+        for row in rows
+    }
+    tree = []
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"])
+        if parent:
+            parent["children"].append(node)
+        else:
+            tree.append(node)
+    return tree
+
+
+def dump_json(data) -> bytes:
+    """Компактный UTF-8 JSON, тот же формат, что и у JSONResponse FastAPI."""
+    return orjson.dumps(data)
+
+
+class CategoryTreeCache:
+    def __init__(self):
+        self.version = 0
+        self._body: bytes | None = None
+        self._etag: str | None = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self, payload: Optional[str] = None):
+        self.version += 1
+        self._body = None
+        self._etag = None
+
+    async def _load(self) -> bytes:
+        # Читаем с основной БД, а не с реплики: уведомление об изменении приходит
+        # с основной, и отстающая реплика закэшировала бы старое дерево до следующей правки.
+        async with db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT id, name, path, parent_id FROM categories ORDER BY path")
+                return dump_json(build_category_tree(await cursor.fetchall()))
+
+    async def get(self) -> tuple[bytes, str]:
+        """Возвращает (JSON дерева, ETag). Параллельные промахи строят дерево один раз."""
+        if self._body is not None:
+            return self._body, self._etag
+        async with self._lock:
+            if self._body is not None:
+                return self._body, self._etag
+            version = self.version
+            body = await self._load()
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            # Если во время построения пришла инвалидация, результат не кэшируем.
+            if version == self.version:
+                self._body, self._etag = body, etag
+            return body, etag
+
+
+category_tree_cache = CategoryTreeCache()
@@ -0,0 +1,102 @@
+"""
+Процессный кэш карточек товаров для GET /products/{id}.
+
+Карточка делится на две части с разной скоростью изменений:
+*   каталог (название, цена, категория) меняется редко и лежит в LRU-кэше с TTL
+    (PRODUCT_CACHE_TTL секунд, не больше PRODUCT_CACHE_SIZE товаров). Запись сбрасывают
+    обработчики изменения и удаления товара, а во всех воркерах - уведомление
+    product_changed от триггера на таблице products (id через запятую, пустая строка -
+    сбросить все);
+*   остаток меняется с каждой покупкой. По умолчанию он читается заново на каждый запрос,
+    а с PRODUCT_STOCK_MAX_STALENESS > 0 может быть устаревшим не больше чем на столько секунд.
+
+Попадания и промахи обеих частей - в метрике cache_requests_total
+(cache="product_catalog" и cache="product_stock").
+"""
+import os
+from typing import Optional
+
+from cache.ttl import TTLCache
+from db.replicas import read_db_connection
+from db.session import db_connection, prepared_statement
+from schemas.product import ProductResponse
+
+PRODUCT_CHANGED_CHANNEL = "product_changed"
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "300"))
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+PRODUCT_STOCK_MAX_STALENESS = float(os.getenv("PRODUCT_STOCK_MAX_STALENESS", "0"))
+
+_GET_PRODUCT = prepared_statement("get_product", """
+    SELECT p.id, p.name, p.price, p.category_id, COALESCE(i.stock, 0) as stock
+    FROM products p
+    LEFT JOIN inventory_stock i ON p.id = i.product_id
+    WHERE p.id = %s
+""")
+
+_GET_STOCK = prepared_statement(
+    "get_product_stock", "SELECT stock FROM inventory_stock WHERE product_id = %s"
+)
+
+
+class _ProductNotFound(Exception):
+    """Ошибки загрузки не кэшируются, так что отсутствующий товар не попадает в кэш."""
+
+
+class ProductCache:
+    def __init__(self, ttl: float, max_size: int, stock_staleness: float):
+        self.catalog = TTLCache(ttl, max_size, name="product_catalog")
+        self.stock = TTLCache(stock_staleness, max_size, name="product_stock")
+
+    def invalidate(self, payload: Optional[str] = None):
+        if not payload:
+            self.catalog.invalidate()
+            self.stock.invalidate()
+            return
+        for product_id in payload.split(","):
+            self.discard(int(product_id))
+
+    def discard(self, product_id: int):
+        self.catalog.discard(product_id)
+        self.stock.discard(product_id)
+
+    async def _load_product(self, product_id: int) -> tuple:
+        # Каталог читаем с основной БД: уведомление об изменении приходит с нее, и отстающая
+        # реплика закэшировала бы старую карточку до истечения TTL.
+        async with db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(_GET_PRODUCT, (product_id,))
+                row = await cursor.fetchone()
+        if row is None:
+            raise _ProductNotFound
+        return row
+
+    async def _load_stock(self, product_id: int) -> int:
+        async with read_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(_GET_STOCK, (product_id,))
+                row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    async def get(self, product_id: int) -> Optional[ProductResponse]:
+        """Карточка товара или None, если товара нет."""
+        loaded = None
+
+        async def load_catalog():
+            nonlocal loaded
+            loaded = await self._load_product(product_id)
+            return loaded[:4]
+
+        try:
+            entry = await self.catalog.get(product_id, load_catalog)
+        except _ProductNotFound:
+            return None
+        if loaded is not None:
+            # Промах стоит одного запроса: остаток берем из той же строки, что и каталог.
+            stock = loaded[4]
+        else:
+            stock = (await self.stock.get(product_id, lambda: self._load_stock(product_id))).value
+        product_id, name, price, category_id = entry.value
+        return ProductResponse(id=product_id, name=name, price=price, category_id=category_id, stock=stock)
+
+
+product_cache = ProductCache(PRODUCT_CACHE_TTL, PRODUCT_CACHE_SIZE, PRODUCT_STOCK_MAX_STALENESS)
@@ -0,0 +1,96 @@
+"""
+Процессный TTL-кэш с объединением одновременных промахов.
+
+Записи живут ttl секунд. Если значение ключа устарело и его запрашивают сразу
+много корутин, загрузчик запускается один раз, а остальные ждут тот же результат,
+так что сто одновременных запросов дашборда стоят одного запроса к БД. Ошибку
+загрузки получают все ожидающие, в кэш она не попадает.
+
+С max_size кэш держит не больше max_size ключей и вытесняет давно не читанные (LRU).
+Кэш с именем считает попадания и промахи в метрике cache_requests_total.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from utils.metrics import Counter
+
+Loader = Callable[[], Awaitable[Any]]
+
+CACHE_REQUESTS = Counter("cache_requests_total", "In-process cache lookups by cache and result.", ("cache", "result"))
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def age(self) -> float:
+        """Сколько секунд назад значение было загружено."""
+        return time.monotonic() - self.loaded_at
+
+
+class TTLCache:
+    def __init__(self, ttl: float, max_size: Optional[int] = None, name: Optional[str] = None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.name = name
+        self.version = 0
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._loading: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def invalidate(self, payload: Optional[str] = None):
+        self.version += 1
+        self._entries.clear()
+        # Загрузки, начатые до инвалидации, достаются только тем, кто их уже ждет.
+        self._loading.clear()
+
+    def discard(self, key: Hashable):
+        """Сбрасывает один ключ; уже идущие загрузки любых ключей не попадут в кэш."""
+        self.version += 1
+        self._entries.pop(key, None)
+        self._loading.pop(key, None)
+
+    def _count(self, result: str):
+        if self.name is not None:
+            CACHE_REQUESTS.inc((self.name, result))
+
+    def _store(self, key: Hashable, entry: CacheEntry):
+        if self.ttl <= 0 or self.max_size == 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if self.max_size is not None and len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._loading.get(key) is future:
+            del self._loading[key]
+
+    async def _load(self, key: Hashable, loader: Loader, version: int) -> CacheEntry:
+        entry = CacheEntry(await loader())
+        # Если во время загрузки пришла инвалидация, результат не кэшируем.
+        if version == self.version:
+            self._store(key, entry)
+        return entry
+
+    async def get(self, key: Hashable, loader: Loader) -> CacheEntry:
+        entry = self._entries.get(key)
+        if entry is not None and entry.age < self.ttl:
+            self._entries.move_to_end(key)
+            self._count("hit")
+            return entry
+        self._count("miss")
+        future = self._loading.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, loader, self.version))
+            self._loading[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        # shield: отключившийся клиент не отменяет загрузку для остальных ожидающих.
+        return await asyncio.shield(future)
@@ -2,33 +2,101 @@
 -- ДЕНОРМАЛИЗАЦИЯ: СЧЕТЧИКИ ПРОДАЖ
 -- =======================================
 
+-- total_sold - сжатая база счетчика. Позиции заказов не трогают строку товара: триггеры
+-- дописывают изменения в product_sales_deltas, а фоновая задача (service/jobs/sales_counters.py)
+-- периодически переносит их в products. Так покупка не блокирует строку каталога, а строки
+-- products не обрастают мертвыми версиями. Точное значение - product_total_sold(id).
 ALTER TABLE products ADD COLUMN total_sold INT NOT NULL DEFAULT 0;
 
-CREATE INDEX IF NOT EXISTS idx_products_total_sold ON products(total_sold DESC);
+-- id - для keyset-пагинации поиска товаров по популярности.
+CREATE INDEX IF NOT EXISTS idx_products_total_sold ON products(total_sold DESC, id DESC);
 
 
-CREATE OR REPLACE FUNCTION update_product_sales_count()
+-- Только вставка и удаление при сжатии. Без внешнего ключа: проверка FK брала бы
+-- блокировку строки товара на каждую запись; дельты удаленных товаров отбрасывает сжатие.
+CREATE TABLE product_sales_deltas (
+    product_id BIGINT NOT NULL,
+    delta INT NOT NULL
+);
+
+CREATE INDEX idx_product_sales_deltas_product ON product_sales_deltas(product_id);
+
+
+-- Statement-level с таблицами переходов: одна строка дельты на товар за оператор.
+CREATE OR REPLACE FUNCTION record_product_sales_deltas()
 RETURNS TRIGGER AS $$
 BEGIN
-    IF (TG_OP = 'INSERT') THEN
-        UPDATE products SET total_sold = total_sold + NEW.qty WHERE id = NEW.product_id;
-    ELSIF (TG_OP = 'UPDATE') THEN
-        UPDATE products SET total_sold = total_sold + (NEW.qty - OLD.qty) WHERE id = NEW.product_id;
-    ELSIF (TG_OP = 'DELETE') THEN
-        UPDATE products SET total_sold = total_sold - OLD.qty WHERE id = OLD.product_id;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO product_sales_deltas (product_id, delta)
+        SELECT product_id, SUM(qty) FROM new_items GROUP BY product_id;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO product_sales_deltas (product_id, delta)
+        SELECT product_id, SUM(qty)
+        FROM (
+            SELECT product_id, qty FROM new_items
+            UNION ALL
+            SELECT product_id, -qty FROM old_items
+        ) changes
+        GROUP BY product_id
+        HAVING SUM(qty) <> 0;
+    ELSE
+        INSERT INTO product_sales_deltas (product_id, delta)
+        SELECT product_id, -SUM(qty) FROM old_items GROUP BY product_id;
     END IF;
     RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
-
 DROP TRIGGER IF EXISTS order_items_sales_trigger ON order_items;
+DROP FUNCTION IF EXISTS update_product_sales_count();
 
-CREATE TRIGGER order_items_sales_trigger
+CREATE TRIGGER order_items_sales_insert_trigger
+AFTER INSERT ON order_items REFERENCING NEW TABLE AS new_items
+FOR EACH STATEMENT EXECUTE FUNCTION record_product_sales_deltas();
 
-AFTER INSERT OR UPDATE OR DELETE ON order_items
+CREATE TRIGGER order_items_sales_update_trigger
+AFTER UPDATE ON order_items REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+FOR EACH STATEMENT EXECUTE FUNCTION record_product_sales_deltas();
 
-FOR EACH ROW EXECUTE FUNCTION update_product_sales_count();
+CREATE TRIGGER order_items_sales_delete_trigger
+AFTER DELETE ON order_items REFERENCING OLD TABLE AS old_items
+FOR EACH STATEMENT EXECUTE FUNCTION record_product_sales_deltas();
+
+
+-- Переносит накопленные дельты в products.total_sold. Удаляются только строки, видимые
+-- в снимке оператора, поэтому дельты параллельных покупок дождутся следующего запуска.
+-- Возвращает число перенесенных строк или NULL, если сжатие уже идет в другом соединении.
+CREATE OR REPLACE FUNCTION compact_product_sales_deltas()
+RETURNS INT AS $$
+DECLARE
+    v_rows INT;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('product_sales_deltas')) THEN
+        RETURN NULL;
+    END IF;
+    WITH moved AS (
+        DELETE FROM product_sales_deltas RETURNING product_id, delta
+    ), totals AS (
+        SELECT product_id, SUM(delta) AS delta, COUNT(*) AS row_count FROM moved GROUP BY product_id
+    ), updated AS (
+        UPDATE products p
+        SET total_sold = p.total_sold + t.delta
+        FROM totals t
+        WHERE p.id = t.product_id AND t.delta <> 0
+    )
+    SELECT COALESCE(SUM(row_count), 0) INTO v_rows FROM totals;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Точное число проданных штук: сжатая база плюс еще не перенесенные дельты.
+CREATE OR REPLACE FUNCTION product_total_sold(p_product_id BIGINT)
+RETURNS BIGINT AS $$
+    SELECT p.total_sold + COALESCE((SELECT SUM(d.delta) FROM product_sales_deltas d WHERE d.product_id = p.id), 0)
+    FROM products p
+    WHERE p.id = p_product_id;
+$$ LANGUAGE sql STABLE;
 
 
 
@@ -41,25 +109,264 @@ CREATE TABLE daily_product_sales (
 );
 
 
-CREATE OR REPLACE FUNCTION refresh_daily_sales(report_date DATE)
+-- =======================================
+-- ИНКРЕМЕНТАЛЬНЫЕ ВИТРИНЫ ПРОДАЖ
+-- =======================================
+-- Витрины пересчитываются не целыми сутками раз в день, а по часам, которых коснулись
+-- изменения: заказы с updated_at после сохраненного водяного знака (watermark) и
+-- удаленные заказы из sales_rollup_pending. Часы считаются из orders по полуоткрытому
+-- диапазону created_at (индекс idx_orders_created_at), сутки - из часовой витрины.
+-- Запускается задачей сервиса (service/jobs/rollups.py).
+
+ALTER TABLE orders ADD COLUMN updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS idx_orders_updated_at ON orders(updated_at);
+
+
+CREATE OR REPLACE FUNCTION touch_order_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER orders_touch_trigger
+BEFORE UPDATE ON orders
+FOR EACH ROW EXECUTE FUNCTION touch_order_updated_at();
+
+
+-- Изменение позиций - тоже изменение заказа. Statement-level с таблицами переходов:
+-- один UPDATE orders на оператор, а не на каждую позицию.
+CREATE OR REPLACE FUNCTION touch_orders_from_items()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE orders SET updated_at = now() WHERE id IN (SELECT order_id FROM old_items);
+    ELSE
+        UPDATE orders SET updated_at = now() WHERE id IN (SELECT order_id FROM new_items);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER order_items_touch_insert_trigger
+AFTER INSERT ON order_items REFERENCING NEW TABLE AS new_items
+FOR EACH STATEMENT EXECUTE FUNCTION touch_orders_from_items();
+
+CREATE TRIGGER order_items_touch_update_trigger
+AFTER UPDATE ON order_items REFERENCING NEW TABLE AS new_items
+FOR EACH STATEMENT EXECUTE FUNCTION touch_orders_from_items();
+
+CREATE TRIGGER order_items_touch_delete_trigger
+AFTER DELETE ON order_items REFERENCING OLD TABLE AS old_items
+FOR EACH STATEMENT EXECUTE FUNCTION touch_orders_from_items();
+
+
+-- Удаленный заказ уже не найти по updated_at, поэтому его час запоминаем отдельно.
+CREATE TABLE sales_rollup_pending (
+    sale_hour TIMESTAMPTZ PRIMARY KEY
+);
+
+CREATE OR REPLACE FUNCTION remember_deleted_order_hours()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO sales_rollup_pending (sale_hour)
+    SELECT DISTINCT date_trunc('hour', created_at) FROM old_orders
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER orders_rollup_delete_trigger
+AFTER DELETE ON orders REFERENCING OLD TABLE AS old_orders
+FOR EACH STATEMENT EXECUTE FUNCTION remember_deleted_order_hours();
+
+
+CREATE TABLE rollup_watermarks (
+    name TEXT PRIMARY KEY,
+    watermark TIMESTAMPTZ NOT NULL,
+    refreshed_at TIMESTAMPTZ
+);
+
+-- '-infinity': первый запуск обработает все уже существующие заказы.
+INSERT INTO rollup_watermarks (name, watermark) VALUES ('sales', '-infinity');
+
+
+CREATE TABLE hourly_product_sales (
+    sale_hour TIMESTAMPTZ NOT NULL,
+    product_id BIGINT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    total_qty_sold INT NOT NULL,
+    total_amount_sold NUMERIC(14,2) NOT NULL,
+    PRIMARY KEY (sale_hour, product_id)
+);
+
+-- Суммы заказов клиентов (отчет 2.1 из queries.sql) в той же раскладке по часам и дням.
+CREATE TABLE hourly_client_sales (
+    sale_hour TIMESTAMPTZ NOT NULL,
+    client_id BIGINT NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+    orders_count INT NOT NULL,
+    total_amount NUMERIC(14,2) NOT NULL,
+    PRIMARY KEY (sale_hour, client_id)
+);
+
+CREATE TABLE daily_client_sales (
+    sale_date DATE NOT NULL,
+    client_id BIGINT NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+    orders_count INT NOT NULL,
+    total_amount NUMERIC(14,2) NOT NULL,
+    PRIMARY KEY (sale_date, client_id)
+);
+
+
+-- Пересчитывает заданные часы и сутки, в которые они входят. Вызывающий держит
+-- advisory-блокировку витрин (см. refresh_sales_rollups и rebuild_sales_rollups).
+CREATE OR REPLACE FUNCTION rollup_sales_hours(p_hours TIMESTAMPTZ[])
 RETURNS void AS $$
+DECLARE
+    v_days DATE[];
 BEGIN
-    DELETE FROM daily_product_sales WHERE sale_date = report_date;
+    DELETE FROM hourly_product_sales WHERE sale_hour = ANY(p_hours);
 
-    INSERT INTO daily_product_sales (sale_date, product_id, total_qty_sold, total_amount_sold)
+    INSERT INTO hourly_product_sales (sale_hour, product_id, total_qty_sold, total_amount_sold)
     SELECT
-        o.created_at::date,
+        h.sale_hour,
         oi.product_id,
-        SUM(oi.qty) as total_qty_sold,
-        SUM(oi.amount) as total_amount_sold
+        SUM(oi.qty),
+        SUM(oi.amount)
     FROM
-        orders o
+        unnest(p_hours) AS h(sale_hour)
+    JOIN
+        orders o ON o.created_at >= h.sale_hour AND o.created_at < h.sale_hour + INTERVAL '1 hour'
     JOIN
         order_items oi ON o.id = oi.order_id
     WHERE
-        o.created_at::date = report_date
-        AND o.status IN ('PROCESSING', 'COMPLETED') 
+        o.status IN ('PROCESSING', 'COMPLETED')
     GROUP BY
-        o.created_at::date, oi.product_id;
+        h.sale_hour, oi.product_id;
+
+    DELETE FROM hourly_client_sales WHERE sale_hour = ANY(p_hours);
+
+    INSERT INTO hourly_client_sales (sale_hour, client_id, orders_count, total_amount)
+    SELECT
+        h.sale_hour,
+        o.client_id,
+        COUNT(DISTINCT o.id),
+        SUM(oi.amount)
+    FROM
+        unnest(p_hours) AS h(sale_hour)
+    JOIN
+        orders o ON o.created_at >= h.sale_hour AND o.created_at < h.sale_hour + INTERVAL '1 hour'
+    JOIN
+        order_items oi ON o.id = oi.order_id
+    WHERE
+        o.status IN ('PROCESSING', 'COMPLETED')
+    GROUP BY
+        h.sale_hour, o.client_id;
+
+    SELECT array_agg(DISTINCT h::date) INTO v_days FROM unnest(p_hours) AS h;
+
+    DELETE FROM daily_product_sales WHERE sale_date = ANY(v_days);
+
+    INSERT INTO daily_product_sales (sale_date, product_id, total_qty_sold, total_amount_sold)
+    SELECT
+        d.sale_date,
+        hs.product_id,
+        SUM(hs.total_qty_sold),
+        SUM(hs.total_amount_sold)
+    FROM
+        unnest(v_days) AS d(sale_date)
+    JOIN
+        hourly_product_sales hs
+            ON hs.sale_hour >= d.sale_date::timestamptz
+            AND hs.sale_hour < (d.sale_date + 1)::timestamptz
+    GROUP BY
+        d.sale_date, hs.product_id;
+
+    DELETE FROM daily_client_sales WHERE sale_date = ANY(v_days);
+
+    INSERT INTO daily_client_sales (sale_date, client_id, orders_count, total_amount)
+    SELECT
+        d.sale_date,
+        hs.client_id,
+        SUM(hs.orders_count),
+        SUM(hs.total_amount)
+    FROM
+        unnest(v_days) AS d(sale_date)
+    JOIN
+        hourly_client_sales hs
+            ON hs.sale_hour >= d.sale_date::timestamptz
+            AND hs.sale_hour < (d.sale_date + 1)::timestamptz
+    GROUP BY
+        d.sale_date, hs.client_id;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Инкрементальный пересчет. Возвращает число пересчитанных часов или NULL, если
+-- витрины сейчас пересчитывает кто-то другой (другой воркер или бэкфилл).
+CREATE OR REPLACE FUNCTION refresh_sales_rollups()
+RETURNS INT AS $$
+DECLARE
+    v_from TIMESTAMPTZ;
+    v_to TIMESTAMPTZ;
+    v_hours TIMESTAMPTZ[];
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('sales_rollups')) THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT watermark INTO v_from FROM rollup_watermarks WHERE name = 'sales' FOR UPDATE;
+
+    -- Незакоммиченная транзакция могла записать updated_at = время своего начала,
+    -- поэтому водяной знак не обгоняет начало самой старой открытой транзакции:
+    -- ее изменения попадут в следующий запуск. Для чужих ролей xact_start виден
+    -- только с правами pg_read_all_stats.
+    SELECT LEAST(now(), MIN(xact_start)) INTO v_to
+    FROM pg_stat_activity
+    WHERE backend_type = 'client backend' AND pid <> pg_backend_pid() AND xact_start IS NOT NULL;
+    v_to := COALESCE(v_to, now());
+
+    WITH pending AS (
+        DELETE FROM sales_rollup_pending RETURNING sale_hour
+    )
+    SELECT array_agg(sale_hour) INTO v_hours
+    FROM (
+        SELECT date_trunc('hour', created_at) AS sale_hour
+        FROM orders
+        WHERE updated_at >= v_from AND updated_at < v_to
+        UNION
+        SELECT sale_hour FROM pending
+    ) changed;
+
+    IF v_hours IS NOT NULL THEN
+        PERFORM rollup_sales_hours(v_hours);
+    END IF;
+
+    UPDATE rollup_watermarks SET watermark = GREATEST(v_from, v_to), refreshed_at = now() WHERE name = 'sales';
+    RETURN COALESCE(cardinality(v_hours), 0);
 END;
-$$ LANGUAGE plpgsql;
\ No newline at end of file
+$$ LANGUAGE plpgsql;
+
+
+-- Полный пересчет дней [p_from, p_to) независимо от водяного знака. Бэкфилл запускает
+-- несколько таких вызовов параллельно по непересекающимся диапазонам: они делят
+-- блокировку между собой, но не с инкрементальным пересчетом.
+CREATE OR REPLACE FUNCTION rebuild_sales_rollups(p_from DATE, p_to DATE)
+RETURNS void AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared(hashtext('sales_rollups'));
+    PERFORM rollup_sales_hours(ARRAY(
+        SELECT generate_series(p_from::timestamptz, p_to::timestamptz - INTERVAL '1 hour', INTERVAL '1 hour')
+    ));
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Пересчет одного дня; оставлен для совместимости с ручными вызовами.
+CREATE OR REPLACE FUNCTION refresh_daily_sales(report_date DATE)
+RETURNS void AS $$
+BEGIN
+    PERFORM rebuild_sales_rollups(report_date, report_date + 1);
+END;
+$$ LANGUAGE plpgsql;
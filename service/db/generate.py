@@ -0,0 +1,311 @@
+"""
+Генератор синтетических данных для нагрузочного тестирования.
+
+Заполняет схему в заданном масштабе через COPY: клиенты, дерево категорий заданной
+глубины и ширины, товары с остатками, заказы и позиции с популярностью товаров по
+закону Ципфа (--skew). Пример масштаба "как в проде":
+
+    python -m db.generate --truncate --clients 1000000 --categories 50000 --depth 6 --fanout 8 \\
+        --products 500000 --orders 20000000 --items-per-order 5 --workers 8
+
+Данные детерминированы: при одинаковых параметрах, --seed и --end получается одна и та
+же база при любом --workers; по умолчанию --end - начало текущего часа, поэтому для
+повторяемости между запусками задавайте его явно. Все id задаются явно, а каждый кусок
+строк (--chunk-size) генерируется своим потоком случайных чисел, так что параллельные
+процессы могут писать куски в любом порядке. После загрузки последовательности
+сдвигаются за максимальные id.
+
+Пока идет загрузка, пользовательские триггеры orders и order_items выключены (внешние
+ключи проверяются), а вторичные индексы этих таблиц удаляются и строятся заново в
+конце. Затем products.total_sold пересчитывается по order_items (дельты счетчика
+очищаются), витрины продаж строятся бэкфиллом (jobs/rollups.py) за весь период
+заказов, водяной знак инкрементального пересчета ставится на текущий момент, и
+обновляется статистика планировщика. Генератор рассчитан на пустую базу: без --truncate он
+откажется работать, если в ней уже есть клиенты.
+"""
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from itertools import accumulate
+
+import psycopg
+
+from db.session import DATABASE_URL
+from jobs.rollups import backfill
+
+# Таблицы, куда пишет генератор; порядок важен для TRUNCATE и внешних ключей.
+GENERATED_TABLES = (
+    "order_items", "orders", "inventory_shards", "inventory", "products", "categories", "clients",
+    "product_sales_deltas", "sales_rollup_pending", "hourly_product_sales", "daily_product_sales",
+    "hourly_client_sales", "daily_client_sales",
+)
+# Большие таблицы: на время загрузки без триггеров и вторичных индексов.
+BULK_TABLES = ("orders", "order_items")
+SEQUENCES = {"clients": "clients_id_seq", "categories": "categories_id_seq",
+             "products": "products_id_seq", "orders": "orders_id_seq"}
+
+FIRST_NAMES = ("Alice", "Bob", "Carol", "Dmitry", "Elena", "Farid", "Gleb", "Hanna", "Ivan", "Julia",
+               "Kirill", "Lena", "Maxim", "Nina", "Oleg", "Polina", "Roman", "Sofia", "Timur", "Vera")
+LAST_NAMES = ("Ivanov", "Petrova", "Smith", "Brown", "Kuznetsov", "Sokolova", "Novak", "Garcia",
+              "Popov", "Lebedeva", "Kim", "Muller", "Orlov", "Volkova", "Fischer", "Rossi")
+STREETS = ("Main St", "Oak Ave", "Pine Rd", "Lenina", "Mira", "Sadovaya", "River Ln", "Park Blvd")
+PRODUCT_WORDS = ("Basic", "Pro", "Mini", "Max", "Eco", "Smart", "Classic", "Ultra", "Lite", "Plus")
+# Статусы заказов старше двух суток и свежих, с весами.
+OLD_STATUSES = (("COMPLETED", 88), ("CANCELLED", 10), ("PROCESSING", 2))
+RECENT_STATUSES = (("NEW", 40), ("PROCESSING", 35), ("COMPLETED", 20), ("CANCELLED", 5))
+
+
+def _rng(seed: int, *stream) -> random.Random:
+    """Отдельный детерминированный поток случайных чисел для таблицы и куска."""
+    return random.Random("/".join(map(str, (seed, *stream))))
+
+
+def id_chunks(total: int, chunk_size: int) -> list[tuple[int, int]]:
+    """Режет id 1..total на полуоткрытые куски [start, stop)."""
+    return [(start, min(start + chunk_size, total + 1)) for start in range(1, total + 1, chunk_size)]
+
+
+def category_tree(count: int, depth: int, fanout: int) -> list[tuple[int, str, str, int | None]]:
+    """
+    Дерево обходом в ширину: fanout корней, у каждого узла до fanout детей, не глубже
+    depth уровней и не больше count узлов. Строки (id, name, path, parent_id), родители
+    раньше детей.
+    """
+    rows = []
+    level = [(None, "")]
+    for _ in range(depth):
+        next_level = []
+        for parent_id, parent_path in level:
+            for child in range(fanout):
+                if len(rows) == count:
+                    return rows
+                category_id = len(rows) + 1
+                path = f"{parent_path}.{category_id}" if parent_path else str(category_id)
+                rows.append((category_id, f"Category {category_id} ({child + 1})", path, parent_id))
+                next_level.append((category_id, path))
+        level = next_level
+    return rows
+
+
+def product_catalog(seed: int, products: int, leaf_ids: list[int]) -> tuple[list[Decimal], list[int]]:
+    """Цены и категории всех товаров (индекс - id - 1). Нужны и товарам, и позициям заказов."""
+    rng = _rng(seed, "catalog")
+    prices = [Decimal(round(rng.lognormvariate(3.5, 1.0), 2)).quantize(Decimal("0.01")) for _ in range(products)]
+    categories = [rng.choice(leaf_ids) for _ in range(products)]
+    return prices, categories
+
+
+def popularity(seed: int, products: int, skew: float) -> tuple[list[int], list[float]]:
+    """Товары в случайном порядке популярности и накопленные веса Ципфа для random.choices."""
+    ranked = list(range(1, products + 1))
+    _rng(seed, "popularity").shuffle(ranked)
+    return ranked, list(accumulate(1 / rank ** skew for rank in range(1, products + 1)))
+
+
+def client_rows(seed: int, start: int, stop: int):
+    rng = _rng(seed, "clients", start)
+    for client_id in range(start, stop):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        address = f"{rng.randint(1, 250)} {rng.choice(STREETS)}, apt {rng.randint(1, 400)}"
+        yield client_id, name, address
+
+
+def product_rows(seed: int, start: int, stop: int, prices: list[Decimal], categories: list[int]):
+    """Строки (id, name, price, category_id, stock)."""
+    rng = _rng(seed, "products", start)
+    for product_id in range(start, stop):
+        name = f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_WORDS)} {product_id}"
+        yield product_id, name, prices[product_id - 1], categories[product_id - 1], rng.randint(0, 5000)
+
+
+def order_rows(seed: int, start: int, stop: int, clients: int, end: datetime, days: int):
+    """Строки (id, client_id, created_at, status)."""
+    rng = _rng(seed, "orders", start)
+    period = days * 86400
+    recent = end - timedelta(days=2)
+    old_statuses, old_weights = zip(*OLD_STATUSES)
+    recent_statuses, recent_weights = zip(*RECENT_STATUSES)
+    for order_id in range(start, stop):
+        created_at = end - timedelta(seconds=rng.random() * period)
+        if created_at < recent:
+            status = rng.choices(old_statuses, old_weights)[0]
+        else:
+            status = rng.choices(recent_statuses, recent_weights)[0]
+        yield order_id, rng.randint(1, clients), created_at, status
+
+
+def order_item_rows(seed: int, start: int, stop: int, items_per_order: int,
+                    prices: list[Decimal], ranked: list[int], cum_weights: list[float]):
+    """
+    Строки (order_id, product_id, qty, price_at_moment): от 1 до 2 * items_per_order - 1
+    разных товаров на заказ, в среднем items_per_order.
+    """
+    rng = _rng(seed, "order_items", start)
+    max_items = min(2 * items_per_order - 1, len(ranked))
+    for order_id in range(start, stop):
+        picked = set()
+        for product_id in rng.choices(ranked, cum_weights=cum_weights, k=rng.randint(1, max_items)):
+            # Повтор популярного товара в том же заказе - берем другой случайный товар.
+            while product_id in picked:
+                product_id = ranked[rng.randrange(len(ranked))]
+            picked.add(product_id)
+            yield order_id, product_id, rng.choices((1, 2, 3, 5), (70, 20, 8, 2))[0], prices[product_id - 1]
+
+
+def _copy(conn: psycopg.Connection, statement: str, rows) -> int:
+    count = 0
+    with conn.cursor().copy(statement) as copy:
+        for row in rows:
+            copy.write_row(row)
+            count += 1
+    return count
+
+
+# Состояние рабочего процесса: каталог и популярность считаются один раз при старте.
+_worker: dict = {}
+
+
+def _init_worker(dsn: str, args: argparse.Namespace, leaf_ids: list[int]):
+    _worker["dsn"] = dsn
+    _worker["args"] = args
+    _worker["prices"], _worker["categories"] = product_catalog(args.seed, args.products, leaf_ids)
+    _worker["ranked"], _worker["cum_weights"] = popularity(args.seed, args.products, args.skew)
+
+
+def _load_clients(start: int, stop: int) -> int:
+    with psycopg.connect(_worker["dsn"]) as conn:
+        return _copy(conn, "COPY clients (id, name, address) FROM STDIN", client_rows(_worker["args"].seed, start, stop))
+
+
+def _load_products(start: int, stop: int) -> int:
+    rows = list(product_rows(_worker["args"].seed, start, stop, _worker["prices"], _worker["categories"]))
+    with psycopg.connect(_worker["dsn"]) as conn:
+        _copy(conn, "COPY products (id, name, price, category_id) FROM STDIN", (row[:4] for row in rows))
+        return _copy(conn, "COPY inventory (product_id, stock) FROM STDIN", ((row[0], row[4]) for row in rows))
+
+
+def _load_orders(start: int, stop: int) -> int:
+    args = _worker["args"]
+    with psycopg.connect(_worker["dsn"]) as conn:
+        _copy(conn, "COPY orders (id, client_id, created_at, status) FROM STDIN",
+              order_rows(args.seed, start, stop, args.clients, args.end, args.days))
+        return _copy(conn, "COPY order_items (order_id, product_id, qty, price_at_moment) FROM STDIN",
+                     order_item_rows(args.seed, start, stop, args.items_per_order,
+                                     _worker["prices"], _worker["ranked"], _worker["cum_weights"]))
+
+
+def _run_chunks(pool: ProcessPoolExecutor, label: str, loader, total: int, chunk_size: int):
+    started = time.perf_counter()
+    rows = sum(pool.map(loader, *zip(*id_chunks(total, chunk_size)))) if total else 0
+    elapsed = time.perf_counter() - started
+    print(f"{label}: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)", file=sys.stderr)
+
+
+def _secondary_indexes(conn: psycopg.Connection) -> list[tuple[str, str]]:
+    """Индексы больших таблиц, кроме тех, что обслуживают ограничения (PK, UNIQUE)."""
+    return conn.execute(
+        """
+        SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = ANY(%s::regclass[])
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+        """,
+        (list(BULK_TABLES),),
+    ).fetchall()
+
+
+def generate(args: argparse.Namespace, dsn: str = DATABASE_URL):
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        if args.truncate:
+            conn.execute(f"TRUNCATE {', '.join(GENERATED_TABLES)} RESTART IDENTITY CASCADE")
+        elif conn.execute("SELECT EXISTS (SELECT 1 FROM clients)").fetchone()[0]:
+            raise SystemExit("database is not empty, pass --truncate to replace its data")
+
+        categories = category_tree(args.categories, args.depth, args.fanout)
+        parents = {row[3] for row in categories}
+        leaf_ids = [row[0] for row in categories if row[0] not in parents]
+        with conn.transaction():
+            _copy(conn, "COPY categories (id, name, path, parent_id) FROM STDIN", categories)
+        print(f"categories: {len(categories)} rows, {len(leaf_ids)} leaves", file=sys.stderr)
+
+        indexes = _secondary_indexes(conn)
+        for table in BULK_TABLES:
+            conn.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER")
+        for name, _ in indexes:
+            conn.execute(f"DROP INDEX {name}")
+        try:
+            with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(dsn, args, leaf_ids)) as pool:
+                _run_chunks(pool, "clients", _load_clients, args.clients, args.chunk_size)
+                _run_chunks(pool, "products", _load_products, args.products, args.chunk_size)
+                _run_chunks(pool, "order items", _load_orders, args.orders, max(1, args.chunk_size // args.items_per_order))
+        finally:
+            started = time.perf_counter()
+            for _, definition in indexes:
+                conn.execute(definition)
+            for table in BULK_TABLES:
+                conn.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER")
+            print(f"indexes: {len(indexes)} rebuilt in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        for table, sequence in SEQUENCES.items():
+            conn.execute(f"SELECT setval('{sequence}', COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+        with conn.transaction():
+            conn.execute("DELETE FROM product_sales_deltas")
+            conn.execute(
+                """
+                UPDATE products p SET total_sold = s.sold
+                FROM (SELECT product_id, SUM(qty)::int AS sold FROM order_items GROUP BY product_id) s
+                WHERE p.id = s.product_id
+                """
+            )
+        first_day, last_day = conn.execute(
+            "SELECT MIN(created_at)::date, MAX(created_at)::date FROM orders"
+        ).fetchone()
+        conn.execute("ANALYZE")
+
+    if first_day is not None:
+        started = time.perf_counter()
+        # Пересчет по месяцу за транзакцию: накладные расходы на вызов больше, чем на лишний день.
+        chunks = backfill(first_day, last_day + timedelta(days=1), args.workers, chunk_days=30, dsn=dsn)
+        print(f"rollups: {chunks} chunks rebuilt in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        # Все заказы уже учтены бэкфиллом; инкрементальный пересчет продолжит с этого момента.
+        conn.execute("UPDATE rollup_watermarks SET watermark = now(), refreshed_at = now() WHERE name = 'sales'")
+        conn.execute("DELETE FROM sales_rollup_pending")
+        conn.execute("ANALYZE hourly_product_sales, daily_product_sales, hourly_client_sales, daily_client_sales")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m db.generate", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=1_000)
+    parser.add_argument("--depth", type=int, default=4, help="maximum depth of the category tree")
+    parser.add_argument("--fanout", type=int, default=6, help="children per category (and number of roots)")
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--items-per-order", type=int, default=5, help="average distinct products per order")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of product popularity")
+    parser.add_argument("--days", type=int, default=365, help="orders are spread over this many days before --end")
+    parser.add_argument("--end", type=datetime.fromisoformat,
+                        default=datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0),
+                        help="end of the order history, ISO timestamp (default: start of the current hour, UTC)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="parallel loader processes")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="rows per COPY transaction")
+    parser.add_argument("--truncate", action="store_true", help="remove existing data first")
+    args = parser.parse_args(argv)
+
+    if min(args.clients, args.categories, args.depth, args.fanout, args.products,
+           args.items_per_order, args.days, args.workers, args.chunk_size) < 1 or args.orders < 0:
+        parser.error("all sizes must be positive")
+    if args.end.tzinfo is None:
+        args.end = args.end.replace(tzinfo=timezone.utc)
+    generate(args)
+
+
+if __name__ == "__main__":
+    main()
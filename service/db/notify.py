@@ -0,0 +1,72 @@
+"""
+Подписка на PostgreSQL LISTEN/NOTIFY.
+
+Один фоновый таск на воркер держит выделенное autocommit-соединение (вне пула),
+слушает зарегистрированные каналы и вызывает обработчики. После (пере)подключения
+обработчики вызываются с payload=None: уведомления, пришедшие, пока соединения
+не было, могли потеряться, и подписчики должны сбросить свое состояние.
+"""
+import asyncio
+import logging
+from typing import Callable, Optional
+
+from psycopg import AsyncConnection, sql
+
+from db.session import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY_SECONDS = 1.0
+
+NotificationHandler = Callable[[Optional[str]], None]
+
+
+class NotificationListener:
+    def __init__(self):
+        self._handlers: dict[str, list[NotificationHandler]] = {}
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, channel: str, handler: NotificationHandler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def _dispatch(self, channel: str, payload: Optional[str]):
+        for handler in self._handlers.get(channel, []):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Notification handler for %s failed", channel)
+
+    async def _listen(self):
+        async with await AsyncConnection.connect(DATABASE_URL, autocommit=True) as conn:
+            for channel in self._handlers:
+                await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+            for channel in self._handlers:
+                self._dispatch(channel, None)
+            async for notify in conn.notifies():
+                self._dispatch(notify.channel, notify.payload)
+
+    async def _run(self):
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("LISTEN connection lost (%s), reconnecting", e)
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    def start(self):
+        if self._handlers and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+listener = NotificationListener()
@@ -0,0 +1,230 @@
+"""
+Массовая загрузка каталога через COPY.
+
+Строки из потока запроса по одной пишутся в COPY во временную staging-таблицу
+(все поля - text), затем проверяются и раскладываются по products и inventory
+set-based запросами. Память приложения не зависит от размера файла.
+"""
+import csv
+import json
+from typing import AsyncIterator, Literal
+
+from psycopg import AsyncCursor
+
+IMPORT_COLUMNS = ("id", "name", "price", "category_id", "initial_stock")
+REQUIRED_COLUMNS = ("name", "price", "category_id")
+MAX_REPORTED_ERRORS = 100
+# Предел длины одной записи CSV, включая переводы строк внутри кавычек.
+MAX_RECORD_SIZE = 64 * 1024
+
+ImportFormat = Literal["csv", "ndjson"]
+
+
+class ImportFormatError(ValueError):
+    """Поток не удается разобрать целиком (например, нет заголовка CSV)."""
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Режет поток байтов на строки, не накапливая его в памяти."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace").rstrip("\r")
+
+
+def _ends_in_quoted_field(line: str, in_quotes: bool) -> bool:
+    """
+    Остается ли после строки открытым поле в кавычках - по правилам csv.reader с
+    диалектом по умолчанию: кавычка открывает поле только в его начале, "" внутри
+    кавычек - экранированная кавычка, в поле без кавычек кавычка - обычный символ.
+    """
+    if '"' not in line:
+        return in_quotes
+    state = "quoted" if in_quotes else "start"
+    for char in line:
+        if state == "quoted":
+            if char == '"':
+                state = "quote"
+        elif char == ",":
+            state = "start"
+        elif state == "quote":
+            state = "quoted" if char == '"' else "unquoted"
+        elif state == "start":
+            state = "quoted" if char == '"' else "unquoted"
+    return state == "quoted"
+
+
+async def _iter_records(lines: AsyncIterator[str], fmt: ImportFormat) -> AsyncIterator[tuple[int, dict | None]]:
+    """
+    Выдает пары (номер строки, запись). Вместо нераспознанной строки выдается None,
+    чтобы она попала в отчет об ошибках, а не оборвала загрузку.
+
+    Запись CSV может занимать несколько строк (перевод строки внутри поля в кавычках);
+    номером записи считается номер ее первой строки. Запись длиннее MAX_RECORD_SIZE
+    (незакрытая кавычка в начале поля) считается нераспознанной, и разбор продолжается
+    со следующей строки - так буфер не растет с размером файла.
+    """
+    header = None
+    line_no = 0
+    pending, pending_line_no, pending_size = [], 0, 0
+    async for line in lines:
+        line_no += 1
+        if not pending and not line.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_no, record if isinstance(record, dict) else None
+            continue
+        if not pending:
+            pending_line_no = line_no
+        pending.append(line)
+        pending_size += len(line)
+        if _ends_in_quoted_field(line, in_quotes=len(pending) > 1):
+            if pending_size <= MAX_RECORD_SIZE:
+                continue
+            fields = None
+        else:
+            fields = next(csv.reader(["\n".join(pending)]))
+        pending, pending_size = [], 0
+        if header is None:
+            header = [name.strip() for name in fields or []]
+            missing = [name for name in REQUIRED_COLUMNS if name not in header]
+            if missing:
+                raise ImportFormatError(f"CSV header is missing columns: {', '.join(missing)}")
+            continue
+        yield pending_line_no, dict(zip(header, fields)) if fields and len(fields) == len(header) else None
+    if pending:
+        yield pending_line_no, None
+
+
+def _text(value) -> str | None:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+async def import_products(cursor: AsyncCursor, lines: AsyncIterator[str], fmt: ImportFormat) -> dict:
+    # COPY длится столько же, сколько идет загрузка файла, поэтому общий
+    # statement_timeout пула здесь неприменим.
+    await cursor.execute("SET LOCAL statement_timeout = 0")
+    await cursor.execute(
+        """
+        CREATE TEMP TABLE product_import (
+            line_no INT NOT NULL,
+            id TEXT,
+            name TEXT,
+            price TEXT,
+            category_id TEXT,
+            stock TEXT,
+            error TEXT,
+            is_new BOOLEAN NOT NULL DEFAULT false
+        ) ON COMMIT DROP
+        """
+    )
+    received = 0
+    async with cursor.copy(
+        "COPY product_import (line_no, id, name, price, category_id, stock, error) FROM STDIN"
+    ) as copy:
+        async for line_no, record in _iter_records(lines, fmt):
+            received += 1
+            if record is None:
+                await copy.write_row((line_no, None, None, None, None, None, "malformed line"))
+                continue
+            await copy.write_row((line_no, *(_text(record.get(column)) for column in IMPORT_COLUMNS), None))
+
+    # Проверки идут по порядку: к приведению типов доходим только для строк,
+    # прошедших проверку формата.
+    await cursor.execute(
+        """
+        UPDATE product_import s
+        SET error = CASE
+            WHEN s.name IS NULL THEN 'name is required'
+            WHEN s.price IS NULL OR s.price !~ '^[0-9]{1,10}(\\.[0-9]{1,2})?$' THEN 'invalid price'
+            WHEN s.category_id IS NULL OR s.category_id !~ '^[0-9]{1,18}$' THEN 'invalid category_id'
+            WHEN s.stock !~ '^[0-9]{1,9}$' THEN 'invalid initial_stock'
+            WHEN s.id !~ '^[0-9]{1,18}$' THEN 'invalid id'
+            WHEN NOT EXISTS (SELECT 1 FROM categories c WHERE c.id = s.category_id::bigint) THEN 'category not found'
+            WHEN s.id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM products p WHERE p.id = s.id::bigint) THEN 'product not found'
+        END
+        WHERE s.error IS NULL
+        """
+    )
+    # Если один id встречается несколько раз, применяется последняя строка.
+    await cursor.execute(
+        """
+        UPDATE product_import s
+        SET error = 'duplicate id, superseded by a later line'
+        WHERE s.error IS NULL AND s.id IS NOT NULL AND EXISTS (
+            SELECT 1 FROM product_import d
+            WHERE d.id = s.id AND d.line_no > s.line_no AND d.error IS NULL
+        )
+        """
+    )
+    # Новым товарам id выдается заранее из последовательности, чтобы
+    # одним INSERT ... SELECT заполнить и products, и inventory.
+    await cursor.execute(
+        """
+        UPDATE product_import
+        SET id = nextval(pg_get_serial_sequence('products', 'id'))::text, is_new = true
+        WHERE error IS NULL AND id IS NULL
+        """
+    )
+    await cursor.execute(
+        """
+        INSERT INTO products (id, name, price, category_id)
+        SELECT id::bigint, name, price::numeric, category_id::bigint
+        FROM product_import
+        WHERE error IS NULL AND is_new
+        """
+    )
+    inserted = cursor.rowcount
+    await cursor.execute(
+        """
+        UPDATE products p
+        SET name = s.name, price = s.price::numeric, category_id = s.category_id::bigint
+        FROM product_import s
+        WHERE s.error IS NULL AND NOT s.is_new AND p.id = s.id::bigint
+        """
+    )
+    updated = cursor.rowcount
+    # Для существующих товаров остаток меняется, только если он указан в файле.
+    await cursor.execute(
+        """
+        INSERT INTO inventory (product_id, stock)
+        SELECT id::bigint, COALESCE(stock::int, 0)
+        FROM product_import
+        WHERE error IS NULL AND (is_new OR stock IS NOT NULL)
+        ON CONFLICT (product_id) DO UPDATE SET stock = EXCLUDED.stock
+        """
+    )
+    # У горячих товаров новый остаток целиком лежит в inventory.stock, шарды обнуляются.
+    await cursor.execute(
+        """
+        UPDATE inventory_shards sh
+        SET stock = 0
+        FROM product_import s
+        WHERE s.error IS NULL AND NOT s.is_new AND s.stock IS NOT NULL AND sh.product_id = s.id::bigint
+        """
+    )
+    await cursor.execute("SELECT count(*) FROM product_import WHERE error IS NOT NULL")
+    rejected = (await cursor.fetchone())[0]
+    await cursor.execute(
+        "SELECT line_no, error FROM product_import WHERE error IS NOT NULL ORDER BY line_no LIMIT %s",
+        (MAX_REPORTED_ERRORS,)
+    )
+    errors = [{"line": row[0], "detail": row[1]} for row in await cursor.fetchall()]
+    return {
+        "received": received,
+        "inserted": inserted,
+        "updated": updated,
+        "rejected": rejected,
+        "errors": errors,
+    }
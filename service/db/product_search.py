@@ -0,0 +1,157 @@
+"""
+Поиск и фильтрация товаров (GET /products/search).
+
+Фильтры независимы и складываются через AND:
+*   q - название: подстрока (ILIKE '%q%') или нечеткое совпадение со словом названия
+    (q <% name, порог pg_trgm.word_similarity_threshold); оба варианта идут по
+    триграммному GIN-индексу idx_products_name_trgm;
+*   min_price / max_price - диапазон цены по idx_products_price;
+*   category_id - категория, с subtree - и все ее потомки (ltree, idx_categories_path);
+*   in_stock - только товары с положительным остатком.
+
+Сортировка - по цене, названию или total_sold в обе стороны, с id в качестве
+тай-брейкера, так что каждая сортировка совпадает с индексом (price, id), (name, id) или
+(total_sold DESC, id DESC) и страницы выбираются keyset-условием. Что ни одно сочетание
+фильтров не читает products целиком, проверяет benchmarks/bench_product_search.py.
+
+products.total_sold - сжатая база счетчика продаж (см. jobs/sales_counters.py), поэтому
+упорядочивание по ней отстает от продаж до следующего сжатия дельт. В выдаче же total_sold -
+точное значение product_total_sold(id), считаемое только для строк страницы.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Literal, Optional
+
+from psycopg import AsyncCursor
+
+ProductSort = Literal["price", "-price", "name", "-name", "total_sold", "-total_sold"]
+NameMatch = Literal["substring", "fuzzy"]
+
+# Колонка сортировки, ее номер в строке выдачи (id, name, price, category_id, stock, total_sold,
+# база total_sold) и тип значения в курсоре. Ключ курсора - индексируемая база счетчика, а не
+# точное значение из выдачи.
+SORT_COLUMNS = {
+    "price": ("p.price", 2, Decimal),
+    "name": ("p.name", 1, str),
+    "total_sold": ("p.total_sold", 6, int),
+}
+
+# Сколько строк не жалко досчитать точно: если план обещает меньше, total считается
+# count(*) с этим LIMIT, иначе берется оценка планировщика.
+EXACT_COUNT_LIMIT = 1000
+
+
+def _like_pattern(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+@dataclass(frozen=True)
+class ProductSearch:
+    q: Optional[str] = None
+    match: NameMatch = "substring"
+    min_price: Optional[Decimal] = None
+    max_price: Optional[Decimal] = None
+    category_id: Optional[int] = None
+    subtree: bool = False
+    in_stock: bool = False
+    sort: ProductSort = "name"
+
+    @property
+    def descending(self) -> bool:
+        return self.sort.startswith("-")
+
+    @property
+    def cursor_columns(self) -> tuple[int, int]:
+        """Номера колонок ключа keyset-пагинации в строке выдачи."""
+        return SORT_COLUMNS[self.sort.lstrip("-")][1], 0
+
+    @property
+    def cursor_types(self) -> tuple[type, type]:
+        return SORT_COLUMNS[self.sort.lstrip("-")][2], int
+
+    def _conditions(self) -> tuple[list[str], list]:
+        conditions, params = [], []
+        if self.q is not None:
+            if self.match == "fuzzy":
+                conditions.append("%s <%% p.name")
+                params.append(self.q)
+            else:
+                conditions.append("p.name ILIKE %s")
+                params.append(_like_pattern(self.q))
+        if self.min_price is not None:
+            conditions.append("p.price >= %s")
+            params.append(self.min_price)
+        if self.max_price is not None:
+            conditions.append("p.price <= %s")
+            params.append(self.max_price)
+        if self.category_id is not None:
+            if self.subtree:
+                conditions.append(
+                    "p.category_id IN (SELECT c.id FROM categories c"
+                    " WHERE c.path <@ (SELECT path FROM categories WHERE id = %s))"
+                )
+            else:
+                conditions.append("p.category_id = %s")
+            params.append(self.category_id)
+        if self.in_stock:
+            conditions.append("i.stock > 0")
+        return conditions, params
+
+    def _from(self, conditions: list[str]) -> str:
+        # Остаток присоединяется здесь, только если по нему фильтруют.
+        join = "JOIN inventory_stock i ON p.id = i.product_id" if self.in_stock else ""
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return f"FROM products p {join} {where}"
+
+    def page_query(self, after: Optional[list], limit: int) -> tuple[str, list]:
+        """Запрос страницы; after - ключ (значение сортировки, id) последней строки прошлой страницы."""
+        conditions, params = self._conditions()
+        column = SORT_COLUMNS[self.sort.lstrip("-")][0]
+        direction = "DESC" if self.descending else "ASC"
+        if after is not None:
+            conditions.append(f"({column}, p.id) {'<' if self.descending else '>'} (%s, %s)")
+            params.extend(after)
+        # Страница выбирается из products до соединения с остатками: иначе планировщик
+        # закладывает соединение для всех подходящих строк и предпочитает обход индекса
+        # сортировки с фильтром даже там, где выборка по индексу фильтра и сортировка дешевле.
+        sql = f"""
+            SELECT p.id, p.name, p.price, p.category_id, COALESCE(i.stock, 0) as stock,
+                   product_total_sold(p.id) as total_sold, p.total_sold as total_sold_base
+            FROM (
+                SELECT p.id, p.name, p.price, p.category_id, p.total_sold
+                {self._from(conditions)}
+                ORDER BY {column} {direction}, p.id {direction}
+                LIMIT %s
+            ) p
+            LEFT JOIN inventory_stock i ON p.id = i.product_id
+            ORDER BY {column} {direction}, p.id {direction}
+        """
+        return sql, [*params, limit]
+
+    def count_query(self) -> tuple[str, list]:
+        """Строки всей выдачи без сортировки - для оценки total."""
+        conditions, params = self._conditions()
+        return f"SELECT 1 {self._from(conditions)}", params
+
+
+async def approximate_total(cursor: AsyncCursor, search: ProductSearch) -> int:
+    """
+    Размер выдачи: для небольших выдач - точный (до EXACT_COUNT_LIMIT), для больших -
+    оценка планировщика по статистике, без прохода по всем подходящим строкам.
+    """
+    sql, params = search.count_query()
+    await cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    estimate = int((await cursor.fetchone())[0][0]["Plan"]["Plan Rows"])
+    if estimate >= EXACT_COUNT_LIMIT:
+        return estimate
+    await cursor.execute(f"SELECT count(*) FROM ({sql} LIMIT %s) t", [*params, EXACT_COUNT_LIMIT])
+    return (await cursor.fetchone())[0]
+
+
+def seq_scanned_tables(plan: dict) -> list[str]:
+    """Таблицы, которые план (узел из EXPLAIN (FORMAT JSON)) читает последовательным сканированием."""
+    tables = [plan["Relation Name"]] if plan.get("Node Type") == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        tables.extend(seq_scanned_tables(child))
+    return tables
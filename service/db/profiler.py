@@ -0,0 +1,229 @@
+"""
+Профилировщик медленных запросов (включается DB_PROFILER_ENABLED=1).
+
+InstrumentedCursor (db/session.py) передает сюда каждый выполненный запрос. Запрос
+дольше DB_PROFILER_SLOW_MS попадает в кольцевой буфер последних DB_PROFILER_BUFFER_SIZE
+записей: отпечаток, текст, параметры без значений строк и коллекций, длительность и
+маршрут. Для доли DB_PROFILER_SAMPLE_RATE таких запросов фоновый таск повторяет запрос
+на отдельном соединении (вне пула) под EXPLAIN (ANALYZE, BUFFERS) в транзакции READ ONLY,
+которая всегда откатывается. Если запрос что-то пишет (INSERT, reserve_stock и т.п.),
+READ ONLY не дает ему выполниться, и сохраняется план без ANALYZE.
+
+ProfilerMiddleware считает запросы каждого HTTP-запроса: если один и тот же запрос
+выполнился DB_PROFILER_N_PLUS_ONE раз или больше, это похоже на N+1, и запрос
+попадает в отдельный буфер. Оба буфера отдает GET /admin/slow-queries.
+"""
+import asyncio
+import logging
+import os
+import random
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Optional
+
+from psycopg import AsyncConnection, errors, sql
+
+from utils.metrics import UNMATCHED_ROUTE, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+DB_PROFILER_ENABLED = os.getenv("DB_PROFILER_ENABLED", "0") == "1"
+DB_PROFILER_SLOW_MS = float(os.getenv("DB_PROFILER_SLOW_MS", "200"))
+DB_PROFILER_SAMPLE_RATE = float(os.getenv("DB_PROFILER_SAMPLE_RATE", "1"))
+DB_PROFILER_BUFFER_SIZE = int(os.getenv("DB_PROFILER_BUFFER_SIZE", "100"))
+DB_PROFILER_EXPLAIN_TIMEOUT_MS = int(os.getenv("DB_PROFILER_EXPLAIN_TIMEOUT_MS", "5000"))
+DB_PROFILER_N_PLUS_ONE = int(os.getenv("DB_PROFILER_N_PLUS_ONE", "10"))
+
+# Сколько медленных запросов может ждать EXPLAIN; остальные сохраняются без плана.
+_EXPLAIN_QUEUE_SIZE = 16
+
+DB_SLOW_QUERIES = Counter("db_slow_queries_total", "Statements slower than DB_PROFILER_SLOW_MS.", ("statement",))
+DB_N_PLUS_ONE = Counter("db_n_plus_one_total", "Requests that repeated one statement too many times.", ("route",))
+HTTP_REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements executed per HTTP request.", ("route",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 500),
+)
+
+
+def _query_text(query) -> str:
+    text = query if isinstance(query, str) else (
+        query.decode() if isinstance(query, bytes) else query.as_string(None)
+    )
+    return " ".join(text.split())
+
+
+def _redact(value: Any) -> Any:
+    """Числа, даты и флаги оставляем (обычно это id и границы), строки и коллекции скрываем."""
+    if value is None or isinstance(value, (bool, int, float, Decimal)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    if isinstance(value, (list, tuple)):
+        return f"<list:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_params(params) -> Any:
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _redact(value) for key, value in params.items()}
+    return [_redact(value) for value in params]
+
+
+def _route_label(scope: dict) -> str:
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route is not None else UNMATCHED_ROUTE}"
+
+
+@dataclass
+class _RequestStatements:
+    scope: dict
+    total: int = 0
+    by_fingerprint: dict[str, int] = field(default_factory=dict)
+    repeated: dict[str, str] = field(default_factory=dict)
+
+
+_request_statements: ContextVar[Optional[_RequestStatements]] = ContextVar("request_statements", default=None)
+
+
+class QueryProfiler:
+    def __init__(self):
+        self.enabled = DB_PROFILER_ENABLED
+        self.slow_ms = DB_PROFILER_SLOW_MS
+        self.sample_rate = DB_PROFILER_SAMPLE_RATE
+        self.n_plus_one = DB_PROFILER_N_PLUS_ONE
+        self.slow_queries: deque[dict] = deque(maxlen=DB_PROFILER_BUFFER_SIZE)
+        self.n_plus_one_reports: deque[dict] = deque(maxlen=DB_PROFILER_BUFFER_SIZE)
+        self._dsn: str | None = None
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def observe(self, fingerprint: str, query, params, seconds: float):
+        """Вызывается курсором после каждого запроса, когда профилировщик включен."""
+        stats = _request_statements.get()
+        if stats is not None:
+            stats.total += 1
+            repeats = stats.by_fingerprint[fingerprint] = stats.by_fingerprint.get(fingerprint, 0) + 1
+            if repeats == self.n_plus_one:
+                stats.repeated[fingerprint] = _query_text(query)
+        if seconds * 1000 < self.slow_ms:
+            return
+        DB_SLOW_QUERIES.inc((fingerprint,))
+        capture = {
+            "fingerprint": fingerprint,
+            "query": _query_text(query),
+            "params": redact_params(params),
+            "duration_ms": round(seconds * 1000, 3),
+            "route": _route_label(stats.scope) if stats is not None else None,
+            "captured_at": datetime.now(timezone.utc),
+            "plan": None,
+            "plan_error": None,
+        }
+        self.slow_queries.append(capture)
+        if self._queue is None or random.random() >= self.sample_rate:
+            return
+        try:
+            self._queue.put_nowait((capture, query, params))
+        except asyncio.QueueFull:
+            capture["plan_error"] = "explain queue is full"
+
+    def report_request(self, route: str, stats: _RequestStatements):
+        HTTP_REQUEST_SQL_STATEMENTS.observe(stats.total, (route,))
+        if not stats.repeated:
+            return
+        DB_N_PLUS_ONE.inc((route,))
+        now = datetime.now(timezone.utc)
+        for fingerprint, query in stats.repeated.items():
+            logger.warning(
+                "Possible N+1 on %s: statement %s ran %d times", route, fingerprint, stats.by_fingerprint[fingerprint]
+            )
+            self.n_plus_one_reports.append({
+                "route": route,
+                "fingerprint": fingerprint,
+                "query": query,
+                "repeats": stats.by_fingerprint[fingerprint],
+                "statements": stats.total,
+                "captured_at": now,
+            })
+
+    async def _explain_with(self, conn: AsyncConnection, options: str, query, params) -> str:
+        prefix = f"EXPLAIN ({options}) "
+        statement = prefix + query if isinstance(query, str) else sql.SQL(prefix) + query
+        async with conn.transaction(force_rollback=True):
+            await conn.execute("SET TRANSACTION READ ONLY")
+            rows = await (await conn.execute(statement, params)).fetchall()
+        return "\n".join(row[0] for row in rows)
+
+    async def _explain(self, conn: AsyncConnection, query, params) -> str:
+        try:
+            return await self._explain_with(conn, "ANALYZE, BUFFERS", query, params)
+        except errors.ReadOnlySqlTransaction:
+            # Запрос пишет в БД - показываем только план.
+            return await self._explain_with(conn, "BUFFERS FALSE", query, params)
+
+    async def _run(self):
+        conn: AsyncConnection | None = None
+        while True:
+            capture, query, params = await self._queue.get()
+            try:
+                if conn is None or conn.closed:
+                    conn = await AsyncConnection.connect(
+                        self._dsn, autocommit=True, options=f"-c statement_timeout={DB_PROFILER_EXPLAIN_TIMEOUT_MS}"
+                    )
+                capture["plan"] = await self._explain(conn, query, params)
+            except asyncio.CancelledError:
+                if conn is not None:
+                    await conn.close()
+                raise
+            except Exception as e:
+                capture["plan_error"] = str(e) or type(e).__name__
+                if conn is not None and conn.broken:
+                    conn = None
+
+    def start(self, dsn: str):
+        if self.enabled and self._task is None:
+            self._dsn = dsn
+            self._queue = asyncio.Queue(maxsize=_EXPLAIN_QUEUE_SIZE)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._queue = None
+
+    def clear(self):
+        self.slow_queries.clear()
+        self.n_plus_one_reports.clear()
+
+
+profiler = QueryProfiler()
+
+
+class ProfilerMiddleware:
+    """Считает SQL-запросы каждого HTTP-запроса, пока профилировщик включен."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+        stats = _RequestStatements(scope)
+        token = _request_statements.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_statements.reset(token)
+            profiler.report_request(_route_label(scope), stats)
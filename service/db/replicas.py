@@ -0,0 +1,211 @@
+"""
+Маршрутизация чтения на реплики.
+
+Если задан DATABASE_REPLICA_URLS (список DSN через запятую), для каждой реплики
+создается свой пул, а фоновая проверка раз в DB_REPLICA_CHECK_INTERVAL секунд
+измеряет отставание воспроизведения WAL. Реплика, которая не отвечает или отстает
+больше DB_REPLICA_MAX_LAG секунд, исключается из балансировки до следующей успешной
+проверки. Если здоровых реплик нет (или они не заданы), чтение идет в основную БД
+в транзакции READ ONLY.
+
+Балансировка (DB_REPLICA_BALANCE): round_robin или least_connections.
+
+Зависимость get_read_db_connection предназначена только для обработчиков, которые
+ничего не пишут и допускают отставание данных на величину DB_REPLICA_MAX_LAG.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from psycopg import AsyncConnection
+from psycopg.conninfo import conninfo_to_dict
+from psycopg_pool import AsyncConnectionPool, PoolTimeout, TooManyRequests
+
+from db import session
+from db.session import (
+    CONNECTION_KWARGS, DB_POOL_ACQUIRE_WAIT, DB_POOL_IN_USE, DB_POOL_MAX_LIFETIME, DB_POOL_MAX_SIZE_GAUGE,
+    DB_POOL_SATURATION, DB_POOL_SIZE, DB_POOL_WAITING, InstrumentedConnection, acquire_connection,
+)
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_BALANCE = os.getenv("DB_REPLICA_BALANCE", "round_robin")
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "2"))
+DB_REPLICA_POOL_MAX_SIZE = int(os.getenv("DB_REPLICA_POOL_MAX_SIZE", str(session.DB_POOL_MAX_SIZE)))
+# Сколько ждать соединение с репликой, прежде чем уйти на основную БД.
+DB_REPLICA_TIMEOUT = float(os.getenv("DB_REPLICA_TIMEOUT", "1"))
+
+# Отставание: 0, если все полученное WAL уже применено (на простаивающем кластере
+# pg_last_xact_replay_timestamp стоит на месте), иначе возраст последней примененной транзакции.
+_LAG_QUERY = """
+    SELECT pg_is_in_recovery(),
+           CASE
+               WHEN NOT pg_is_in_recovery() THEN 0
+               WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+               ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+           END
+"""
+
+
+async def _configure_replica(conn: AsyncConnection):
+    await conn.set_read_only(True)
+
+
+class Replica:
+    def __init__(self, url: str):
+        params = conninfo_to_dict(url)
+        self.name = f"{params.get('host', 'localhost')}:{params.get('port', 5432)}/{params.get('dbname', '')}"
+        self.pool = AsyncConnectionPool(
+            url,
+            min_size=1,
+            max_size=DB_REPLICA_POOL_MAX_SIZE,
+            timeout=DB_REPLICA_TIMEOUT,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            check=AsyncConnectionPool.check_connection,
+            connection_class=InstrumentedConnection,
+            kwargs=CONNECTION_KWARGS,
+            configure=_configure_replica,
+            open=False,
+        )
+        self.healthy = False
+        self.lag_seconds: float | None = None
+        self.in_use = 0
+
+    async def check(self):
+        try:
+            async with self.pool.connection(timeout=DB_REPLICA_TIMEOUT) as conn:
+                in_recovery, lag = await (await conn.execute(_LAG_QUERY)).fetchone()
+        except Exception as e:
+            if self.healthy:
+                logger.warning("Replica %s is unavailable (%s), routing reads elsewhere", self.name, e)
+            self.healthy, self.lag_seconds = False, None
+            return
+        self.lag_seconds = float(lag) if lag is not None else None
+        healthy = self.lag_seconds is not None and self.lag_seconds <= DB_REPLICA_MAX_LAG
+        if healthy != self.healthy:
+            logger.warning("Replica %s is %s (lag %s s)", self.name, "back" if healthy else "ejected", self.lag_seconds)
+        self.healthy = healthy
+        if not in_recovery:
+            logger.warning("Replica %s is not in recovery (promoted?)", self.name)
+
+
+class ReplicaSet:
+    def __init__(self, urls: list[str], balance: str = DB_REPLICA_BALANCE):
+        if balance not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown DB_REPLICA_BALANCE: {balance}")
+        self.balance = balance
+        self.replicas = [Replica(url) for url in urls]
+        self._round_robin = itertools.count()
+        self._task: asyncio.Task | None = None
+
+    async def _run_checks(self):
+        while True:
+            await asyncio.gather(*(replica.check() for replica in self.replicas))
+            await asyncio.sleep(DB_REPLICA_CHECK_INTERVAL)
+
+    async def open(self):
+        if not self.replicas:
+            return
+        for replica in self.replicas:
+            await replica.pool.open(wait=False)
+        self._task = asyncio.create_task(self._run_checks())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.pool.close()
+
+    def pick(self) -> Replica | None:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.balance == "least_connections":
+            return min(healthy, key=lambda replica: replica.in_use)
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    def get_stats(self) -> list[dict]:
+        stats = []
+        for replica in self.replicas:
+            pool_stats = replica.pool.get_stats()
+            stats.append({
+                "name": replica.name,
+                "healthy": replica.healthy,
+                "lag_seconds": replica.lag_seconds,
+                "in_use": replica.in_use,
+                "size": pool_stats.get("pool_size", 0),
+            })
+        return stats
+
+
+replica_set = ReplicaSet(DATABASE_REPLICA_URLS)
+
+
+async def _replica_connection(replica: Replica) -> AsyncConnection | None:
+    started = time.perf_counter()
+    try:
+        return await replica.pool.getconn()
+    except (PoolTimeout, TooManyRequests):
+        logger.warning("Replica %s pool is exhausted, reading from primary", replica.name)
+        return None
+    finally:
+        DB_POOL_ACQUIRE_WAIT.observe(time.perf_counter() - started, (replica.name,))
+
+
+def _collect_replica_pool_metrics():
+    for replica in replica_set.replicas:
+        stats = replica.pool.get_stats()
+        labels = (replica.name,)
+        max_size = stats.get("pool_max", DB_REPLICA_POOL_MAX_SIZE)
+        DB_POOL_SIZE.set(stats.get("pool_size", 0), labels)
+        DB_POOL_MAX_SIZE_GAUGE.set(max_size, labels)
+        DB_POOL_IN_USE.set(replica.in_use, labels)
+        DB_POOL_WAITING.set(stats.get("requests_waiting", 0), labels)
+        DB_POOL_SATURATION.set(replica.in_use / max_size if max_size else 0.0, labels)
+
+
+REGISTRY.on_collect(_collect_replica_pool_metrics)
+
+
+@asynccontextmanager
+async def read_db_connection():
+    """
+    Транзакция только для чтения: на здоровой реплике, а если таких нет - на основной БД
+    (соединение переводится в READ ONLY и сбрасывается при возврате в пул).
+    """
+    replica = replica_set.pick()
+    conn = await _replica_connection(replica) if replica else None
+    if conn is None:
+        replica, pool = None, session.connection_pool
+        conn = await acquire_connection()
+    else:
+        pool = replica.pool
+        replica.in_use += 1
+    try:
+        if replica is None:
+            await conn.set_read_only(True)
+        yield conn
+        await conn.commit()
+    except Exception as e:
+        await conn.rollback()
+        raise e
+    finally:
+        if replica is not None:
+            replica.in_use -= 1
+        await pool.putconn(conn)
+
+
+async def get_read_db_connection():
+    async with read_db_connection() as conn:
+        yield conn
@@ -0,0 +1,3 @@
+#!/bin/sh
+# Разрешает потоковую репликацию для реплики из docker-compose.replica.yml.
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
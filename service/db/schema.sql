@@ -1,6 +1,7 @@
 
 
 CREATE EXTENSION IF NOT EXISTS "ltree";
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
 
 CREATE TABLE clients (
     id BIGSERIAL PRIMARY KEY,
@@ -28,7 +29,13 @@ CREATE TABLE products(
     category_id BIGINT NOT NULL REFERENCES categories(id) ON DELETE RESTRICT
 );
 
-CREATE INDEX idx_products_category_id ON products(category_id);
+-- (category_id, id): выборка товаров поддерева категорий с keyset-пагинацией по id.
+CREATE INDEX idx_products_category_id ON products(category_id, id);
+-- Поиск товаров (GET /products/search): триграммы - для ILIKE '%...%' и нечеткого
+-- поиска по словам (<%), (price, id) и (name, id) - для сортировки с keyset-пагинацией.
+CREATE INDEX idx_products_name_trgm ON products USING GIN(name gin_trgm_ops);
+CREATE INDEX idx_products_price ON products(price, id);
+CREATE INDEX idx_products_name ON products(name, id);
 
 DO $$
 BEGIN
@@ -43,9 +50,31 @@ END$$;
 
 CREATE TABLE inventory(
     product_id BIGINT PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
-    stock INT NOT NULL CHECK(stock >= 0)
+    stock INT NOT NULL CHECK(stock >= 0),
+    -- > 0 - "горячий" товар: остаток разложен по shard_count строкам inventory_shards,
+    -- а stock хранит только еще не разложенную часть (см. reserve_stock ниже).
+    shard_count INT NOT NULL DEFAULT 0 CHECK(shard_count >= 0)
 );
 
+CREATE TABLE inventory_shards(
+    product_id BIGINT NOT NULL REFERENCES inventory(product_id) ON DELETE CASCADE,
+    shard INT NOT NULL,
+    stock INT NOT NULL CHECK(stock >= 0),
+    PRIMARY KEY(product_id, shard)
+);
+
+-- Точный остаток товара: неразложенная часть плюс сумма шардов.
+CREATE VIEW inventory_stock AS
+SELECT
+    i.product_id,
+    i.stock + CASE
+        WHEN i.shard_count > 0
+        THEN (SELECT COALESCE(SUM(s.stock), 0)::int FROM inventory_shards s WHERE s.product_id = i.product_id)
+        ELSE 0
+    END AS stock,
+    i.shard_count
+FROM inventory i;
+
 
 CREATE TABLE orders(
     id BIGSERIAL PRIMARY KEY,
@@ -54,9 +83,23 @@ CREATE TABLE orders(
     status order_status NOT NULL DEFAULT 'NEW'
 );
 
+-- Допустимые переходы статусов заказа; проверяются в SQL при смене статуса (order_router).
+CREATE TABLE order_status_transitions (
+    from_status order_status NOT NULL,
+    to_status order_status NOT NULL,
+    PRIMARY KEY (from_status, to_status)
+);
+
+INSERT INTO order_status_transitions (from_status, to_status) VALUES
+    ('NEW', 'PROCESSING'),
+    ('NEW', 'CANCELLED'),
+    ('PROCESSING', 'COMPLETED'),
+    ('PROCESSING', 'CANCELLED');
+
 CREATE INDEX idx_orders_client_created ON orders(client_id, created_at);
 CREATE INDEX idx_orders_status_created ON orders(status, created_at);
-CREATE INDEX idx_orders_created_at ON orders(created_at DESC);
+-- id - тай-брейкер для keyset-пагинации списка заказов по (created_at, id).
+CREATE INDEX idx_orders_created_at ON orders(created_at DESC, id DESC);
 CREATE TABLE order_items(
     order_id BIGINT NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
     product_id BIGINT NOT NULL REFERENCES products(id) ON DELETE RESTRICT,
@@ -67,4 +110,157 @@ CREATE TABLE order_items(
 );
 
 CREATE INDEX idx_order_item_order ON order_items(order_id);
-CREATE INDEX idx_order_item_product ON order_items(product_id);
\ No newline at end of file
+CREATE INDEX idx_order_item_product ON order_items(product_id);
+
+-- Уведомление для кэша дерева категорий в воркерах приложения (см. service/cache/category_tree.py).
+-- Statement-level: одно уведомление на оператор, PostgreSQL еще и схлопывает их в рамках транзакции.
+CREATE OR REPLACE FUNCTION notify_category_tree_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('category_tree_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER categories_notify_trigger
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON categories
+FOR EACH STATEMENT EXECUTE FUNCTION notify_category_tree_changed();
+
+-- Уведомление для кэша карточек товаров (service/cache/products.py): id измененных
+-- товаров через запятую, а при массовых изменениях - пустая строка (сбросить все).
+-- Срабатывает только на поля карточки: перенос счетчика продаж в total_sold кэш не трогает.
+CREATE OR REPLACE FUNCTION notify_products_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_ids BIGINT[];
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT array_agg(id) INTO v_ids FROM (SELECT id FROM old_products LIMIT 101) t;
+    ELSE
+        SELECT array_agg(id) INTO v_ids FROM (
+            SELECT o.id FROM old_products o JOIN new_products n ON n.id = o.id
+            WHERE (o.name, o.price, o.category_id) IS DISTINCT FROM (n.name, n.price, n.category_id)
+            LIMIT 101
+        ) t;
+    END IF;
+    IF v_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('product_changed', CASE WHEN cardinality(v_ids) > 100 THEN '' ELSE array_to_string(v_ids, ',') END);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_notify_update_trigger
+AFTER UPDATE ON products
+REFERENCING OLD TABLE AS old_products NEW TABLE AS new_products
+FOR EACH STATEMENT EXECUTE FUNCTION notify_products_changed();
+
+CREATE TRIGGER products_notify_delete_trigger
+AFTER DELETE ON products
+REFERENCING OLD TABLE AS old_products
+FOR EACH STATEMENT EXECUTE FUNCTION notify_products_changed();
+
+-- =======================================
+-- РЕЗЕРВИРОВАНИЕ ОСТАТКОВ ГОРЯЧИХ ТОВАРОВ
+-- =======================================
+-- У обычного товара резерв - это UPDATE единственной строки inventory, и все покупатели
+-- одного товара выстраиваются в очередь за ее блокировкой. У горячего товара остаток
+-- разложен по шардам: резерв списывается с любого незаблокированного шарда, где хватает
+-- остатка (SKIP LOCKED), так что параллельно проходят до shard_count покупок.
+
+-- Собирает весь остаток товара и заново раскладывает его поровну по шардам.
+-- Вызывающий должен держать блокировку строки inventory.
+CREATE OR REPLACE FUNCTION rebalance_inventory_locked(p_product_id BIGINT)
+RETURNS void AS $$
+DECLARE
+    v_shards INT;
+    v_total INT;
+BEGIN
+    PERFORM 1 FROM inventory_shards WHERE product_id = p_product_id ORDER BY shard FOR UPDATE;
+    SELECT i.shard_count, i.stock + COALESCE((SELECT SUM(stock) FROM inventory_shards WHERE product_id = p_product_id), 0)
+    INTO v_shards, v_total
+    FROM inventory i WHERE i.product_id = p_product_id;
+
+    DELETE FROM inventory_shards WHERE product_id = p_product_id AND shard >= v_shards;
+    IF v_shards = 0 THEN
+        UPDATE inventory SET stock = v_total WHERE product_id = p_product_id;
+        RETURN;
+    END IF;
+    INSERT INTO inventory_shards (product_id, shard, stock)
+    SELECT p_product_id, g, v_total / v_shards + CASE WHEN g < v_total % v_shards THEN 1 ELSE 0 END
+    FROM generate_series(0, v_shards - 1) AS g
+    ON CONFLICT (product_id, shard) DO UPDATE SET stock = EXCLUDED.stock;
+    UPDATE inventory SET stock = 0 WHERE product_id = p_product_id;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Фоновая консолидация (service/jobs/inventory.py) и переключение режима товара.
+CREATE OR REPLACE FUNCTION rebalance_inventory(p_product_id BIGINT)
+RETURNS void AS $$
+BEGIN
+    PERFORM 1 FROM inventory WHERE product_id = p_product_id FOR UPDATE;
+    IF FOUND THEN
+        PERFORM rebalance_inventory_locked(p_product_id);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Списывает p_qty со склада. Возвращает true при успехе, false если остатка не хватает,
+-- NULL если у товара нет записи об остатках.
+CREATE OR REPLACE FUNCTION reserve_stock(p_product_id BIGINT, p_qty INT)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_shards INT;
+    v_shard INT;
+    v_total INT;
+BEGIN
+    SELECT shard_count INTO v_shards FROM inventory WHERE product_id = p_product_id;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    IF v_shards = 0 THEN
+        UPDATE inventory SET stock = stock - p_qty WHERE product_id = p_product_id AND stock >= p_qty;
+        RETURN FOUND;
+    END IF;
+
+    -- Быстрый путь: любой свободный шард, где хватает остатка. Случайный порядок
+    -- разводит параллельных покупателей по разным шардам.
+    SELECT shard INTO v_shard
+    FROM inventory_shards
+    WHERE product_id = p_product_id AND stock >= p_qty
+    ORDER BY random()
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED;
+    IF NOT FOUND THEN
+        -- Все подходящие шарды заняты - ждем случайный из них. Если после ожидания
+        -- в нем уже не хватает остатка, FOR UPDATE перейдет к следующему.
+        SELECT shard INTO v_shard
+        FROM inventory_shards
+        WHERE product_id = p_product_id AND stock >= p_qty
+        ORDER BY random()
+        LIMIT 1
+        FOR UPDATE;
+    END IF;
+    IF FOUND THEN
+        UPDATE inventory_shards SET stock = stock - p_qty WHERE product_id = p_product_id AND shard = v_shard;
+        RETURN true;
+    END IF;
+
+    -- Медленный путь: ни в одном шарде не хватает (остаток раздроблен или кончился).
+    -- Блокируем строку товара и все шарды по порядку, проверяем общий остаток
+    -- и раскладываем то, что осталось после списания, заново.
+    PERFORM 1 FROM inventory WHERE product_id = p_product_id FOR UPDATE;
+    PERFORM 1 FROM inventory_shards WHERE product_id = p_product_id ORDER BY shard FOR UPDATE;
+    SELECT stock INTO v_total FROM inventory_stock WHERE product_id = p_product_id;
+    IF v_total < p_qty THEN
+        RETURN false;
+    END IF;
+    UPDATE inventory_shards SET stock = 0 WHERE product_id = p_product_id;
+    UPDATE inventory SET stock = v_total - p_qty WHERE product_id = p_product_id;
+    PERFORM rebalance_inventory_locked(p_product_id);
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql;
@@ -1,34 +1,283 @@
-from contextlib import contextmanager
+import hashlib
 import os
-from urllib.parse import urlparse
-from psycopg2 import pool
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from fastapi import HTTPException, status
+from psycopg import AsyncConnection, AsyncCursor
+from psycopg.pq import TransactionStatus
+from psycopg_pool import AsyncConnectionPool, PoolTimeout, TooManyRequests
 from dotenv import load_dotenv
 
+from db.profiler import profiler
+from utils.metrics import REGISTRY, Counter, Gauge, Histogram
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-url = urlparse(DATABASE_URL)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Сколько секунд запрос ждет свободное соединение, прежде чем получить 503.
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Максимальная длина очереди ожидающих запросов (0 - без ограничения).
+DB_POOL_MAX_WAITING = int(os.getenv("DB_POOL_MAX_WAITING", "100"))
+# Соединения старше этого возраста (в секундах) пересоздаются.
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# Имена зарегистрированных запросов через запятую, которые не нужно подготавливать
+# (например, если на проде у запроса обнаружился плохой общий план).
+DB_PREPARED_DISABLED = {name.strip() for name in os.getenv("DB_PREPARED_DISABLED", "").split(",") if name.strip()}
+
+# Пул создается в lifespan приложения (см. main.py), а не при импорте,
+# чтобы сервис мог стартовать, пока Postgres еще поднимается.
+connection_pool: AsyncConnectionPool | None = None
 
-connection_pool = pool.SimpleConnectionPool(
-    1, 10,
-    dbname=url.path.lstrip("/"),
-    user=url.username,
-    password=url.password,
-    host=url.hostname,
-    port=url.port
+# Последние времена ожидания соединения (мс) для расчета p99.
+_acquire_waits_ms: deque[float] = deque(maxlen=1000)
+
+
+DB_POOL_ACQUIRE_WAIT = Histogram(
+    "db_pool_acquire_wait_seconds", "Time spent waiting for a pooled connection.", ("pool",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "Open connections in the pool.", ("pool",))
+DB_POOL_MAX_SIZE_GAUGE = Gauge("db_pool_max_size", "Pool size limit.", ("pool",))
+DB_POOL_IN_USE = Gauge("db_pool_in_use", "Connections checked out of the pool.", ("pool",))
+DB_POOL_WAITING = Gauge("db_pool_waiting", "Requests waiting for a connection.", ("pool",))
+DB_POOL_SATURATION = Gauge("db_pool_saturation", "Connections in use divided by the pool size limit.", ("pool",))
+DB_STATEMENT_DURATION = Histogram(
+    "db_statement_duration_seconds", "SQL statement execution time by statement fingerprint.", ("statement",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
 )
+DB_STATEMENT_ROWS = Counter("db_statement_rows_total", "Rows returned or affected by statement fingerprint.", ("statement",))
+DB_STATEMENT_ERRORS = Counter("db_statement_errors_total", "Failed executions by statement fingerprint.", ("statement",))
+DB_STATEMENT_INFO = Gauge("db_statement_info", "Normalized SQL text of a statement fingerprint.", ("statement", "query"))
+DB_TRANSACTIONS = Counter("db_transactions_total", "Finished transactions by outcome.", ("outcome",))
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_SPACES = re.compile(r"\s+")
+_MAX_FINGERPRINTS = 4096
+_fingerprints: dict[str, str] = {}
+
+
+def statement_fingerprint(query) -> str:
+    """
+    Короткий идентификатор запроса: хеш текста, в котором литералы заменены на ?, а
+    пробелы схлопнуты. Результат запоминается по исходному тексту, так что повторный
+    запрос стоит одного поиска в словаре; полный текст публикуется в db_statement_info.
+    """
+    fingerprint = _fingerprints.get(query) if isinstance(query, str) else None
+    if fingerprint is not None:
+        return fingerprint
+    text = query if isinstance(query, str) else (
+        query.decode() if isinstance(query, bytes) else query.as_string(None)
+    )
+    normalized = _SQL_SPACES.sub(" ", _SQL_LITERALS.sub("?", text)).strip()
+    fingerprint = hashlib.blake2b(normalized.encode(), digest_size=6).hexdigest()
+    if isinstance(query, str) and len(_fingerprints) < _MAX_FINGERPRINTS:
+        _fingerprints[query] = fingerprint
+        DB_STATEMENT_INFO.set(1, (fingerprint, normalized[:500]))
+    return fingerprint
+
+
+@dataclass(frozen=True)
+class PreparedStatement:
+    name: str
+    sql: str
+    prepare: bool
+
+
+_prepared_statements: dict[str, PreparedStatement] = {}
+
+
+def prepared_statement(name: str, sql: str, prepare: bool = True) -> PreparedStatement:
+    """
+    Регистрирует горячий запрос под именем. Курсор (InstrumentedCursor) выполняет его
+    с prepare=True: при первом выполнении на соединении psycopg подготавливает запрос
+    (PREPARE), дальше передает только параметры, и сервер не разбирает и не планирует
+    текст заново. Подготовленные запросы живут в соединении, поэтому новое соединение
+    пула (после max_lifetime или обрыва) подготавливает их заново при первом вызове.
+    То же после ROLLBACK (ошибка в обработчике): psycopg забывает подготовленные запросы.
+
+    prepare=False (или имя в DB_PREPARED_DISABLED) - запрос никогда не подготавливается,
+    даже после prepare_threshold повторов: для запросов, чей лучший план зависит от
+    параметров (массивы переменной длины, перекошенные значения).
+    """
+    statement = PreparedStatement(name, sql, prepare and name not in DB_PREPARED_DISABLED)
+    registered = _prepared_statements.setdefault(name, statement)
+    if registered.sql != sql:
+        raise ValueError(f"Prepared statement {name!r} is already registered with another query")
+    return registered
+
+
+def get_prepared_statements() -> list[PreparedStatement]:
+    return list(_prepared_statements.values())
+
+
+class InstrumentedCursor(AsyncCursor):
+    """
+    Курсор, который пишет время выполнения и число строк каждого запроса в метрики
+    и, если включен, передает запрос профилировщику (db/profiler.py). Вместо текста
+    запроса можно передать PreparedStatement из prepared_statement().
+    """
+
+    async def execute(self, query, params=None, **kwargs):
+        if isinstance(query, PreparedStatement):
+            # conn.execute() передает prepare=None явно.
+            if kwargs.get("prepare") is None:
+                kwargs["prepare"] = query.prepare
+            query = query.sql
+        fingerprint = statement_fingerprint(query)
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        except Exception:
+            DB_STATEMENT_ERRORS.inc((fingerprint,))
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            DB_STATEMENT_DURATION.observe(elapsed, (fingerprint,))
+            if self.rowcount > 0:
+                DB_STATEMENT_ROWS.inc((fingerprint,), self.rowcount)
+            if profiler.enabled:
+                profiler.observe(fingerprint, query, params, elapsed)
+
+
+class InstrumentedConnection(AsyncConnection):
+    """Соединение, которое считает завершенные транзакции (пустые COMMIT не считаются)."""
+
+    async def commit(self):
+        in_transaction = self.info.transaction_status != TransactionStatus.IDLE
+        await super().commit()
+        if in_transaction:
+            DB_TRANSACTIONS.inc(("commit",))
 
+    async def rollback(self):
+        in_transaction = self.info.transaction_status != TransactionStatus.IDLE
+        await super().rollback()
+        if in_transaction:
+            DB_TRANSACTIONS.inc(("rollback",))
 
 
-def get_db_connection():
-    conn = connection_pool.getconn()
+# Параметры каждой новой сессии; общие для основного пула и пулов реплик (db/replicas.py).
+CONNECTION_KWARGS = {
+    "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+    "cursor_factory": InstrumentedCursor,
+}
+
+
+async def _reset_connection(conn):
+    # Чтение с откатом на основную БД (db/replicas.py) включает read_only на соединении;
+    # возвращаем соединение в пул в режиме по умолчанию.
+    if conn.read_only is not None:
+        await conn.set_read_only(None)
+
+
+async def open_pool():
+    global connection_pool
+    connection_pool = AsyncConnectionPool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        max_waiting=DB_POOL_MAX_WAITING,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+        # Проверка живости соединения при каждой выдаче из пула.
+        check=AsyncConnectionPool.check_connection,
+        connection_class=InstrumentedConnection,
+        kwargs=CONNECTION_KWARGS,
+        reset=_reset_connection,
+        open=False,
+    )
+    # wait=False: не блокируем старт приложения, соединения открываются в фоне.
+    await connection_pool.open(wait=False)
+
+
+async def close_pool():
+    global connection_pool
+    if connection_pool is not None:
+        await connection_pool.close()
+        connection_pool = None
+
+
+async def acquire_connection():
+    """Берет соединение из пула, переводя исчерпание пула в 503 вместо 500."""
+    if connection_pool is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database pool is not initialized")
+    started = time.perf_counter()
+    try:
+        return await connection_pool.getconn()
+    except (PoolTimeout, TooManyRequests):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database connection pool exhausted")
+    finally:
+        waited = time.perf_counter() - started
+        _acquire_waits_ms.append(waited * 1000)
+        DB_POOL_ACQUIRE_WAIT.observe(waited, ("primary",))
+
+
+@asynccontextmanager
+async def db_connection():
+    """
+    Транзакция на соединении из пула: COMMIT при успехе, ROLLBACK при ошибке.
+    Нужна там, где соединение берется не на весь запрос, а по требованию
+    (например, только при промахе кэша).
+    """
+    conn = await acquire_connection()
     try:
-        conn.autocommit = False
         yield conn
-        conn.commit()
+        await conn.commit()
     except Exception as e:
-        conn.rollback()
-        raise e    
+        await conn.rollback()
+        raise e
     finally:
-        connection_pool.putconn(conn)
\ No newline at end of file
+        await connection_pool.putconn(conn)
+
+
+async def get_db_connection():
+    async with db_connection() as conn:
+        yield conn
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def get_pool_stats() -> dict:
+    """Текущее состояние пула: занятые/свободные соединения, очередь и p99 ожидания."""
+    if connection_pool is None:
+        return {
+            "min_size": DB_POOL_MIN_SIZE, "max_size": DB_POOL_MAX_SIZE,
+            "size": 0, "in_use": 0, "idle": 0, "waiters": 0, "acquire_wait_p99_ms": 0.0,
+        }
+    stats = connection_pool.get_stats()
+    size = stats.get("pool_size", 0)
+    idle = stats.get("pool_available", 0)
+    return {
+        "min_size": stats.get("pool_min", DB_POOL_MIN_SIZE),
+        "max_size": stats.get("pool_max", DB_POOL_MAX_SIZE),
+        "size": size,
+        "in_use": size - idle,
+        "idle": idle,
+        "waiters": stats.get("requests_waiting", 0),
+        "acquire_wait_p99_ms": round(_percentile(_acquire_waits_ms, 99), 3),
+    }
+
+
+def _collect_pool_metrics():
+    stats = get_pool_stats()
+    labels = ("primary",)
+    DB_POOL_SIZE.set(stats["size"], labels)
+    DB_POOL_MAX_SIZE_GAUGE.set(stats["max_size"], labels)
+    DB_POOL_IN_USE.set(stats["in_use"], labels)
+    DB_POOL_WAITING.set(stats["waiters"], labels)
+    DB_POOL_SATURATION.set(stats["in_use"] / stats["max_size"] if stats["max_size"] else 0.0, labels)
+
+
+REGISTRY.on_collect(_collect_pool_metrics)
@@ -0,0 +1,47 @@
+"""
+Консолидация остатков горячих товаров.
+
+Резервы списываются с отдельных шардов (reserve_stock в db/schema.sql), поэтому со
+временем остаток распределяется неравномерно, а поступления (adjust, PUT /inventory)
+копятся в неразложенной части inventory.stock. Задача раз в INVENTORY_REBALANCE_INTERVAL
+секунд собирает остаток таких товаров и раскладывает его по шардам поровну.
+"""
+import os
+
+from psycopg import errors
+
+from db.session import db_connection
+
+INVENTORY_REBALANCE_INTERVAL = float(os.getenv("INVENTORY_REBALANCE_INTERVAL", "5"))
+# Консолидация уступает покупателям: если шард занят дольше, товар пропускается до следующего раза.
+INVENTORY_REBALANCE_LOCK_TIMEOUT_MS = int(os.getenv("INVENTORY_REBALANCE_LOCK_TIMEOUT_MS", "200"))
+
+# Нуждаются в консолидации: есть неразложенный остаток, не хватает строк шардов
+# или разброс между шардами больше половины средней доли.
+_UNBALANCED_PRODUCTS = """
+    SELECT i.product_id
+    FROM inventory i
+    LEFT JOIN inventory_shards s ON s.product_id = i.product_id
+    WHERE i.shard_count > 0
+    GROUP BY i.product_id
+    HAVING i.stock > 0
+        OR count(s.shard) <> i.shard_count
+        OR max(s.stock) - min(s.stock) > GREATEST(1, sum(s.stock) / i.shard_count / 2)
+"""
+
+
+async def rebalance_hot_inventory() -> int:
+    """Раскладывает остатки горячих товаров по шардам; возвращает число обработанных товаров."""
+    async with db_connection() as conn:
+        product_ids = [row[0] for row in await (await conn.execute(_UNBALANCED_PRODUCTS)).fetchall()]
+
+    rebalanced = 0
+    for product_id in product_ids:
+        try:
+            async with db_connection() as conn:
+                await conn.execute(f"SET LOCAL lock_timeout = {INVENTORY_REBALANCE_LOCK_TIMEOUT_MS}")
+                await conn.execute("SELECT rebalance_inventory(%s)", (product_id,))
+            rebalanced += 1
+        except errors.LockNotAvailable:
+            continue
+    return rebalanced
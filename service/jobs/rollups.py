@@ -0,0 +1,86 @@
+"""
+Витрины продаж: инкрементальный пересчет и бэкфилл.
+
+Раз в SALES_ROLLUP_INTERVAL секунд задача сервиса вызывает refresh_sales_rollups()
+(db/analytics.sql): пересчитываются только часы, в которых появились изменения с
+прошлого запуска, и сутки, в которые эти часы входят. Параллельные воркеры не мешают
+друг другу - пересчет берет advisory-блокировку, и лишние запуски просто пропускаются.
+
+Полный пересчет диапазона дат (после загрузки истории или правки логики витрин):
+
+    python -m jobs.rollups backfill --from 2024-01-01 --to 2024-07-01 --workers 4
+
+Диапазон [from, to) режется на куски по --chunk-days дней, и каждый кусок
+пересчитывается отдельной транзакцией в одном из рабочих процессов.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import psycopg
+
+from db.session import DATABASE_URL, db_connection
+
+SALES_ROLLUP_INTERVAL = float(os.getenv("SALES_ROLLUP_INTERVAL", "60"))
+
+
+async def refresh_sales_rollups() -> int | None:
+    """Пересчитывает измененные часы; None - пересчет уже идет в другом соединении."""
+    async with db_connection() as conn:
+        return (await (await conn.execute("SELECT refresh_sales_rollups()")).fetchone())[0]
+
+
+def date_chunks(date_from: date, date_to: date, chunk_days: int) -> list[tuple[date, date]]:
+    """Режет [date_from, date_to) на полуоткрытые куски не длиннее chunk_days дней."""
+    chunks = []
+    start = date_from
+    while start < date_to:
+        end = min(start + timedelta(days=chunk_days), date_to)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def _rebuild_chunk(dsn: str, date_from: date, date_to: date) -> tuple[date, date]:
+    # Выполняется в рабочем процессе: свое соединение, своя транзакция.
+    with psycopg.connect(dsn, options="-c statement_timeout=0") as conn:
+        conn.execute("SELECT rebuild_sales_rollups(%s, %s)", (date_from, date_to))
+    return date_from, date_to
+
+
+def backfill(date_from: date, date_to: date, workers: int, chunk_days: int = 1, dsn: str = DATABASE_URL) -> int:
+    """Пересчитывает витрины за [date_from, date_to); возвращает число обработанных кусков."""
+    chunks = date_chunks(date_from, date_to, chunk_days)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_rebuild_chunk, dsn, start, end) for start, end in chunks]
+        for future in as_completed(futures):
+            start, end = future.result()
+            print(f"rebuilt {start} .. {end}", file=sys.stderr)
+    return len(chunks)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m jobs.rollups", description="Sales rollups maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("refresh", help="incremental refresh from the stored watermark")
+    backfill_parser = commands.add_parser("backfill", help="rebuild rollups for a date range")
+    backfill_parser.add_argument("--from", dest="date_from", type=date.fromisoformat, required=True)
+    backfill_parser.add_argument("--to", dest="date_to", type=date.fromisoformat, required=True,
+                                 help="exclusive upper bound")
+    backfill_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    backfill_parser.add_argument("--chunk-days", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.command == "refresh":
+        with psycopg.connect(DATABASE_URL) as conn:
+            print(conn.execute("SELECT refresh_sales_rollups()").fetchone()[0])
+        return
+    if args.date_from >= args.date_to or args.workers < 1 or args.chunk_days < 1:
+        parser.error("expected --from < --to, --workers >= 1 and --chunk-days >= 1")
+    print(backfill(args.date_from, args.date_to, args.workers, args.chunk_days))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+Сжатие счетчиков продаж.
+
+Позиции заказов пишут изменения количества в product_sales_deltas (db/analytics.sql),
+а не в строку товара. Задача раз в SALES_COUNTER_COMPACT_INTERVAL секунд переносит
+накопленные дельты в products.total_sold одним оператором; между запусками точное
+значение дает product_total_sold(id).
+"""
+import os
+
+from db.session import db_connection
+
+SALES_COUNTER_COMPACT_INTERVAL = float(os.getenv("SALES_COUNTER_COMPACT_INTERVAL", "5"))
+
+
+async def compact_sales_counters() -> int | None:
+    """Возвращает число перенесенных дельт; None - сжатие уже идет в другом соединении."""
+    async with db_connection() as conn:
+        return (await (await conn.execute("SELECT compact_product_sales_deltas()")).fetchone())[0]
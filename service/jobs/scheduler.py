@@ -0,0 +1,49 @@
+"""
+Периодические фоновые задачи воркера.
+
+Задачи регистрируются при импорте (см. main.py) и запускаются в lifespan приложения:
+каждая крутится в своем asyncio-таске и вызывается раз в interval секунд. Ошибка
+одного запуска логируется и не останавливает задачу. При нескольких воркерах задача
+выполняется в каждом, поэтому она должна быть идемпотентной или сама брать блокировку.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[object]]
+
+
+class Scheduler:
+    def __init__(self):
+        self._jobs: list[tuple[str, float, Job]] = []
+        self._tasks: list[asyncio.Task] = []
+
+    def add(self, name: str, interval: float, job: Job):
+        """Регистрирует задачу; interval <= 0 отключает ее."""
+        if interval > 0:
+            self._jobs.append((name, interval, job))
+
+    async def _run(self, name: str, interval: float, job: Job):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Background job %s failed", name)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run(*spec)) for spec in self._jobs]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+scheduler = Scheduler()
@@ -1,20 +1,66 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from db.session import DATABASE_URL, open_pool, close_pool
+from db.profiler import ProfilerMiddleware, profiler
+from db.notify import listener
+from db.replicas import replica_set
+from cache.category_tree import CATEGORY_TREE_CHANNEL, category_tree_cache
+from cache.products import PRODUCT_CHANGED_CHANNEL, product_cache
+from jobs.inventory import INVENTORY_REBALANCE_INTERVAL, rebalance_hot_inventory
+from jobs.rollups import SALES_ROLLUP_INTERVAL, refresh_sales_rollups
+from jobs.sales_counters import SALES_COUNTER_COMPACT_INTERVAL, compact_sales_counters
+from jobs.scheduler import scheduler
 from routes.client_router import client_router
 from routes.product_router import product_router
 from routes.order_router import order_router
 from routes.category_router import category_router
 from routes.inventory_router import inventory_router
+from routes.admin_router import admin_router
+from routes.analytics_router import analytics_cache, analytics_router
+from routes.metrics_router import metrics_router
+from utils.metrics import MetricsMiddleware
+
+
+listener.subscribe(CATEGORY_TREE_CHANNEL, category_tree_cache.invalidate)
+# В отчетах есть названия категорий.
+listener.subscribe(CATEGORY_TREE_CHANNEL, analytics_cache.invalidate)
+listener.subscribe(PRODUCT_CHANGED_CHANNEL, product_cache.invalidate)
+scheduler.add("inventory-rebalance", INVENTORY_REBALANCE_INTERVAL, rebalance_hot_inventory)
+scheduler.add("sales-rollups", SALES_ROLLUP_INTERVAL, refresh_sales_rollups)
+scheduler.add("sales-counters", SALES_COUNTER_COMPACT_INTERVAL, compact_sales_counters)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_pool()
+    await replica_set.open()
+    listener.start()
+    scheduler.start()
+    profiler.start(DATABASE_URL)
+    yield
+    await profiler.stop()
+    await scheduler.stop()
+    await listener.stop()
+    await replica_set.close()
+    await close_pool()
+
 
-app = FastAPI(title="Task Service", version="1.0.0")
+app = FastAPI(title="Task Service", version="1.0.0", lifespan=lifespan)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(product_router,   prefix="/products",   tags=["products"])
 app.include_router(category_router, prefix="/categories", tags=["categories"]) #самая мякотка
 app.include_router(client_router,   prefix="/clients",    tags=["clients"])
 app.include_router(order_router,    prefix="/orders",     tags=["orders"])
 app.include_router(inventory_router,prefix="/inventory",  tags=["inventory"])
+app.include_router(admin_router,    prefix="/admin",      tags=["admin"])
+app.include_router(analytics_router, prefix="/analytics", tags=["analytics"])
+app.include_router(metrics_router)
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8088, reload=True)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8088, reload=True)
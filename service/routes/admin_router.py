@@ -0,0 +1,42 @@
+from typing import List
+
+from fastapi import APIRouter, status
+
+from db.profiler import profiler
+from db.replicas import replica_set
+from db.session import get_pool_stats
+from schemas.admin import PoolStats, ReplicaStats, SlowQueryReport
+
+admin_router = APIRouter()
+
+
+@admin_router.get("/pool", response_model=PoolStats)
+async def pool_stats():
+    """Состояние пула соединений: in-use, idle, очередь ожидания и p99 времени получения соединения."""
+    return PoolStats(**get_pool_stats())
+
+
+@admin_router.get("/replicas", response_model=List[ReplicaStats])
+async def replica_stats():
+    """Реплики для чтения: здоровье, отставание воспроизведения WAL и занятые соединения."""
+    return [ReplicaStats(**stats) for stats in replica_set.get_stats()]
+
+
+@admin_router.get("/slow-queries", response_model=SlowQueryReport)
+async def slow_queries():
+    """
+    Медленные запросы с планами и подозрения на N+1 из профилировщика (db/profiler.py),
+    новые первыми. Пока DB_PROFILER_ENABLED не включен, списки пустые.
+    """
+    return SlowQueryReport(
+        enabled=profiler.enabled,
+        slow_ms=profiler.slow_ms,
+        slow_queries=list(reversed(profiler.slow_queries)),
+        n_plus_one=list(reversed(profiler.n_plus_one_reports)),
+    )
+
+
+@admin_router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries():
+    """Очищает буферы профилировщика, например перед прогоном нагрузочного теста."""
+    profiler.clear()
@@ -0,0 +1,126 @@
+"""
+Отчеты для дашбордов (задание 2 из queries.sql) поверх предрасчитанных витрин.
+
+Топ товаров и суммы клиентов читаются из hourly/daily витрин (db/analytics.sql), а не
+из соединения orders и order_items. Готовый JSON хранится в TTL-кэше воркера
+(cache/ttl.py), поэтому одновременные запросы дашбордов стоят одного запроса к БД.
+Свежесть данных - в заголовках: X-Data-As-Of - момент, по который в витринах учтены
+изменения заказов, Age - сколько секунд ответ пролежал в кэше.
+"""
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Query, Response
+
+from cache.ttl import CacheEntry, TTLCache
+from db.replicas import read_db_connection
+from schemas.analytics import AnalyticsWindow, CategoryChildrenCount, ClientTotal, TopProduct
+from utils.serialization import rows_json
+
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "30"))
+
+analytics_router = APIRouter()
+analytics_cache = TTLCache(ANALYTICS_CACHE_TTL, name="analytics")
+
+# Окно -> (витрина, колонка, нижняя граница). Часовая витрина не делит час на части, поэтому
+# окна 1h и 24h берут текущий неполный час и еще 1 или 24 полных часа перед ним: в окно
+# попадают все продажи за последние 60 минут (24 часа) и не больше часа сверх того.
+# Дневные окна - календарные: сегодня и 6 (29) предыдущих дней.
+_WINDOWS = {
+    "1h": ("hourly_product_sales", "sale_hour", "date_trunc('hour', now()) - INTERVAL '1 hour'"),
+    "24h": ("hourly_product_sales", "sale_hour", "date_trunc('hour', now()) - INTERVAL '24 hours'"),
+    "7d": ("daily_product_sales", "sale_date", "CURRENT_DATE - 6"),
+    "30d": ("daily_product_sales", "sale_date", "CURRENT_DATE - 29"),
+}
+
+_SALES_WATERMARK = "SELECT NULLIF(watermark, '-infinity') FROM rollup_watermarks WHERE name = 'sales'"
+
+
+def _cached_response(entry: CacheEntry) -> Response:
+    body, as_of = entry.value
+    response = Response(content=body, media_type="application/json")
+    response.headers["Age"] = str(int(entry.age))
+    if as_of is not None:
+        response.headers["X-Data-As-Of"] = as_of.isoformat()
+    return response
+
+
+async def _query(query: str, params: tuple, model, as_of_query: str) -> tuple[bytes, Optional[datetime]]:
+    async with read_db_connection() as conn:
+        async with conn.cursor() as cursor:
+            # Водяной знак читаем до отчета: витрина может быть только свежее него.
+            await cursor.execute(as_of_query)
+            row = await cursor.fetchone()
+            await cursor.execute(query, params)
+            return rows_json(await cursor.fetchall(), model), row[0] if row else None
+
+
+@analytics_router.get("/top-products", response_model=List[TopProduct])
+async def top_products(window: AnalyticsWindow = "30d", limit: int = Query(5, ge=1, le=100)):
+    """Самые покупаемые товары за окно (заказы в статусах PROCESSING и COMPLETED)."""
+    table, column, since = _WINDOWS[window]
+    query = f"""
+        WITH top AS (
+            SELECT product_id, SUM(total_qty_sold) AS qty, SUM(total_amount_sold) AS amount
+            FROM {table}
+            WHERE {column} >= {since}
+            GROUP BY product_id
+            ORDER BY qty DESC, product_id
+            LIMIT %s
+        )
+        SELECT p.id, p.name, root_cat.name, top.qty, top.amount
+        FROM top
+        JOIN products p ON p.id = top.product_id
+        JOIN categories c ON c.id = p.category_id
+        JOIN categories root_cat ON root_cat.path = subpath(c.path, 0, 1)
+        ORDER BY top.qty DESC, p.id
+    """
+    entry = await analytics_cache.get(
+        ("top-products", window, limit),
+        lambda: _query(query, (limit,), TopProduct, _SALES_WATERMARK),
+    )
+    return _cached_response(entry)
+
+
+@analytics_router.get("/client-totals", response_model=List[ClientTotal])
+async def client_totals(limit: int = Query(100, ge=1, le=1000)):
+    """Клиенты по убыванию суммы заказанных товаров за все время."""
+    query = """
+        WITH totals AS (
+            SELECT client_id, SUM(orders_count) AS orders_count, SUM(total_amount) AS total_amount
+            FROM daily_client_sales
+            GROUP BY client_id
+            ORDER BY total_amount DESC, client_id
+            LIMIT %s
+        )
+        SELECT c.id, c.name, totals.orders_count, totals.total_amount
+        FROM totals
+        JOIN clients c ON c.id = totals.client_id
+        ORDER BY totals.total_amount DESC, c.id
+    """
+    entry = await analytics_cache.get(
+        ("client-totals", limit),
+        lambda: _query(query, (limit,), ClientTotal, _SALES_WATERMARK),
+    )
+    return _cached_response(entry)
+
+
+@analytics_router.get("/category-children-counts", response_model=List[CategoryChildrenCount])
+async def category_children_counts():
+    """
+    Число прямых потомков каждой категории в порядке дерева. Считается по индексу
+    parent_id без витрины; кэш сбрасывается при изменении дерева категорий.
+    """
+    query = """
+        SELECT parent.id, parent.name, parent.path::text, COUNT(child.id)
+        FROM categories AS parent
+        LEFT JOIN categories AS child ON child.parent_id = parent.id
+        GROUP BY parent.id
+        ORDER BY parent.path
+    """
+    entry = await analytics_cache.get(
+        ("category-children-counts",),
+        lambda: _query(query, (), CategoryChildrenCount, "SELECT now()"),
+    )
+    return _cached_response(entry)
@@ -1,111 +1,89 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from typing import List
-from psycopg2.extensions import connection as Connection, cursor as Cursor
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, Response
+from typing import List, Optional
+from psycopg import AsyncConnection as Connection
+from psycopg import errors
+from db.replicas import get_read_db_connection
 from db.session import get_db_connection
-from schemas.category import CategoryCreate, CategoryResponse, CategoryTreeNode
+from cache.category_tree import build_category_tree, category_tree_cache, dump_json
+from utils.pagination import decode_cursor, set_next_cursor
+from utils.serialization import rows_response
+from schemas.category import CategoryCreate, CategoryResponse, CategoryTreeNode, CategoryUpdate
+from schemas.product import ProductResponse
 
 category_router = APIRouter()
 
 
 @category_router.post("/", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
-def create_category(category_in: CategoryCreate, conn: Connection = Depends(get_db_connection)):
-    """Создает новую категорию и вычисляет ее ltree путь."""
-    with conn.cursor() as cursor:
-        # Шаг 1: Вставляем новую категорию, используя временный путь,
-        # который мы сразу же получим из RETURNING id.
-        # Мы не можем сразу вычислить полный путь, так как не знаем id.
-        cursor.execute(
+async def create_category(category_in: CategoryCreate, conn: Connection = Depends(get_db_connection)):
+    """
+    Создает новую категорию и вычисляет ее ltree путь одним запросом:
+    id берется из последовательности заранее, путь родителя - через LEFT JOIN.
+    """
+    async with conn.cursor() as cursor:
+        await cursor.execute(
             """
-            INSERT INTO categories (name, parent_id, path)
-            -- Вставляем временный 'placeholder' путь.
-            -- Он будет заменен на правильный через мгновение.
-            VALUES (%s, %s, 'tmp')
-            RETURNING id
+            WITH new_category AS (SELECT nextval(pg_get_serial_sequence('categories', 'id')) AS id)
+            INSERT INTO categories (id, name, parent_id, path)
+            SELECT n.id, %s, %s::bigint, COALESCE(parent.path, ''::ltree) || n.id::text
+            FROM new_category n
+            LEFT JOIN categories parent ON parent.id = %s::bigint
+            -- Если родитель указан, но не найден, ничего не вставляем.
+            WHERE %s::bigint IS NULL OR parent.id IS NOT NULL
+            RETURNING id, name, path, parent_id
             """,
-            (category_in.name, category_in.parent_id)
-        )
-        new_category_id = cursor.fetchone()[0]
-
-        # Шаг 2: Вычисляем правильный путь
-        parent_path_str = ""
-        if category_in.parent_id:
-            cursor.execute("SELECT path FROM categories WHERE id = %s", (category_in.parent_id,))
-            parent_row = cursor.fetchone()
-            if not parent_row:
-                # Этого не должно произойти, так как у нас есть FK constraint, но для надежности.
-                raise HTTPException(status_code=404, detail="Parent category not found")
-            parent_path_str = str(parent_row[0]) + "."
-
-        new_path = f"{parent_path_str}{new_category_id}"
-
-        # Шаг 3: Обновляем запись правильным путем ltree
-        cursor.execute(
-            "UPDATE categories SET path = %s::ltree WHERE id = %s RETURNING id, name, path, parent_id",
-            (new_path, new_category_id)
-        )
-        
-        # RETURNING в UPDATE сразу вернет нам все нужные данные для ответа
-        final_row = cursor.fetchone()
-
-        return CategoryResponse(
-            id=final_row[0],
-            name=final_row[1],
-            path=str(final_row[2]), # Преобразуем ltree в строку для Pydantic
-            parent_id=final_row[3]
+            (category_in.name, category_in.parent_id, category_in.parent_id, category_in.parent_id)
         )
+        row = await cursor.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Parent category not found")
+    category_tree_cache.invalidate()
+    return CategoryResponse(id=row[0], name=row[1], path=str(row[2]), parent_id=row[3])
 
 
 @category_router.get("/tree", response_model=List[CategoryTreeNode])
-def get_category_tree(conn: Connection = Depends(get_db_connection)):
-    """Возвращает полное дерево категорий."""
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT id, name, path, parent_id FROM categories ORDER BY path")
-        all_categories = cursor.fetchall()
-        nodes = {
-            row[0]: CategoryTreeNode(
-                id=row[0], name=row[1], path=row[2], parent_id=row[3], children=[]
-            ) for row in all_categories
-        }
-        tree = []
-        for cat_id, node in nodes.items():
-            if node.parent_id:
-                parent = nodes.get(node.parent_id)
-                if parent:
-                    parent.children.append(node)
-            else:
-                tree.append(node)
-        
-        return tree
+async def get_category_tree(request: Request):
+    """
+    Возвращает полное дерево категорий из кэша воркера.
+    Поддерживает ETag/If-None-Match: если дерево не менялось, отвечает 304.
+    """
+    body, etag = await category_tree_cache.get()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in client_etags or "*" in client_etags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @category_router.get("/{category_id}", response_model=CategoryResponse)
-def get_category(category_id: int, conn: Connection = Depends(get_db_connection)):
+async def get_category(category_id: int, conn: Connection = Depends(get_read_db_connection)):
     """Получает информацию о конкретной категории."""
-    with conn.cursor() as cursor:
-        cursor.execute(
+    async with conn.cursor() as cursor:
+        await cursor.execute(
             "SELECT id, name, path, parent_id FROM categories WHERE id = %s",
             (category_id,)
         )
-        row = cursor.fetchone()
+        row = await cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Category not found")
         return CategoryResponse(id=row[0], name=row[1], path=row[2], parent_id=row[3])
 
 
 @category_router.get("/{category_id}/children", response_model=List[CategoryResponse])
-def get_category_children(category_id: int, conn: Connection = Depends(get_db_connection)):
+async def get_category_children(category_id: int, conn: Connection = Depends(get_read_db_connection)):
     """
     Получает всех прямых потомков (дочерние категории) для указанной категории.
     Использует мощь ltree!
     """
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT path FROM categories WHERE id = %s", (category_id,))
-        path_row = cursor.fetchone()
+    async with conn.cursor() as cursor:
+        await cursor.execute("SELECT path FROM categories WHERE id = %s", (category_id,))
+        path_row = await cursor.fetchone()
         if not path_row:
             raise HTTPException(status_code=404, detail="Category not found")
         parent_path = path_row[0]
-        cursor.execute(
+        await cursor.execute(
             """
             SELECT id, name, path, parent_id
             FROM categories
@@ -114,18 +92,156 @@ def get_category_children(category_id: int, conn: Connection = Depends(get_db_co
             """,
             (parent_path, parent_path)
         )
-        rows = cursor.fetchall()
-        return [CategoryResponse(id=row[0], name=row[1], path=row[2], parent_id=row[3]) for row in rows]
+        rows = await cursor.fetchall()
+        return rows_response(rows, CategoryResponse)
+
+
+@category_router.get("/{category_id}/subtree", response_model=CategoryTreeNode)
+async def get_category_subtree(
+    category_id: int,
+    max_depth: Optional[int] = Query(None, ge=0),
+    conn: Connection = Depends(get_read_db_connection),
+):
+    """
+    Возвращает категорию со всеми потомками (не глубже max_depth уровней от нее).
+    Выборка идет по GiST-индексу idx_categories_path через оператор <@.
+    """
+    depth_filter, params = "", (category_id,)
+    if max_depth is not None:
+        depth_filter, params = "AND nlevel(c.path) <= nlevel(root.path) + %s", (category_id, max_depth)
+    async with conn.cursor() as cursor:
+        await cursor.execute(
+            f"""
+            SELECT c.id, c.name, c.path, c.parent_id
+            FROM categories root
+            JOIN categories c ON c.path <@ root.path
+            WHERE root.id = %s {depth_filter}
+            ORDER BY c.path
+            """,
+            params
+        )
+        rows = await cursor.fetchall()
+        if not rows:
+            raise HTTPException(status_code=404, detail="Category not found")
+        return Response(content=dump_json(build_category_tree(rows)[0]), media_type="application/json")
+
+
+@category_router.get("/{category_id}/products", response_model=List[ProductResponse])
+async def get_category_products(
+    category_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    in_stock: bool = False,
+    conn: Connection = Depends(get_read_db_connection),
+):
+    """
+    Товары категории и всех ее подкатегорий одним запросом: потомки находятся
+    по ltree-индексу, товары - по индексу (category_id, id). Keyset-пагинация по id,
+    in_stock=true оставляет только товары с положительным остатком.
+    """
+    after_id = decode_cursor(cursor, (int,))[0] if cursor else 0
+    stock_filter = "AND i.stock > 0" if in_stock else ""
+    async with conn.cursor() as db_cursor:
+        await db_cursor.execute("SELECT path FROM categories WHERE id = %s", (category_id,))
+        path_row = await db_cursor.fetchone()
+        if not path_row:
+            raise HTTPException(status_code=404, detail="Category not found")
+        await db_cursor.execute(
+            f"""
+            SELECT p.id, p.name, p.price, p.category_id, COALESCE(i.stock, 0) as stock
+            FROM products p
+            LEFT JOIN inventory_stock i ON p.id = i.product_id
+            WHERE p.category_id IN (SELECT c.id FROM categories c WHERE c.path <@ %s)
+              AND p.id > %s {stock_filter}
+            ORDER BY p.id
+            LIMIT %s
+            """,
+            (path_row[0], after_id, limit)
+        )
+        rows = await db_cursor.fetchall()
+        response = rows_response(rows, ProductResponse)
+        set_next_cursor(response, rows, limit, 0)
+        return response
+
+
+@category_router.patch("/{category_id}", response_model=CategoryResponse)
+async def update_category(
+    category_id: int,
+    category_in: CategoryUpdate,
+    conn: Connection = Depends(get_db_connection),
+):
+    """
+    Переименовывает и/или перемещает категорию. Явный parent_id: null делает ее корневой.
+    При перемещении путь всего поддерева переписывается одним UPDATE:
+    новый путь = путь нового родителя || subpath(старый путь, уровень узла).
+    """
+    async with conn.cursor() as cursor:
+        try:
+            if "parent_id" not in category_in.model_fields_set:
+                await cursor.execute(
+                    """
+                    UPDATE categories SET name = COALESCE(%s, name)
+                    WHERE id = %s
+                    RETURNING id, name, path, parent_id
+                    """,
+                    (category_in.name, category_id)
+                )
+                row = await cursor.fetchone()
+                if not row:
+                    raise HTTPException(status_code=404, detail="Category not found")
+            else:
+                # Блокируем узел и нового родителя: параллельное встречное перемещение
+                # дождется нас и увидит уже обновленные пути, поэтому цикл не проскочит.
+                await cursor.execute(
+                    """
+                    SELECT node.path, parent.id, parent.path <@ node.path
+                    FROM categories node
+                    LEFT JOIN (SELECT id, path FROM categories WHERE id = %s::bigint FOR UPDATE) parent ON true
+                    WHERE node.id = %s
+                    FOR UPDATE OF node
+                    """,
+                    (category_in.parent_id, category_id)
+                )
+                check_row = await cursor.fetchone()
+                if not check_row:
+                    raise HTTPException(status_code=404, detail="Category not found")
+                if category_in.parent_id is not None and check_row[1] is None:
+                    raise HTTPException(status_code=404, detail="Parent category not found")
+                if check_row[2]:
+                    raise HTTPException(status_code=400, detail="Category cannot be moved into its own subtree")
+
+                await cursor.execute(
+                    """
+                    WITH moved AS (
+                        UPDATE categories c SET
+                            path = COALESCE(parent.path, ''::ltree) || subpath(c.path, nlevel(node.path) - 1),
+                            parent_id = CASE WHEN c.id = node.id THEN parent.id ELSE c.parent_id END,
+                            name = CASE WHEN c.id = node.id THEN COALESCE(%s, c.name) ELSE c.name END
+                        FROM categories node
+                        LEFT JOIN categories parent ON parent.id = %s::bigint
+                        WHERE node.id = %s AND c.path <@ node.path
+                        RETURNING c.id, c.name, c.path, c.parent_id
+                    )
+                    SELECT id, name, path, parent_id FROM moved WHERE id = %s
+                    """,
+                    (category_in.name, category_in.parent_id, category_id, category_id)
+                )
+                row = await cursor.fetchone()
+        except errors.UniqueViolation:
+            raise HTTPException(status_code=409, detail="Category with this name already exists under the parent")
+    category_tree_cache.invalidate()
+    return CategoryResponse(id=row[0], name=row[1], path=str(row[2]), parent_id=row[3])
 
 
 @category_router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_category(category_id: int, conn: Connection = Depends(get_db_connection)):
+async def delete_category(category_id: int, conn: Connection = Depends(get_db_connection)):
     """
     Удаляет категорию. Благодаря 'ON DELETE CASCADE' в БД,
     все дочерние категории будут также удалены автоматически.
     """
-    with conn.cursor() as cursor:
-        cursor.execute("DELETE FROM categories WHERE id = %s", (category_id,))
+    async with conn.cursor() as cursor:
+        await cursor.execute("DELETE FROM categories WHERE id = %s", (category_id,))
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Category not found")
+    category_tree_cache.invalidate()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
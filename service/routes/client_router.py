@@ -1,50 +1,72 @@
 
 
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, HTTPException, status
 from fastapi import Depends
-from schemas.client import ClientCreate, ClientDelete, ClientResponse
+from schemas.batch import BatchGetRequest
+from schemas.client import ClientBatchResponse, ClientCreate, ClientDelete, ClientResponse
+from db.replicas import get_read_db_connection
 from db.session import get_db_connection
-from psycopg2.extensions import connection as Connection
+from utils.pagination import decode_cursor, set_next_cursor
+from utils.serialization import rows_batch_response, rows_response
+from psycopg import AsyncConnection as Connection
 
 client_router = APIRouter()
 
 @client_router.get("/", response_model=List[ClientResponse])
-def get_clients(conn: Connection = Depends(get_db_connection), skip: int = 0, limit: int = 100):
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT id, name, address FROM clients OFFSET %s LIMIT %s", (skip, limit))
-        rows = cursor.fetchall()
-        return [ClientResponse(id=row[0], name=row[1], address=row[2]) for row in rows]
+async def get_clients(
+    conn: Connection = Depends(get_read_db_connection),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+):
+    after_id = decode_cursor(cursor, (int,))[0] if cursor else 0
+    async with conn.cursor() as db_cursor:
+        await db_cursor.execute(
+            "SELECT id, name, address FROM clients WHERE id > %s ORDER BY id OFFSET %s LIMIT %s",
+            (after_id, skip, limit)
+        )
+        rows = await db_cursor.fetchall()
+        response = rows_response(rows, ClientResponse)
+        set_next_cursor(response, rows, limit, 0)
+        return response
 
 
 
 @client_router.post("/", response_model=ClientResponse, status_code=status.HTTP_201_CREATED)
-def create_client(client: ClientCreate, conn: Connection = Depends(get_db_connection)):
-    with conn.cursor() as cursor:
-        cursor.execute(
+async def create_client(client: ClientCreate, conn: Connection = Depends(get_db_connection)):
+    async with conn.cursor() as cursor:
+        await cursor.execute(
         """INSERT INTO clients (name, address)
         VALUES(%s, %s)
         RETURNING id, name, address
         """,
         (client.name, client.address)
     )
-        row = cursor.fetchone()
+        row = await cursor.fetchone()
         return ClientResponse(id=row[0], name=row[1], address=row[2])
 
+@client_router.post("/batch:get", response_model=ClientBatchResponse)
+async def batch_get_clients(request: BatchGetRequest, conn: Connection = Depends(get_read_db_connection)):
+    """Клиенты по списку id (до MAX_BATCH_GET) одним запросом."""
+    async with conn.cursor() as cursor:
+        await cursor.execute("SELECT id, name, address FROM clients WHERE id = ANY(%s)", (request.ids,))
+        return rows_batch_response(request.ids, await cursor.fetchall(), ClientResponse)
+
 @client_router.get("/{client_id}", response_model=ClientResponse)
-def get_client(client_id: int, conn: Connection = Depends(get_db_connection)):
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT id, name, address FROM clients WHERE id = %s", (client_id,))
-        row = cursor.fetchone()
+async def get_client(client_id: int, conn: Connection = Depends(get_read_db_connection)):
+    async with conn.cursor() as cursor:
+        await cursor.execute("SELECT id, name, address FROM clients WHERE id = %s", (client_id,))
+        row = await cursor.fetchone()
         if row:
             return ClientResponse(id=row[0], name=row[1], address=row[2])
         raise HTTPException(status_code=404, detail="Client not found")
 
 @client_router.delete("/{client_id}", response_model=ClientDelete)
-def delete_client(client_id: int, conn: Connection = Depends(get_db_connection)):
-    with conn.cursor() as cursor:
-        cursor.execute("DELETE FROM clients WHERE id = %s RETURNING id", (client_id,))
-        row = cursor.fetchone()
+async def delete_client(client_id: int, conn: Connection = Depends(get_db_connection)):
+    async with conn.cursor() as cursor:
+        await cursor.execute("DELETE FROM clients WHERE id = %s RETURNING id", (client_id,))
+        row = await cursor.fetchone()
         if row:
             return ClientDelete(id=row[0])
         raise HTTPException(status_code=404, detail="Client not found")
\ No newline at end of file
@@ -1,76 +1,128 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from psycopg2.extensions import connection as Connection
-from psycopg2 import errors
+from typing import List, Optional
+from psycopg import AsyncConnection as Connection
 
+from db.replicas import get_read_db_connection
 from db.session import get_db_connection
-from schemas.inventory import InventoryResponse, StockSet, StockAdjust
+from utils.pagination import decode_cursor, set_next_cursor
+from utils.serialization import rows_response
+from schemas.inventory import HotInventorySet, InventoryResponse, StockSet, StockAdjust
 
 inventory_router = APIRouter()
 
+# Остатки читаются из представления inventory_stock: у горячих товаров это сумма шардов.
+_INVENTORY_ROW = "SELECT product_id, stock, shard_count FROM inventory_stock WHERE product_id = %s"
+
+
+def _inventory_response(row) -> InventoryResponse:
+    return InventoryResponse(product_id=row[0], stock=row[1], shards=row[2])
+
+
 @inventory_router.get("/", response_model=List[InventoryResponse])
-def list_inventory(skip: int = 0, limit: int = 100, conn: Connection = Depends(get_db_connection)):
-    """Получает список всех остатков на складе."""
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT product_id, stock FROM inventory ORDER BY product_id OFFSET %s LIMIT %s", (skip, limit))
-        rows = cursor.fetchall()
-        return [InventoryResponse(product_id=row[0], stock=row[1]) for row in rows]
+async def list_inventory(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    conn: Connection = Depends(get_read_db_connection),
+):
+    """Получает список всех остатков на складе (keyset-пагинация по product_id через cursor)."""
+    after_id = decode_cursor(cursor, (int,))[0] if cursor else 0
+    async with conn.cursor() as db_cursor:
+        await db_cursor.execute(
+            """
+            SELECT product_id, stock, shard_count FROM inventory_stock
+            WHERE product_id > %s ORDER BY product_id OFFSET %s LIMIT %s
+            """,
+            (after_id, skip, limit)
+        )
+        rows = await db_cursor.fetchall()
+        response = rows_response(rows, InventoryResponse)
+        set_next_cursor(response, rows, limit, 0)
+        return response
 
 @inventory_router.get("/{product_id}", response_model=InventoryResponse)
-def get_inventory_for_product(product_id: int, conn: Connection = Depends(get_db_connection)):
+async def get_inventory_for_product(product_id: int, conn: Connection = Depends(get_read_db_connection)):
     """Получает остаток для конкретного товара."""
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT product_id, stock FROM inventory WHERE product_id = %s", (product_id,))
-        row = cursor.fetchone()
+    async with conn.cursor() as cursor:
+        await cursor.execute(_INVENTORY_ROW, (product_id,))
+        row = await cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Inventory record not found for this product")
-        return InventoryResponse(product_id=row[0], stock=row[1])
+        return _inventory_response(row)
 
 @inventory_router.put("/{product_id}", response_model=InventoryResponse)
-def set_stock_level(product_id: int, stock_in: StockSet, conn: Connection = Depends(get_db_connection)):
+async def set_stock_level(product_id: int, stock_in: StockSet, conn: Connection = Depends(get_db_connection)):
     """
     Устанавливает абсолютное значение остатка.
     Используется для инвентаризации или ручной коррекции.
     """
-    with conn.cursor() as cursor:
+    async with conn.cursor() as cursor:
         # Используем INSERT ... ON CONFLICT (UPSERT), чтобы создать запись, если ее нет.
         # Это делает эндпоинт более надежным.
-        cursor.execute(
+        # Шарды горячего товара обнуляются: весь остаток оказывается в inventory.stock,
+        # по шардам его разложит фоновая консолидация или первый медленный резерв.
+        await cursor.execute(
             """
-            INSERT INTO inventory (product_id, stock)
-            VALUES (%s, %s)
-            ON CONFLICT (product_id) DO UPDATE
-            SET stock = EXCLUDED.stock
-            RETURNING product_id, stock;
+            WITH upsert AS (
+                INSERT INTO inventory (product_id, stock)
+                VALUES (%s, %s)
+                ON CONFLICT (product_id) DO UPDATE
+                SET stock = EXCLUDED.stock
+                RETURNING product_id, stock, shard_count
+            ),
+            cleared AS (
+                UPDATE inventory_shards s SET stock = 0
+                FROM upsert u
+                WHERE s.product_id = u.product_id
+            )
+            SELECT product_id, stock, shard_count FROM upsert
             """,
             (product_id, stock_in.stock)
         )
-        row = cursor.fetchone()
+        row = await cursor.fetchone()
         if not row:
              raise HTTPException(status_code=404, detail="Product not found to update inventory for")
-        return InventoryResponse(product_id=row[0], stock=row[1])
+        return _inventory_response(row)
 
 @inventory_router.patch("/{product_id}/adjust", response_model=InventoryResponse)
-def adjust_stock_level(product_id: int, stock_in: StockAdjust, conn: Connection = Depends(get_db_connection)):
+async def adjust_stock_level(product_id: int, stock_in: StockAdjust, conn: Connection = Depends(get_db_connection)):
     """
     Изменяет (корректирует) остаток на заданное значение.
     Например, поступление товара (change_by: 50) или списание (change_by: -5).
+    Поступление ложится в неразложенную часть остатка и не блокирует шарды горячего товара,
+    списание идет через reserve_stock, как и покупка.
     """
-    with conn.cursor() as cursor:
-        try:
-            cursor.execute(
-                """
-                UPDATE inventory
-                SET stock = stock + %s
-                WHERE product_id = %s
-                RETURNING product_id, stock;
-                """,
+    async with conn.cursor() as cursor:
+        if stock_in.change_by >= 0:
+            await cursor.execute(
+                "UPDATE inventory SET stock = stock + %s WHERE product_id = %s RETURNING true",
                 (stock_in.change_by, product_id)
             )
-            row = cursor.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail="Inventory record not found for this product")
-            return InventoryResponse(product_id=row[0], stock=row[1])
-        except errors.CheckViolation:
-            raise HTTPException(status_code=400, detail="Stock level cannot be negative.")
\ No newline at end of file
+        else:
+            await cursor.execute("SELECT reserve_stock(%s, %s)", (product_id, -stock_in.change_by))
+        row = await cursor.fetchone()
+        if not row or row[0] is None:
+            raise HTTPException(status_code=404, detail="Inventory record not found for this product")
+        if not row[0]:
+            raise HTTPException(status_code=400, detail="Stock level cannot be negative.")
+        await cursor.execute(_INVENTORY_ROW, (product_id,))
+        return _inventory_response(await cursor.fetchone())
+
+@inventory_router.put("/{product_id}/hot", response_model=InventoryResponse)
+async def set_hot_inventory(product_id: int, hot_in: HotInventorySet, conn: Connection = Depends(get_db_connection)):
+    """
+    Переводит товар в режим горячего остатка: остаток раскладывается по shards строкам,
+    и параллельные покупки списывают его с разных шардов, не дожидаясь друг друга.
+    shards = 0 собирает остаток обратно в одну строку.
+    """
+    async with conn.cursor() as cursor:
+        await cursor.execute(
+            "UPDATE inventory SET shard_count = %s WHERE product_id = %s RETURNING product_id",
+            (hot_in.shards, product_id)
+        )
+        if not await cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Inventory record not found for this product")
+        await cursor.execute("SELECT rebalance_inventory_locked(%s)", (product_id,))
+        await cursor.execute(_INVENTORY_ROW, (product_id,))
+        return _inventory_response(await cursor.fetchone())
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from utils.metrics import CONTENT_TYPE, REGISTRY
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики воркера в текстовом формате Prometheus (см. utils/metrics.py)."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
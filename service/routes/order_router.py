@@ -1,186 +1,458 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, status
-from typing import List
-from psycopg2.extensions import connection as Connection, cursor as Cursor
+import csv
+import io
+import json
 
-from db.session import get_db_connection
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import List, Optional
+from psycopg import AsyncConnection as Connection, AsyncCursor as Cursor
 
-from schemas.order import OrderCreate, OrderItemCreate, OrderResponse, OrderItemResponse
+from db.replicas import get_read_db_connection, read_db_connection
+from db.session import get_db_connection, prepared_statement
+from utils.pagination import decode_cursor, set_next_cursor
+
+from utils.serialization import batch_json, rows_json
+
+from schemas.batch import BatchGetRequest
+from schemas.order import (
+    ExportFormat, OrderBatchResponse, OrderCreate, OrderItemCreate, OrderResponse, OrderItemError, OrderItemsBatchResponse,
+    OrderStatus, OrderStatusBulkResponse, OrderStatusBulkUpdate, OrderStatusResult, OrderStatusUpdate,
+)
 
 order_router = APIRouter()
 
-def _fetch_order_details(order_id: int, cursor: Cursor) -> OrderResponse | None:
-    """Получает все детали заказа из БД и собирает Pydantic модель."""
-    cursor.execute(
-        "SELECT id, client_id, status, created_at FROM orders WHERE id = %s",
-        (order_id,)
-    )
-    order_row = cursor.fetchone()
-    if not order_row:
-        return None
-    cursor.execute(
-        """
-        SELECT 
-            oi.product_id, 
-            p.name as product_name, 
-            oi.qty, 
-            oi.price_at_moment, 
-            oi.amount
+MAX_BATCH_ITEMS = 500
+EXPORT_BATCH_SIZE = 2000
+
+# Документ заказа целиком собирается в PostgreSQL: позиции агрегируются в JSON,
+# сумма считается в SQL, и клиенту уходит готовая строка без построения Pydantic-моделей.
+# Ожидает заказ под алиасом "o" и присоединенный _ORDER_ITEMS_JOIN.
+_ORDER_DOCUMENT = """
+    json_build_object(
+        'id', o.id,
+        'client_id', o.client_id,
+        'status', o.status,
+        'created_at', o.created_at,
+        'items', COALESCE(items.list, '[]'::json),
+        'total_amount', COALESCE(items.total, 0)
+    )::text
+"""
+
+_ORDER_ITEMS_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT
+            json_agg(
+                json_build_object(
+                    'product_id', oi.product_id,
+                    'product_name', p.name,
+                    'quantity', oi.qty,
+                    'price_at_moment', oi.price_at_moment,
+                    'amount', oi.amount
+                ) ORDER BY p.name
+            ) AS list,
+            SUM(oi.amount) AS total
         FROM order_items oi
         JOIN products p ON oi.product_id = p.id
-        WHERE oi.order_id = %s
-        ORDER BY p.name
-        """,
-        (order_id,)
-    )
-    items_rows = cursor.fetchall()
-    order_items = [
-        OrderItemResponse(
-            product_id=row[0],
-            product_name=row[1],
-            quantity=row[2],
-            price_at_moment=float(row[3]), 
-            amount=float(row[4])
-        ) for row in items_rows
-    ]
-    total_amount = sum(item.amount for item in order_items)
-    return OrderResponse(
-        id=order_row[0],
-        client_id=order_row[1],
-        status=order_row[2],
-        created_at=order_row[3],
-        items=order_items,
-        total_amount=round(total_amount, 2)
+        WHERE oi.order_id = o.id
+    ) items ON true
+"""
+
+
+# Горячие запросы чтения и изменения заказа подготавливаются на соединениях (db/session.py).
+_ORDER_DETAILS = prepared_statement(
+    "order_details", f"SELECT {_ORDER_DOCUMENT} FROM orders o {_ORDER_ITEMS_JOIN} WHERE o.id = %s"
+)
+_LOCK_ORDER = prepared_statement("lock_order", "SELECT status FROM orders WHERE id = %s FOR UPDATE")
+_RESERVE_PRODUCT = prepared_statement(
+    "reserve_product", "SELECT p.price, reserve_stock(p.id, %s) FROM products p WHERE p.id = %s"
+)
+_UPSERT_ORDER_ITEM = prepared_statement("upsert_order_item", """
+    INSERT INTO order_items (order_id, product_id, qty, price_at_moment)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (order_id, product_id) DO UPDATE
+    SET qty = order_items.qty + EXCLUDED.qty
+""")
+
+
+def _json_response(content: str, status_code: int = status.HTTP_200_OK) -> Response:
+    return Response(content=content, media_type="application/json", status_code=status_code)
+
+
+async def _fetch_order_details(order_id: int, cursor: Cursor) -> str | None:
+    """Получает заказ с позициями одним запросом в виде готового JSON-документа."""
+    await cursor.execute(_ORDER_DETAILS, (order_id,))
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+async def _lock_editable_order(order_id: int, cursor: Cursor):
+    """Блокирует заказ перед изменением позиций; менять состав можно только у нового заказа."""
+    await cursor.execute(_LOCK_ORDER, (order_id,))
+    row = await cursor.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if row[0] != "NEW":
+        raise HTTPException(status_code=409, detail=f"Items can only be changed in NEW orders, order is {row[0]}")
+
+
+# Смена статуса набора заказов одним оператором. Заказы блокируются по возрастанию id,
+# допустимость перехода проверяет соединение с order_status_transitions. При отмене
+# остаток всех позиций отмененных заказов возвращается одним UPDATE inventory: строки
+# остатков блокируются по возрастанию product_id, как при резервировании корзины.
+# У горячих товаров возврат попадает в неразложенную часть inventory.stock.
+# Для каждого запрошенного id возвращается строка OrderStatusResult. Запрос не
+# подготавливается: в массиве от одного до MAX_STATUS_BATCH заказов, и общий план,
+# выбранный под короткие массивы, плох для длинных.
+_CHANGE_STATUS = prepared_statement("change_order_status", """
+    WITH requested AS (
+        SELECT DISTINCT unnest(%(order_ids)s::bigint[]) AS id
+    ), locked AS (
+        SELECT o.id, o.status
+        FROM orders o
+        JOIN requested r ON r.id = o.id
+        ORDER BY o.id
+        FOR UPDATE OF o
+    ), moved AS (
+        UPDATE orders o
+        SET status = t.to_status
+        FROM locked l
+        JOIN order_status_transitions t ON t.from_status = l.status AND t.to_status = %(status)s::order_status
+        WHERE o.id = l.id
+        RETURNING o.id
+    ), returned AS (
+        SELECT oi.product_id, SUM(oi.qty) AS qty
+        FROM order_items oi
+        JOIN moved m ON m.id = oi.order_id
+        WHERE %(status)s::order_status = 'CANCELLED'
+        GROUP BY oi.product_id
+    ), stock_locked AS (
+        SELECT i.product_id, r.qty
+        FROM inventory i
+        JOIN returned r ON r.product_id = i.product_id
+        ORDER BY i.product_id
+        FOR UPDATE OF i
+    ), restocked AS (
+        UPDATE inventory i
+        SET stock = i.stock + s.qty
+        FROM stock_locked s
+        WHERE i.product_id = s.product_id
     )
+    SELECT
+        r.id,
+        l.status,
+        CASE WHEN m.id IS NOT NULL THEN %(status)s::order_status ELSE l.status END,
+        m.id IS NOT NULL,
+        CASE
+            WHEN l.id IS NULL THEN 'Order not found'
+            WHEN m.id IS NOT NULL THEN NULL
+            WHEN l.status = %(status)s::order_status THEN 'Order is already ' || l.status
+            ELSE 'Cannot change status from ' || l.status || ' to ' || %(status)s
+        END
+    FROM requested r
+    LEFT JOIN locked l ON l.id = r.id
+    LEFT JOIN moved m ON m.id = r.id
+    ORDER BY r.id
+""", prepare=False)
+
+
+async def _change_status(order_ids: List[int], new_status: OrderStatus, cursor: Cursor) -> list[tuple]:
+    await cursor.execute(_CHANGE_STATUS, {"order_ids": order_ids, "status": new_status})
+    return await cursor.fetchall()
+
 
 @order_router.post("/", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
-def create_order(order_in: OrderCreate, conn: Connection = Depends(get_db_connection)):
+async def create_order(order_in: OrderCreate, conn: Connection = Depends(get_db_connection)):
     """[C]reate: Создает новый пустой заказ для клиента."""
-    with conn.cursor() as cursor:
-        cursor.execute(
-            "INSERT INTO orders (client_id) VALUES (%s) RETURNING id",
+    async with conn.cursor() as cursor:
+        await cursor.execute(
+            f"""
+            WITH o AS (
+                INSERT INTO orders (client_id) VALUES (%s)
+                RETURNING id, client_id, status, created_at
+            )
+            SELECT {_ORDER_DOCUMENT} FROM o {_ORDER_ITEMS_JOIN}
+            """,
             (order_in.client_id,)
         )
-        new_order_id = cursor.fetchone()[0]
-        return _fetch_order_details(new_order_id, cursor)
+        return _json_response((await cursor.fetchone())[0], status.HTTP_201_CREATED)
 
-#Можно изменить на оконную фукнцию, но для простоты и поддежрки оставим так
 @order_router.get("/", response_model=List[OrderResponse])
-def list_orders(skip: int = 0, limit: int = 20, conn: Connection = Depends(get_db_connection)):
-    """[R]ead: Получает список заказов эффективно, избегая проблемы N+1."""
-    with conn.cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT id, client_id, status, created_at 
-            FROM orders 
-            ORDER BY created_at DESC 
-            OFFSET %s LIMIT %s
+async def list_orders(
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    conn: Connection = Depends(get_read_db_connection),
+):
+    """
+    [R]ead: Получает список заказов эффективно, избегая проблемы N+1.
+    Страницы идут по (created_at, id) по убыванию; для глубоких страниц передавайте
+    cursor из заголовка X-Next-Cursor, skip оставлен для совместимости.
+    """
+    page_filter, params = "", (skip, limit)
+    if cursor:
+        after_created_at, after_id = decode_cursor(cursor, (datetime, int))
+        page_filter, params = "WHERE (created_at, id) < (%s, %s)", (after_created_at, after_id, skip, limit)
+    async with conn.cursor() as db_cursor:
+        await db_cursor.execute(
+            f"""
+            SELECT {_ORDER_DOCUMENT}, o.created_at, o.id
+            FROM (
+                SELECT id, client_id, status, created_at
+                FROM orders
+                {page_filter}
+                ORDER BY created_at DESC, id DESC
+                OFFSET %s LIMIT %s
+            ) o
+            {_ORDER_ITEMS_JOIN}
+            ORDER BY o.created_at DESC, o.id DESC
             """,
-            (skip, limit)
+            params
         )
-        orders_rows = cursor.fetchall()
-        if not orders_rows:
-            return []
-        order_ids = [row[0] for row in orders_rows]
-        cursor.execute(
-            """
-            SELECT 
-                oi.order_id, 
-                oi.product_id, 
-                p.name as product_name, 
-                oi.qty, 
-                oi.price_at_moment, 
-                oi.amount
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            WHERE oi.order_id = ANY(%s) -- Используем ANY для поиска в массиве ID
+        rows = await db_cursor.fetchall()
+        response = _json_response("[" + ",".join(row[0] for row in rows) + "]")
+        set_next_cursor(response, rows, limit, 1, 2)
+        return response
+
+
+@order_router.post("/batch:get", response_model=OrderBatchResponse)
+async def batch_get_orders(request: BatchGetRequest, conn: Connection = Depends(get_read_db_connection)):
+    """
+    Заказы с позициями по списку id (до MAX_BATCH_GET) одним запросом: позиции всех
+    заказов подтягиваются тем же _ORDER_ITEMS_JOIN, что и в list_orders.
+    """
+    async with conn.cursor() as cursor:
+        await cursor.execute(
+            f"""
+            SELECT o.id, {_ORDER_DOCUMENT}
+            FROM (SELECT id, client_id, status, created_at FROM orders WHERE id = ANY(%s)) o
+            {_ORDER_ITEMS_JOIN}
             """,
-            (order_ids,) 
+            (request.ids,)
         )
-        items_rows = cursor.fetchall()
-        items_by_order_id = {}
-        for row in items_rows:
-            order_id = row[0]
-            if order_id not in items_by_order_id:
-                items_by_order_id[order_id] = []
-            
-            items_by_order_id[order_id].append(
-                OrderItemResponse(
-                    product_id=row[1],
-                    product_name=row[2],
-                    quantity=row[3],
-                    price_at_moment=float(row[4]),
-                    amount=float(row[5])
-                )
-            )
-        result = []
-        for order_row in orders_rows:
-            order_id = order_row[0]
-            order_items = items_by_order_id.get(order_id, [])
-            total_amount = sum(item.amount for item in order_items)
-            
-            result.append(
-                OrderResponse(
-                    id=order_row[0],
-                    client_id=order_row[1],
-                    status=order_row[2],
-                    created_at=order_row[3],
-                    items=order_items,
-                    total_amount=round(total_amount, 2)
-                )
-            )
-            
-        return result
+        documents = {row[0]: row[1].encode() for row in await cursor.fetchall()}
+    return Response(content=batch_json(request.ids, documents), media_type="application/json")
+
+
+_EXPORT_CSV_COLUMNS = [
+    "order_id", "client_id", "status", "created_at",
+    "product_id", "product_name", "quantity", "price_at_moment", "amount",
+]
+
+# В CSV заказ разворачивается в строку на каждую позицию (заказ без позиций - одна строка
+# с пустыми полями позиции). Nested loop по LATERAL сохраняет порядок заказов из индекса.
+_EXPORT_CSV_ROWS = """
+    SELECT o.id, o.client_id, o.status, o.created_at,
+           i.product_id, i.product_name, i.qty, i.price_at_moment, i.amount
+    FROM orders o
+    LEFT JOIN LATERAL (
+        SELECT oi.product_id, p.name AS product_name, oi.qty, oi.price_at_moment, oi.amount
+        FROM order_items oi
+        JOIN products p ON oi.product_id = p.id
+        WHERE oi.order_id = o.id
+        ORDER BY p.name
+    ) i ON true
+"""
+
+
+def _export_chunk(rows: list, format: ExportFormat) -> bytes:
+    if format == "ndjson":
+        return ("\n".join(row[0] for row in rows) + "\n").encode()
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        (*row[:3], row[3].isoformat(), *row[4:]) for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def _stream_orders_export(query: str, params: tuple, format: ExportFormat):
+    """
+    Отдает выгрузку пачками по EXPORT_BATCH_SIZE строк из именованного (серверного) курсора:
+    в памяти держится только текущая пачка, первая уходит клиенту сразу после первого FETCH.
+    Соединение берется здесь, а не через Depends: зависимости завершаются до того,
+    как StreamingResponse начнет отправлять тело.
+    """
+    if format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(_EXPORT_CSV_COLUMNS)
+        yield buffer.getvalue().encode()
+    async with read_db_connection() as conn:
+        async with conn.cursor(name="orders_export") as cursor:
+            await cursor.execute(query, params)
+            while rows := await cursor.fetchmany(EXPORT_BATCH_SIZE):
+                yield _export_chunk(rows, format)
+
+
+@order_router.get("/export")
+async def export_orders(
+    created_from: Optional[datetime] = Query(None, alias="from"),
+    created_to: Optional[datetime] = Query(None, alias="to"),
+    order_status: Optional[OrderStatus] = Query(None, alias="status"),
+    format: ExportFormat = "ndjson",
+):
+    """
+    Потоковая выгрузка заказов с позициями за период [from, to) по возрастанию created_at.
+    ndjson - по документу заказа (как в GET /orders/{id}) на строку, csv - по строке на позицию.
+    """
+    conditions, params = [], []
+    if created_from is not None:
+        conditions.append("o.created_at >= %s")
+        params.append(created_from)
+    if created_to is not None:
+        conditions.append("o.created_at < %s")
+        params.append(created_to)
+    if order_status is not None:
+        conditions.append("o.status = %s")
+        params.append(order_status)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    if format == "ndjson":
+        query = f"SELECT {_ORDER_DOCUMENT} FROM orders o {_ORDER_ITEMS_JOIN} {where} ORDER BY o.created_at, o.id"
+        media_type = "application/x-ndjson"
+    else:
+        query = f"{_EXPORT_CSV_ROWS} {where} ORDER BY o.created_at, o.id"
+        media_type = "text/csv"
+    return StreamingResponse(
+        _stream_orders_export(query, tuple(params), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+    )
 
 
 @order_router.get("/{order_id}", response_model=OrderResponse)
-def get_order(order_id: int, conn: Connection = Depends(get_db_connection)):
+async def get_order(order_id: int, conn: Connection = Depends(get_read_db_connection)):
     """[R]ead: Получает полную информацию о конкретном заказе."""
-    with conn.cursor() as cursor:
-        order = _fetch_order_details(order_id, cursor)
+    async with conn.cursor() as cursor:
+        order = await _fetch_order_details(order_id, cursor)
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
-        return order
+        return _json_response(order)
+
+
+@order_router.post("/status:bulk", response_model=OrderStatusBulkResponse)
+async def change_orders_status(update: OrderStatusBulkUpdate, conn: Connection = Depends(get_db_connection)):
+    """
+    Переводит до MAX_STATUS_BATCH заказов в новый статус одним запросом. Заказы, для которых
+    переход недопустим или которых нет, не меняются и отмечаются в results с причиной.
+    """
+    async with conn.cursor() as cursor:
+        rows = await _change_status(update.order_ids, update.status, cursor)
+    updated = sum(1 for row in rows if row[3])
+    results = rows_json(rows, OrderStatusResult).decode()
+    return _json_response(f'{{"updated":{updated},"rejected":{len(rows) - updated},"results":{results}}}')
+
+
+@order_router.patch("/{order_id}/status", response_model=OrderResponse)
+async def change_order_status(order_id: int, update: OrderStatusUpdate, conn: Connection = Depends(get_db_connection)):
+    """[U]pdate: Меняет статус заказа; при отмене остаток позиций возвращается на склад."""
+    async with conn.cursor() as cursor:
+        (_, _, _, updated, detail), = await _change_status([order_id], update.status, cursor)
+        if not updated:
+            raise HTTPException(status_code=404 if detail == "Order not found" else 409, detail=detail)
+        return _json_response(await _fetch_order_details(order_id, cursor))
 
 
 @order_router.post("/{order_id}/items", response_model=OrderResponse)
-def add_item_to_order(order_id: int, item_in: OrderItemCreate, conn: Connection = Depends(get_db_connection)):
+async def add_item_to_order(order_id: int, item_in: OrderItemCreate, conn: Connection = Depends(get_db_connection)):
     """[U]pdate: Добавляет товар в заказ (ключевая логика задания)."""
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT id FROM orders WHERE id = %s FOR UPDATE", (order_id,))
-        if not cursor.fetchone():
-            raise HTTPException(status_code=404, detail="Order not found")
-        cursor.execute(
-            "SELECT p.price, i.stock FROM products p JOIN inventory i ON p.id = i.product_id WHERE p.id = %s FOR UPDATE",
-            (item_in.product_id,)
-        )
-        product_data = cursor.fetchone()
-        if not product_data:
+    async with conn.cursor() as cursor:
+        await _lock_editable_order(order_id, cursor)
+        # reserve_stock списывает остаток сразу: у обычного товара - под блокировкой строки
+        # inventory, у горячего - с любого свободного шарда (см. db/schema.sql).
+        await cursor.execute(_RESERVE_PRODUCT, (item_in.quantity, item_in.product_id))
+        product_data = await cursor.fetchone()
+        if not product_data or product_data[1] is None:
             raise HTTPException(status_code=404, detail="Product not found")
-        
-        current_price, current_stock = product_data
-        if current_stock < item_in.quantity:
+
+        current_price, reserved = product_data
+        if not reserved:
+            await cursor.execute("SELECT stock FROM inventory_stock WHERE product_id = %s", (item_in.product_id,))
+            current_stock = (await cursor.fetchone())[0]
             raise HTTPException(status_code=400, detail=f"Insufficient stock. Available: {current_stock}")
-        cursor.execute(
+        await cursor.execute(_UPSERT_ORDER_ITEM, (order_id, item_in.product_id, item_in.quantity, current_price))
+        return _json_response(await _fetch_order_details(order_id, cursor))
+
+
+@order_router.post("/{order_id}/items:batch", response_model=OrderItemsBatchResponse)
+async def add_items_to_order(
+    order_id: int,
+    items_in: List[OrderItemCreate] = Body(..., min_length=1, max_length=MAX_BATCH_ITEMS),
+    conn: Connection = Depends(get_db_connection),
+):
+    """
+    [U]pdate: Добавляет в заказ целую корзину одной транзакцией.
+    Позиции, для которых не хватает остатка, не добавляются и возвращаются в errors.
+    """
+    # Повторы одного товара схлопываем: ON CONFLICT не может дважды обновить одну строку
+    requested: dict[int, int] = {}
+    for item in items_in:
+        requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+    product_ids = sorted(requested)
+
+    async with conn.cursor() as cursor:
+        await _lock_editable_order(order_id, cursor)
+        # Резервируем строго по возрастанию product_id: параллельные корзины берут
+        # блокировки остатков в одном порядке и не могут взаимно заблокироваться.
+        # OFFSET 0 не дает планировщику развернуть подзапрос, так что reserve_stock
+        # вызывается в порядке сортировки.
+        await cursor.execute(
             """
-            INSERT INTO order_items (order_id, product_id, qty, price_at_moment)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (order_id, product_id) DO UPDATE
-            SET qty = order_items.qty + EXCLUDED.qty;
+            SELECT product_id, price, CASE WHEN price IS NOT NULL THEN reserve_stock(product_id, qty) END
+            FROM (
+                SELECT u.product_id, u.qty, p.price
+                FROM unnest(%s::bigint[], %s::int[]) AS u(product_id, qty)
+                LEFT JOIN products p ON p.id = u.product_id
+                ORDER BY u.product_id
+                OFFSET 0
+            ) requested
             """,
-            (order_id, item_in.product_id, item_in.quantity, current_price)
+            (product_ids, [requested[product_id] for product_id in product_ids])
         )
-        cursor.execute(
-            "UPDATE inventory SET stock = stock - %s WHERE product_id = %s",
-            (item_in.quantity, item_in.product_id)
+        reservations = await cursor.fetchall()
+        rejected_ids = [row[0] for row in reservations if row[2] is False]
+        await cursor.execute(
+            "SELECT product_id, stock FROM inventory_stock WHERE product_id = ANY(%s)", (rejected_ids,)
         )
-        return _fetch_order_details(order_id, cursor)
+        available = dict(await cursor.fetchall())
+
+        accepted_ids, accepted_qty, accepted_prices = [], [], []
+        errors = []
+        for product_id, price, reserved in reservations:
+            quantity = requested[product_id]
+            if reserved is None:
+                errors.append(OrderItemError(
+                    product_id=product_id, requested=quantity, available=0, detail="Product not found"
+                ))
+            elif not reserved:
+                errors.append(OrderItemError(
+                    product_id=product_id, requested=quantity, available=available[product_id],
+                    detail=f"Insufficient stock. Available: {available[product_id]}"
+                ))
+            else:
+                accepted_ids.append(product_id)
+                accepted_qty.append(quantity)
+                accepted_prices.append(price)
+
+        if accepted_ids:
+            await cursor.execute(
+                """
+                INSERT INTO order_items (order_id, product_id, qty, price_at_moment)
+                SELECT %s, u.product_id, u.qty, u.price
+                FROM unnest(%s::bigint[], %s::int[], %s::numeric[]) AS u(product_id, qty, price)
+                ON CONFLICT (order_id, product_id) DO UPDATE
+                SET qty = order_items.qty + EXCLUDED.qty
+                """,
+                (order_id, accepted_ids, accepted_qty, accepted_prices)
+            )
+        order = await _fetch_order_details(order_id, cursor)
+        errors_json = json.dumps([error.model_dump() for error in errors])
+        return _json_response(f'{{"order":{order},"errors":{errors_json}}}')
 
 
 @order_router.delete("/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_order(order_id: int, conn: Connection = Depends(get_db_connection)):
+async def delete_order(order_id: int, conn: Connection = Depends(get_db_connection)):
     """[D]elete: Удаляет заказ и все его позиции (благодаря ON DELETE CASCADE)."""
-    with conn.cursor() as cursor:
-        cursor.execute("DELETE FROM orders WHERE id = %s", (order_id,))
+    async with conn.cursor() as cursor:
+        await cursor.execute("DELETE FROM orders WHERE id = %s", (order_id,))
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Order not found")
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
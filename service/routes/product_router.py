@@ -1,49 +1,73 @@
 
 
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status
-from typing import List
-from psycopg2.extensions import connection as Connection
-from schemas.product import ProductCreate, ProductResponse, ProductUpdate
+from decimal import Decimal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from typing import List, Optional
+from psycopg import AsyncConnection as Connection
+from schemas.batch import BatchGetRequest
+from schemas.product import (
+    ProductBatchResponse, ProductCreate, ProductImportResult, ProductResponse, ProductSearchResult, ProductUpdate,
+)
 
+from cache.products import product_cache
+from db.replicas import get_read_db_connection
 from db.session import get_db_connection
+from db.product_import import ImportFormat, ImportFormatError, import_products, iter_lines
+from db.product_search import NameMatch, ProductSearch, ProductSort, approximate_total
+from utils.pagination import decode_cursor, set_next_cursor
+from utils.serialization import rows_batch_response, rows_response
 
 product_router = APIRouter()
 
+APPROXIMATE_TOTAL_HEADER = "X-Total-Count-Estimate"
 
 @product_router.get("/", response_model=List[ProductResponse])
-def get_products(conn: Connection = Depends(get_db_connection), skip: int = 0, limit: int = 100):
-    with conn.cursor() as cursor:
-        cursor.execute(
+async def get_products(
+    conn: Connection = Depends(get_read_db_connection),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+):
+    """
+    Список товаров по возрастанию id. Для глубоких страниц передавайте cursor
+    из заголовка X-Next-Cursor предыдущего ответа; skip оставлен для совместимости.
+    """
+    after_id = decode_cursor(cursor, (int,))[0] if cursor else 0
+    async with conn.cursor() as db_cursor:
+        await db_cursor.execute(
             """
             SELECT p.id, p.name, p.price, p.category_id, COALESCE(i.stock, 0) as stock
             FROM products p
-            LEFT JOIN inventory i ON p.id = i.product_id
+            LEFT JOIN inventory_stock i ON p.id = i.product_id
+            WHERE p.id > %s
             ORDER BY p.id
             OFFSET %s LIMIT %s
             """,
-            (skip, limit)
+            (after_id, skip, limit)
         )
-        rows = cursor.fetchall()
-        return [ProductResponse(id=row[0], name=row[1], price=row[2], category_id=row[3], stock=row[4]) for row in rows]
+        rows = await db_cursor.fetchall()
+        response = rows_response(rows, ProductResponse)
+        set_next_cursor(response, rows, limit, 0)
+        return response
     
 
 @product_router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
-def create_product(product: ProductCreate, conn: Connection = Depends(get_db_connection)):
+async def create_product(product: ProductCreate, conn: Connection = Depends(get_db_connection)):
     """Создает товар и связанную с ним запись об остатках."""
-    with conn.cursor() as cursor:
-        cursor.execute(
+    async with conn.cursor() as cursor:
+        await cursor.execute(
             """INSERT INTO products (name, price, category_id)
             VALUES (%s, %s, %s)
             RETURNING id, name, price, category_id
             """,
             (product.name, product.price, product.category_id)
         )
-        product_row = cursor.fetchone()
+        product_row = await cursor.fetchone()
         new_product_id = product_row[0]
         
         initial_stock = product.initial_stock if hasattr(product, 'initial_stock') else 0
-        cursor.execute(
+        await cursor.execute(
             """INSERT INTO inventory (product_id, stock)
             VALUES (%s, %s)
             """,
@@ -53,28 +77,88 @@ def create_product(product: ProductCreate, conn: Connection = Depends(get_db_con
             id=product_row[0], name=product_row[1], price=product_row[2], category_id=product_row[3], stock=initial_stock
         )
         
-@product_router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, conn: Connection = Depends(get_db_connection)):
-    with conn.cursor() as cursor:
-        cursor.execute(
+@product_router.post("/import", response_model=ProductImportResult)
+async def import_products_bulk(
+    request: Request,
+    format: ImportFormat = "csv",
+    conn: Connection = Depends(get_db_connection),
+):
+    """
+    Массовая загрузка каталога из потока CSV (с заголовком) или NDJSON.
+    Поля: name, price, category_id, initial_stock и необязательный id -
+    строки с id обновляют существующий товар, без id - создают новый.
+    Строки с ошибками пропускаются и попадают в отчет.
+    """
+    async with conn.cursor() as cursor:
+        try:
+            result = await import_products(cursor, iter_lines(request.stream()), format)
+        except ImportFormatError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return ProductImportResult(**result)
+
+
+@product_router.get("/search", response_model=List[ProductSearchResult])
+async def search_products(
+    q: Optional[str] = Query(None, min_length=3),
+    match: NameMatch = "substring",
+    min_price: Optional[Decimal] = Query(None, ge=0),
+    max_price: Optional[Decimal] = Query(None, ge=0),
+    category_id: Optional[int] = None,
+    subtree: bool = False,
+    in_stock: bool = False,
+    sort: ProductSort = "name",
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    conn: Connection = Depends(get_read_db_connection),
+):
+    """
+    Поиск товаров: q - по названию (match=substring - подстрока, fuzzy - похожее слово),
+    диапазон цены, категория (subtree=true - вместе с подкатегориями), in_stock=true - только
+    в наличии. sort - price, name или total_sold, с минусом - по убыванию. Keyset-пагинация
+    через X-Next-Cursor; первая страница содержит примерный размер выдачи в X-Total-Count-Estimate.
+    """
+    search = ProductSearch(q, match, min_price, max_price, category_id, subtree, in_stock, sort)
+    after = decode_cursor(cursor, search.cursor_types) if cursor else None
+    sql, params = search.page_query(after, limit)
+    async with conn.cursor() as db_cursor:
+        await db_cursor.execute(sql, params)
+        rows = await db_cursor.fetchall()
+        response = rows_response(rows, ProductSearchResult)
+        set_next_cursor(response, rows, limit, *search.cursor_columns)
+        if cursor is None:
+            response.headers[APPROXIMATE_TOTAL_HEADER] = str(await approximate_total(db_cursor, search))
+        return response
+
+
+@product_router.post("/batch:get", response_model=ProductBatchResponse)
+async def batch_get_products(request: BatchGetRequest, conn: Connection = Depends(get_read_db_connection)):
+    """Товары по списку id (до MAX_BATCH_GET) одним запросом вместо запроса на каждый товар."""
+    async with conn.cursor() as cursor:
+        await cursor.execute(
             """
             SELECT p.id, p.name, p.price, p.category_id, COALESCE(i.stock, 0) as stock
             FROM products p
-            LEFT JOIN inventory i ON p.id = i.product_id
-            WHERE p.id = %s
+            LEFT JOIN inventory_stock i ON p.id = i.product_id
+            WHERE p.id = ANY(%s)
             """,
-            (product_id,)
+            (request.ids,)
         )
-        row = cursor.fetchone()
-        if row:
-            return ProductResponse(id=row[0], name=row[1], price=row[2], category_id=row[3], stock=row[4])
+        return rows_batch_response(request.ids, await cursor.fetchall(), ProductResponse)
+
+
+@product_router.get("/{product_id}", response_model=ProductResponse)
+async def get_product(product_id: int):
+    """Карточка товара: каталог из кэша воркера, остаток - см. cache/products.py."""
+    product = await product_cache.get(product_id)
+    if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    return product
 
 @product_router.patch("/{product_id}", response_model=ProductResponse)
-def update_product_info(product_id: int, product_update: ProductUpdate, conn: Connection = Depends(get_db_connection)):
+async def update_product_info(product_id: int, product_update: ProductUpdate, conn: Connection = Depends(get_db_connection)):
     """Обновляет только информацию о товаре (каталог), не трогая остатки."""
-    with conn.cursor() as cursor:
-        cursor.execute(
+    async with conn.cursor() as cursor:
+        await cursor.execute(
             """ WITH updated_product AS (
                     UPDATE products
                     SET name = %s, price = %s, category_id = %s
@@ -84,20 +168,24 @@ def update_product_info(product_id: int, product_update: ProductUpdate, conn: Co
                 SELECT 
                     up.id, up.name, up.price, up.category_id, i.stock
                 FROM updated_product up
-                JOIN inventory i ON up.id = i.product_id;  
+                JOIN inventory_stock i ON up.id = i.product_id;  
             """,
             (product_update.name, product_update.price, product_update.category_id, product_id)
         )
-        row = cursor.fetchone()
+        row = await cursor.fetchone()
         if row:
+            # Запрос, прочитавший карточку до COMMIT, мог снова ее закэшировать: такую запись
+            # сбросит уведомление product_changed, которое триггер отправит при фиксации.
+            product_cache.discard(product_id)
             return ProductResponse(id=row[0], name=row[1], price=row[2], category_id=row[3], stock=row[4])
         raise HTTPException(status_code=404, detail="Product Not Found")
         
 
 @product_router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(product_id: int, conn: Connection = Depends(get_db_connection)):
-    with conn.cursor() as cursor:
-        cursor.execute("DELETE FROM products WHERE id = %s", (product_id))
+async def delete_product(product_id: int, conn: Connection = Depends(get_db_connection)):
+    async with conn.cursor() as cursor:
+        await cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Product Not Found")
+    product_cache.discard(product_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Any, List, Optional
+
+from pydantic import BaseModel
+
+
+class PoolStats(BaseModel):
+    """Живая статистика пула соединений с БД."""
+    min_size: int
+    max_size: int
+    size: int
+    in_use: int
+    idle: int
+    waiters: int
+    acquire_wait_p99_ms: float
+
+
+class ReplicaStats(BaseModel):
+    """Состояние реплики для чтения."""
+    name: str
+    healthy: bool
+    lag_seconds: Optional[float] = None
+    in_use: int
+    size: int
+
+
+class SlowQuery(BaseModel):
+    """Запрос дольше DB_PROFILER_SLOW_MS; plan - EXPLAIN повторного выполнения, если он уже получен."""
+    fingerprint: str
+    query: str
+    params: Optional[Any] = None
+    duration_ms: float
+    route: Optional[str] = None
+    captured_at: datetime
+    plan: Optional[str] = None
+    plan_error: Optional[str] = None
+
+
+class NPlusOneReport(BaseModel):
+    """HTTP-запрос, в котором один и тот же SQL-запрос выполнился слишком много раз."""
+    route: str
+    fingerprint: str
+    query: str
+    repeats: int
+    statements: int
+    captured_at: datetime
+
+
+class SlowQueryReport(BaseModel):
+    enabled: bool
+    slow_ms: float
+    slow_queries: List[SlowQuery]
+    n_plus_one: List[NPlusOneReport]
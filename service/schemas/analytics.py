@@ -0,0 +1,32 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+# Окно отчета: часы считаются по часовой витрине (текущий час и 1 или 24 полных часа перед ним),
+# дни - по суточной (включая сегодня).
+AnalyticsWindow = Literal["1h", "24h", "7d", "30d"]
+
+
+class TopProduct(BaseModel):
+    """Строка отчета «Топ самых покупаемых товаров» (2.3 из queries.sql)."""
+    product_id: int
+    product_name: str
+    root_category_name: str
+    total_qty_sold: int
+    total_amount_sold: float
+
+
+class ClientTotal(BaseModel):
+    """Сумма заказанных клиентом товаров (2.1 из queries.sql)."""
+    client_id: int
+    client_name: str
+    orders_count: int
+    total_amount: float
+
+
+class CategoryChildrenCount(BaseModel):
+    """Количество прямых потомков категории (2.2 из queries.sql)."""
+    category_id: int
+    category_name: str
+    path: str
+    direct_children_count: int
@@ -0,0 +1,11 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+# Сколько объектов можно запросить одним batch-get.
+MAX_BATCH_GET = 1000
+
+
+class BatchGetRequest(BaseModel):
+    """id объектов; ответ идет в том же порядке, повторы отдаются один раз."""
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_GET)
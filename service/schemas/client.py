@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel
 
 
@@ -15,3 +17,8 @@ class ClientResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class ClientBatchResponse(BaseModel):
+    """Найденные клиенты в порядке запроса и id, которых нет."""
+    items: List[ClientResponse]
+    missing: List[int]
@@ -1,9 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class InventoryResponse(BaseModel):
     """Схема для ответа API по остаткам."""
     product_id: int
     stock: int
+    shards: int = 0 # > 0 - горячий товар, остаток разложен по шардам
 
     class Config:
         from_attributes = True
@@ -14,4 +15,8 @@ class StockSet(BaseModel):
 
 class StockAdjust(BaseModel):
     """Схема для изменения остатка (поступление/списание)."""
-    change_by: int # может - или плюс
\ No newline at end of file
+    change_by: int # может - или плюс
+
+class HotInventorySet(BaseModel):
+    """Включает (shards > 0) или выключает (shards = 0) шардирование остатка горячего товара."""
+    shards: int = Field(..., ge=0, le=64)
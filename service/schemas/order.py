@@ -1,7 +1,13 @@
 from datetime import datetime
-from typing import List
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 
+OrderStatus = Literal["NEW", "PROCESSING", "COMPLETED", "CANCELLED"]
+ExportFormat = Literal["ndjson", "csv"]
+
+# Сколько заказов можно перевести в другой статус одним запросом.
+MAX_STATUS_BATCH = 10_000
+
 
 class OrderItemCreate(BaseModel):
     product_id: int
@@ -28,3 +34,41 @@ class OrderResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class OrderBatchResponse(BaseModel):
+    """Найденные заказы в порядке запроса и id, которых нет."""
+    items: List[OrderResponse]
+    missing: List[int]
+
+class OrderItemError(BaseModel):
+    """Позиция пакета, которую не удалось добавить в заказ."""
+    product_id: int
+    requested: int
+    available: int
+    detail: str
+
+class OrderItemsBatchResponse(BaseModel):
+    order: OrderResponse
+    errors: List[OrderItemError] = []
+
+
+class OrderStatusUpdate(BaseModel):
+    status: OrderStatus
+
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: List[int] = Field(..., min_length=1, max_length=MAX_STATUS_BATCH)
+    status: OrderStatus
+
+class OrderStatusResult(BaseModel):
+    """Итог смены статуса одного заказа; status - статус после операции."""
+    order_id: int
+    previous_status: Optional[OrderStatus] = None
+    status: Optional[OrderStatus] = None
+    updated: bool
+    detail: Optional[str] = None
+
+class OrderStatusBulkResponse(BaseModel):
+    updated: int
+    rejected: int
+    results: List[OrderStatusResult]
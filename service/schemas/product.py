@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
 
@@ -18,7 +18,32 @@ class ProductResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ProductSearchResult(ProductResponse):
+    """
+    Строка поиска товаров: карточка и точный счетчик продаж. Сортировка по total_sold идет
+    по сжатой базе счетчика и до сжатия дельт может расходиться с порядком этих значений.
+    """
+    total_sold: int
+
+class ProductBatchResponse(BaseModel):
+    """Найденные товары в порядке запроса и id, которых нет."""
+    items: List[ProductResponse]
+    missing: List[int]
+
 class ProductUpdate(BaseModel):
     name: str
     price: float
-    category_id: int
\ No newline at end of file
+    category_id: int
+
+
+class ProductImportError(BaseModel):
+    line: int
+    detail: str
+
+class ProductImportResult(BaseModel):
+    """Итог массовой загрузки каталога."""
+    received: int
+    inserted: int
+    updated: int
+    rejected: int
+    errors: List[ProductImportError] = []
@@ -1,9 +1,10 @@
 import pytest
 from fastapi.testclient import TestClient
 from main import app
-from db.session import get_db_connection, connection_pool
+from db import session
+from db.session import get_db_connection
 
-def override_get_db_connection():
+async def override_get_db_connection():
     """
     Для каждого HTTP-запроса в тесте эта функция будет открывать
     соединение и делать COMMIT, точно так же, как "боевой" код.
@@ -12,16 +13,16 @@ def override_get_db_connection():
     """
     conn = None
     try:
-        conn = connection_pool.getconn()
+        conn = await session.connection_pool.getconn()
         yield conn
-        conn.commit()
+        await conn.commit()
     except Exception:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         raise
     finally:
         if conn:
-            connection_pool.putconn(conn)
+            await session.connection_pool.putconn(conn)
 
 app.dependency_overrides[get_db_connection] = override_get_db_connection
 
@@ -0,0 +1,14 @@
+from fastapi.testclient import TestClient
+
+
+def test_pool_stats(test_client: TestClient):
+    # Любой запрос к БД гарантирует, что пул уже открыл хотя бы одно соединение
+    assert test_client.get("/clients/").status_code == 200
+
+    stats_res = test_client.get("/admin/pool")
+    assert stats_res.status_code == 200
+    stats = stats_res.json()
+    assert stats["size"] >= 1
+    assert stats["in_use"] + stats["idle"] == stats["size"]
+    assert stats["size"] <= stats["max_size"]
+    assert stats["acquire_wait_p99_ms"] >= 0
@@ -0,0 +1,67 @@
+import asyncio
+
+import psycopg
+from fastapi.testclient import TestClient
+
+from cache.ttl import TTLCache
+from db.session import DATABASE_URL
+from jobs.rollups import refresh_sales_rollups
+from routes.analytics_router import analytics_cache
+
+
+def test_ttl_cache_coalesces_concurrent_loads():
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def scenario():
+        cache = TTLCache(ttl=60)
+        entries = await asyncio.gather(*(cache.get("key", loader) for _ in range(100)))
+        cached = await cache.get("key", loader)
+        cache.invalidate()
+        reloaded = await cache.get("key", loader)
+        return {entry.value for entry in entries}, cached.value, reloaded.value
+
+    assert asyncio.run(scenario()) == ({1}, 1, 2)
+    assert calls == 2
+
+
+def test_analytics_reports_read_rollups(test_client: TestClient):
+    client_id = test_client.post("/clients/", json={"name": "Analytics Buyer", "address": "Report St"}).json()["id"]
+    root_id = test_client.post("/categories/", json={"name": "Analytics Root"}).json()["id"]
+    category_id = test_client.post("/categories/", json={"name": "Analytics Leaf", "parent_id": root_id}).json()["id"]
+    product_id = test_client.post("/products/", json={
+        "name": "Analytics Product", "price": 7, "category_id": category_id, "initial_stock": 1000,
+    }).json()["id"]
+    order_id = test_client.post("/orders/", json={"client_id": client_id}).json()["id"]
+    test_client.post(f"/orders/{order_id}/items", json={"product_id": product_id, "quantity": 500})
+    with psycopg.connect(DATABASE_URL) as conn:
+        # Заказ 59 минут назад может лежать в прошлой часовой корзине - окно 1h ее тоже берет
+        conn.execute(
+            "UPDATE orders SET status = 'COMPLETED', created_at = now() - INTERVAL '59 minutes' WHERE id = %s",
+            (order_id,),
+        )
+    test_client.portal.call(refresh_sales_rollups)
+    analytics_cache.invalidate()
+
+    for window in ("1h", "24h", "7d", "30d"):
+        response = test_client.get("/analytics/top-products", params={"window": window, "limit": 1})
+        assert response.status_code == 200
+        assert response.json() == [{
+            "product_id": product_id, "product_name": "Analytics Product", "root_category_name": "Analytics Root",
+            "total_qty_sold": 500, "total_amount_sold": 3500.0,
+        }]
+        assert "X-Data-As-Of" in response.headers
+        assert response.headers["Age"] == "0"
+    assert test_client.get("/analytics/top-products", params={"window": "2w"}).status_code == 422
+
+    totals = test_client.get("/analytics/client-totals", params={"limit": 1000}).json()
+    assert {"client_id": client_id, "client_name": "Analytics Buyer", "orders_count": 1, "total_amount": 3500.0} in totals
+
+    counts = {row["category_id"]: row["direct_children_count"]
+              for row in test_client.get("/analytics/category-children-counts").json()}
+    assert counts[root_id] == 1 and counts[category_id] == 0
@@ -0,0 +1,112 @@
+import time
+
+import psycopg
+from fastapi.testclient import TestClient
+
+from db.session import DATABASE_URL
+
+
+def _find(nodes: list, category_id: int) -> dict | None:
+    for node in nodes:
+        if node["id"] == category_id:
+            return node
+        found = _find(node["children"], category_id)
+        if found:
+            return found
+    return None
+
+
+def test_category_tree_etag_and_invalidation(test_client: TestClient):
+    tree_res = test_client.get("/categories/tree")
+    assert tree_res.status_code == 200
+    etag = tree_res.headers["ETag"]
+
+    not_modified = test_client.get("/categories/tree", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+
+    root_id = test_client.post("/categories/", json={"name": "Tree Root"}).json()["id"]
+    child_id = test_client.post("/categories/", json={"name": "Tree Child", "parent_id": root_id}).json()["id"]
+
+    changed = test_client.get("/categories/tree", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert _find(changed.json(), root_id)["children"][0]["id"] == child_id
+
+    assert test_client.delete(f"/categories/{root_id}").status_code == 204
+    assert _find(test_client.get("/categories/tree").json(), root_id) is None
+
+
+def test_category_tree_invalidated_by_notify(test_client: TestClient):
+    """Изменение в обход роутера (как из другого воркера) доходит через LISTEN/NOTIFY."""
+    etag = test_client.get("/categories/tree").headers["ETag"]
+    with psycopg.connect(DATABASE_URL) as conn:
+        row = conn.execute(
+            "INSERT INTO categories (name, path) VALUES ('Notify Root', 'tmp') RETURNING id"
+        ).fetchone()
+        conn.execute("UPDATE categories SET path = %s::ltree WHERE id = %s", (str(row[0]), row[0]))
+
+    for _ in range(50):
+        if test_client.get("/categories/tree").headers["ETag"] != etag:
+            break
+        time.sleep(0.05)
+    assert _find(test_client.get("/categories/tree").json(), row[0]) is not None
+
+
+def test_category_subtree_and_products(test_client: TestClient):
+    root_id = test_client.post("/categories/", json={"name": "Subtree Root"}).json()["id"]
+    child_id = test_client.post("/categories/", json={"name": "Subtree Child", "parent_id": root_id}).json()["id"]
+    leaf_id = test_client.post("/categories/", json={"name": "Subtree Leaf", "parent_id": child_id}).json()["id"]
+
+    subtree = test_client.get(f"/categories/{child_id}/subtree")
+    assert subtree.status_code == 200
+    assert subtree.json()["id"] == child_id
+    assert [node["id"] for node in subtree.json()["children"]] == [leaf_id]
+    assert test_client.get(f"/categories/{root_id}/subtree", params={"max_depth": 1}).json()["children"][0]["children"] == []
+    assert test_client.get("/categories/999999999/subtree").status_code == 404
+
+    product_ids = []
+    for category_id, stock in ((root_id, 0), (child_id, 3), (leaf_id, 5)):
+        product = test_client.post(
+            "/products/", json={"name": f"Subtree Product {category_id}", "price": 10, "category_id": category_id}
+        ).json()
+        test_client.put(f"/inventory/{product['id']}", json={"stock": stock})
+        product_ids.append(product["id"])
+
+    first_page = test_client.get(f"/categories/{root_id}/products", params={"limit": 2})
+    assert [p["id"] for p in first_page.json()] == product_ids[:2]
+    second_page = test_client.get(
+        f"/categories/{root_id}/products", params={"limit": 2, "cursor": first_page.headers["X-Next-Cursor"]}
+    )
+    assert [p["id"] for p in second_page.json()] == product_ids[2:]
+
+    in_stock = test_client.get(f"/categories/{child_id}/products", params={"in_stock": True}).json()
+    assert [p["id"] for p in in_stock] == product_ids[1:]
+    assert test_client.get("/categories/999999999/products").status_code == 404
+
+
+def test_move_and_rename_category(test_client: TestClient):
+    source_id = test_client.post("/categories/", json={"name": "Move Source"}).json()["id"]
+    branch = test_client.post("/categories/", json={"name": "Move Branch", "parent_id": source_id}).json()
+    leaf = test_client.post("/categories/", json={"name": "Move Leaf", "parent_id": branch["id"]}).json()
+    target = test_client.post("/categories/", json={"name": "Move Target"}).json()
+    assert leaf["path"] == f"{source_id}.{branch['id']}.{leaf['id']}"
+    assert test_client.post("/categories/", json={"name": "Orphan", "parent_id": 999999999}).status_code == 404
+
+    moved = test_client.patch(f"/categories/{branch['id']}", json={"parent_id": target["id"], "name": "Moved Branch"})
+    assert moved.status_code == 200
+    assert moved.json()["path"] == f"{target['id']}.{branch['id']}"
+    assert moved.json()["name"] == "Moved Branch"
+    assert test_client.get(f"/categories/{leaf['id']}").json()["path"] == f"{target['id']}.{branch['id']}.{leaf['id']}"
+    assert test_client.get(f"/categories/{source_id}/subtree").json()["children"] == []
+
+    to_root = test_client.patch(f"/categories/{branch['id']}", json={"parent_id": None})
+    assert to_root.json()["path"] == str(branch["id"])
+    assert to_root.json()["parent_id"] is None
+    assert test_client.get(f"/categories/{leaf['id']}").json()["path"] == f"{branch['id']}.{leaf['id']}"
+
+    assert test_client.patch(f"/categories/{branch['id']}", json={"parent_id": leaf["id"]}).status_code == 400
+    assert test_client.patch(f"/categories/{branch['id']}", json={"parent_id": 999999999}).status_code == 404
+    assert test_client.patch("/categories/999999999", json={"name": "Nope"}).status_code == 404
+
+    test_client.post("/categories/", json={"name": "Taken", "parent_id": target["id"]})
+    assert test_client.patch(f"/categories/{leaf['id']}", json={"parent_id": target["id"], "name": "Taken"}).status_code == 409
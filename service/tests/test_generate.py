@@ -0,0 +1,34 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+from db.generate import category_tree, id_chunks, order_item_rows, order_rows, popularity, product_catalog
+
+
+def test_category_tree_respects_depth_fanout_and_count():
+    tree = category_tree(count=50, depth=3, fanout=3)
+    # 3 + 9 + 27 узлов: дерево упирается в глубину раньше, чем в count.
+    assert len(tree) == 39
+    ids = {row[0] for row in tree}
+    for category_id, _, path, parent_id in tree:
+        assert path.split(".")[-1] == str(category_id)
+        assert parent_id is None or parent_id in ids and parent_id < category_id
+    assert max(len(row[2].split(".")) for row in tree) == 3
+    assert len(category_tree(count=10, depth=3, fanout=3)) == 10
+
+
+def test_generated_rows_are_deterministic_and_chunk_independent():
+    end = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert list(order_rows(7, 1, 100, 50, end, 30)) == list(order_rows(7, 1, 100, 50, end, 30))
+    assert list(order_rows(7, 1, 100, 50, end, 30)) != list(order_rows(8, 1, 100, 50, end, 30))
+    assert id_chunks(10, 4) == [(1, 5), (5, 9), (9, 11)]
+
+    prices, _ = product_catalog(7, 200, [1, 2, 3])
+    ranked, cum_weights = popularity(7, 200, 1.1)
+    items = list(order_item_rows(7, 1, 2001, 5, prices, ranked, cum_weights))
+    assert items == list(order_item_rows(7, 1, 2001, 5, prices, ranked, cum_weights))
+    # Позиции заказа - разные товары, цена - цена товара из каталога.
+    assert len({(order_id, product_id) for order_id, product_id, _, _ in items}) == len(items)
+    assert all(price == prices[product_id - 1] for _, product_id, _, price in items)
+    # Самый популярный товар продается заметно чаще среднего.
+    sales = Counter(product_id for _, product_id, _, _ in items)
+    assert sales[ranked[0]] > 10 * len(items) / 200
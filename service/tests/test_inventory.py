@@ -0,0 +1,47 @@
+import psycopg
+from fastapi.testclient import TestClient
+
+from db.session import DATABASE_URL
+from jobs.inventory import rebalance_hot_inventory
+
+
+def _shards(product_id: int) -> list[int]:
+    with psycopg.connect(DATABASE_URL) as conn:
+        rows = conn.execute(
+            "SELECT stock FROM inventory_shards WHERE product_id = %s ORDER BY shard", (product_id,)
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def test_hot_inventory_keeps_stock_exact(test_client: TestClient):
+    client_id = test_client.post("/clients/", json={"name": "Hot Buyer", "address": "Hot St"}).json()["id"]
+    category_id = test_client.post("/categories/", json={"name": "Hot Category"}).json()["id"]
+    product_id = test_client.post("/products/", json={
+        "name": "Hot Product", "price": 5, "category_id": category_id, "initial_stock": 100,
+    }).json()["id"]
+    order_id = test_client.post("/orders/", json={"client_id": client_id}).json()["id"]
+
+    hot = test_client.put(f"/inventory/{product_id}/hot", json={"shards": 4})
+    assert hot.json() == {"product_id": product_id, "stock": 100, "shards": 4}
+    assert _shards(product_id) == [25, 25, 25, 25]
+
+    assert test_client.post(f"/orders/{order_id}/items", json={"product_id": product_id, "quantity": 20}).status_code == 200
+    assert test_client.get(f"/inventory/{product_id}").json()["stock"] == 80
+    assert test_client.get(f"/products/{product_id}").json()["stock"] == 80
+
+    too_many = test_client.post(f"/orders/{order_id}/items", json={"product_id": product_id, "quantity": 81})
+    assert too_many.status_code == 400
+    assert too_many.json()["detail"] == "Insufficient stock. Available: 80"
+    # Ни в одном шарде нет 70 штук - резерв проходит через медленный путь и перераскладывает остаток.
+    assert test_client.post(f"/orders/{order_id}/items", json={"product_id": product_id, "quantity": 70}).status_code == 200
+    assert sum(_shards(product_id)) == 10
+
+    assert test_client.patch(f"/inventory/{product_id}/adjust", json={"change_by": 30}).json()["stock"] == 40
+    assert test_client.patch(f"/inventory/{product_id}/adjust", json={"change_by": -41}).status_code == 400
+    assert test_client.portal.call(rebalance_hot_inventory) >= 1
+    assert _shards(product_id) == [10, 10, 10, 10]
+
+    assert test_client.put(f"/inventory/{product_id}", json={"stock": 7}).json()["stock"] == 7
+    cold = test_client.put(f"/inventory/{product_id}/hot", json={"shards": 0})
+    assert cold.json() == {"product_id": product_id, "stock": 7, "shards": 0}
+    assert _shards(product_id) == []
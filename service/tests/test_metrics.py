@@ -0,0 +1,56 @@
+from fastapi.testclient import TestClient
+
+from db.session import statement_fingerprint
+from utils.metrics import Histogram, Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, ('/a/{id}',))
+    assert registry.render().splitlines() == [
+        "# HELP demo_seconds Demo.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{route="/a/{id}",le="0.1"} 2',
+        'demo_seconds_bucket{route="/a/{id}",le="1.0"} 3',
+        'demo_seconds_bucket{route="/a/{id}",le="+Inf"} 4',
+        'demo_seconds_sum{route="/a/{id}"} 3.65',
+        'demo_seconds_count{route="/a/{id}"} 4',
+    ]
+
+
+def test_statement_fingerprint_ignores_literals_and_whitespace():
+    assert statement_fingerprint("SELECT * FROM t WHERE id = 1") == statement_fingerprint(
+        "SELECT *\n  FROM t\n  WHERE id = 42"
+    )
+    assert statement_fingerprint("SELECT 'a'") == statement_fingerprint("SELECT 'b'")
+    assert statement_fingerprint("SELECT * FROM t") != statement_fingerprint("SELECT * FROM u")
+
+
+def test_metrics_endpoint(test_client: TestClient):
+    assert test_client.get("/products/1").status_code == 200
+    assert test_client.get("/no-such-page").status_code == 404
+
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+
+    def sample(prefix: str) -> float:
+        return float(next(line for line in lines if line.startswith(prefix)).rsplit(" ", 1)[1])
+
+    assert sample('http_request_duration_seconds_count{method="GET",route="/products/{product_id}",status="200"}') >= 1
+    assert sample('http_request_duration_seconds_count{method="GET",route="<unmatched>",status="404"}') >= 1
+    assert sample("http_requests_in_flight") == 1
+    assert sample('db_pool_acquire_wait_seconds_count{pool="primary"}') >= 1
+    assert 0 <= sample('db_pool_saturation{pool="primary"}') <= 1
+    assert sample('db_transactions_total{outcome="commit"}') >= 1
+
+    fingerprint = statement_fingerprint(
+        "SELECT p.id, p.name, p.price, p.category_id, COALESCE(i.stock, 0) as stock FROM products p "
+        "LEFT JOIN inventory_stock i ON p.id = i.product_id WHERE p.id = %s"
+    )
+    assert sample(f'db_statement_duration_seconds_count{{statement="{fingerprint}"}}') >= 1
+    assert sample(f'db_statement_rows_total{{statement="{fingerprint}"}}') >= 1
+    assert any(line.startswith(f'db_statement_info{{statement="{fingerprint}",query="SELECT p.id') for line in lines)
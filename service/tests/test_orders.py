@@ -1,3 +1,7 @@
+import csv
+import io
+import json
+
 from fastapi.testclient import TestClient
 
 # Тест главной бизнес-логики: добавление товара в заказ
@@ -79,4 +83,150 @@ def test_add_item_to_order_flow(test_client: TestClient):
         "quantity": 6
     })
     assert add_fail_res.status_code == 400
-    assert "Insufficient stock" in add_fail_res.json()["detail"]
\ No newline at end of file
+    assert "Insufficient stock" in add_fail_res.json()["detail"]
+
+def test_add_items_batch(test_client: TestClient):
+    client_id = test_client.post("/clients/", json={"name": "Batch Client", "address": "1 Batch St"}).json()["id"]
+    category_id = test_client.post("/categories/", json={"name": "Batch Category"}).json()["id"]
+    product_ids = []
+    for name, stock in [("Batch A", 10), ("Batch B", 1)]:
+        res = test_client.post("/products/", json={
+            "name": name, "price": 10.0, "category_id": category_id, "initial_stock": stock
+        })
+        product_ids.append(res.json()["id"])
+    order_id = test_client.post("/orders/", json={"client_id": client_id}).json()["id"]
+
+    # Товар A встречается дважды (2 + 3), товара B не хватает, товара 10**9 нет вовсе
+    batch_res = test_client.post(f"/orders/{order_id}/items:batch", json=[
+        {"product_id": product_ids[0], "quantity": 2},
+        {"product_id": product_ids[1], "quantity": 5},
+        {"product_id": product_ids[0], "quantity": 3},
+        {"product_id": 10**9, "quantity": 1},
+    ])
+    assert batch_res.status_code == 200
+    data = batch_res.json()
+
+    assert [(i["product_id"], i["quantity"]) for i in data["order"]["items"]] == [(product_ids[0], 5)]
+    assert data["order"]["total_amount"] == 50.0
+    errors = {e["product_id"]: e for e in data["errors"]}
+    assert errors[product_ids[1]]["available"] == 1
+    assert "Insufficient stock" in errors[product_ids[1]]["detail"]
+    assert errors[10**9]["detail"] == "Product not found"
+
+    assert test_client.get(f"/products/{product_ids[0]}").json()["stock"] == 5
+    assert test_client.get(f"/products/{product_ids[1]}").json()["stock"] == 1
+
+    too_big = [{"product_id": product_ids[0], "quantity": 1}] * 501
+    assert test_client.post(f"/orders/{order_id}/items:batch", json=too_big).status_code == 422
+
+
+def test_export_orders(test_client: TestClient):
+    client_id = test_client.post("/clients/", json={"name": "Export Client", "address": "Export St"}).json()["id"]
+    category_id = test_client.post("/categories/", json={"name": "Export Category"}).json()["id"]
+    product_id = test_client.post("/products/", json={
+        "name": "Export Product", "price": 25, "category_id": category_id, "initial_stock": 10,
+    }).json()["id"]
+    filled = test_client.post("/orders/", json={"client_id": client_id}).json()
+    test_client.post(f"/orders/{filled['id']}/items", json={"product_id": product_id, "quantity": 2})
+    empty = test_client.post("/orders/", json={"client_id": client_id}).json()
+
+    params = {"from": filled["created_at"], "status": "NEW"}
+    ndjson = test_client.get("/orders/export", params=params)
+    assert ndjson.status_code == 200
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    documents = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [doc["id"] for doc in documents][-2:] == [filled["id"], empty["id"]]
+    assert documents[-2]["items"][0]["quantity"] == 2
+    assert documents[-2]["total_amount"] == 50
+
+    rows = list(csv.reader(io.StringIO(test_client.get("/orders/export", params={**params, "format": "csv"}).text)))
+    assert rows[0][:2] == ["order_id", "client_id"]
+    assert rows[-2][0] == str(filled["id"]) and rows[-2][4:7] == [str(product_id), "Export Product", "2"]
+    assert rows[-1][0] == str(empty["id"]) and rows[-1][4:] == ["", "", "", "", ""]
+
+    until_empty = test_client.get("/orders/export", params={**params, "to": empty["created_at"]}).text
+    assert [json.loads(line)["id"] for line in until_empty.splitlines()][-1] == filled["id"]
+    assert test_client.get("/orders/export", params={"status": "LOST"}).status_code == 422
+
+
+def test_order_status_transitions(test_client: TestClient):
+    client_id = test_client.post("/clients/", json={"name": "Status Client", "address": "Status St"}).json()["id"]
+    category_id = test_client.post("/categories/", json={"name": "Status Category"}).json()["id"]
+    product_ids = [
+        test_client.post("/products/", json={
+            "name": name, "price": 10, "category_id": category_id, "initial_stock": 20
+        }).json()["id"]
+        for name in ("Status A", "Status B")
+    ]
+    order_ids = []
+    for quantity in (3, 4, 5):
+        order_id = test_client.post("/orders/", json={"client_id": client_id}).json()["id"]
+        for product_id in product_ids:
+            test_client.post(f"/orders/{order_id}/items", json={"product_id": product_id, "quantity": quantity})
+        order_ids.append(order_id)
+    assert test_client.get(f"/products/{product_ids[0]}").json()["stock"] == 8
+
+    processing = test_client.patch(f"/orders/{order_ids[0]}/status", json={"status": "PROCESSING"})
+    assert processing.status_code == 200
+    assert processing.json()["status"] == "PROCESSING"
+    # Состав заказа после начала сборки не меняется.
+    locked = test_client.post(f"/orders/{order_ids[0]}/items", json={"product_id": product_ids[0], "quantity": 1})
+    assert locked.status_code == 409
+    assert test_client.patch(f"/orders/{order_ids[0]}/status", json={"status": "NEW"}).status_code == 409
+    assert test_client.patch(f"/orders/{10**9}/status", json={"status": "CANCELLED"}).status_code == 404
+    assert test_client.patch(f"/orders/{order_ids[0]}/status", json={"status": "COMPLETED"}).status_code == 200
+
+    bulk = test_client.post("/orders/status:bulk", json={
+        "order_ids": [order_ids[2], order_ids[1], order_ids[0], order_ids[1], 10**9], "status": "CANCELLED",
+    })
+    assert bulk.status_code == 200
+    data = bulk.json()
+    assert (data["updated"], data["rejected"]) == (2, 2)
+    results = {result["order_id"]: result for result in data["results"]}
+    assert results[order_ids[1]] == {
+        "order_id": order_ids[1], "previous_status": "NEW", "status": "CANCELLED", "updated": True, "detail": None,
+    }
+    assert results[order_ids[0]]["detail"] == "Cannot change status from COMPLETED to CANCELLED"
+    assert results[10**9]["detail"] == "Order not found"
+    # Отмененные заказы 2 и 3 вернули на склад 4 + 5 штук каждого товара.
+    for product_id in product_ids:
+        assert test_client.get(f"/products/{product_id}").json()["stock"] == 17
+
+    too_many = test_client.post("/orders/status:bulk", json={"order_ids": list(range(10_001)), "status": "CANCELLED"})
+    assert too_many.status_code == 422
+
+
+def test_batch_get_keeps_request_order_and_reports_missing(test_client: TestClient):
+    client_ids = [
+        test_client.post("/clients/", json={"name": name, "address": "Batch St"}).json()["id"]
+        for name in ("Batch A", "Batch B")
+    ]
+    category_id = test_client.post("/categories/", json={"name": "Batch Category"}).json()["id"]
+    product_ids = [
+        test_client.post("/products/", json={
+            "name": name, "price": 2, "category_id": category_id, "initial_stock": 10
+        }).json()["id"]
+        for name in ("Batch X", "Batch Y")
+    ]
+    order_ids = [test_client.post("/orders/", json={"client_id": client_id}).json()["id"] for client_id in client_ids]
+    test_client.post(f"/orders/{order_ids[1]}/items", json={"product_id": product_ids[0], "quantity": 3})
+
+    clients = test_client.post("/clients/batch:get", json={"ids": [client_ids[1], 10**9, client_ids[0]]}).json()
+    assert [client["name"] for client in clients["items"]] == ["Batch B", "Batch A"]
+    assert clients["missing"] == [10**9]
+
+    products = test_client.post("/products/batch:get", json={"ids": [product_ids[1], product_ids[0], product_ids[1]]})
+    assert [(product["id"], product["stock"]) for product in products.json()["items"]] == [
+        (product_ids[1], 10), (product_ids[0], 7),
+    ]
+    assert products.json()["missing"] == []
+
+    orders = test_client.post("/orders/batch:get", json={"ids": [10**9, order_ids[1], order_ids[0]]}).json()
+    assert [order["id"] for order in orders["items"]] == [order_ids[1], order_ids[0]]
+    assert orders["items"][0]["items"][0]["quantity"] == 3
+    assert orders["items"][0]["total_amount"] == 6
+    assert orders["items"][1]["items"] == []
+    assert orders["missing"] == [10**9]
+
+    assert test_client.post("/orders/batch:get", json={"ids": []}).status_code == 422
+    assert test_client.post("/products/batch:get", json={"ids": list(range(1001))}).status_code == 422
@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+
+
+def _walk_with_cursor(test_client: TestClient, url: str, limit: int) -> list:
+    """Проходит все страницы по курсорам из X-Next-Cursor и возвращает все элементы."""
+    items, params = [], {"limit": limit}
+    while True:
+        res = test_client.get(url, params=params)
+        assert res.status_code == 200
+        items.extend(res.json())
+        next_cursor = res.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            return items
+        params = {"limit": limit, "cursor": next_cursor}
+
+
+def test_cursor_pagination_matches_offset(test_client: TestClient):
+    client_id = test_client.post("/clients/", json={"name": "Pager", "address": "Page St"}).json()["id"]
+    for _ in range(3):
+        assert test_client.post("/orders/", json={"client_id": client_id}).status_code == 201
+
+    for url in ["/orders/", "/products/", "/clients/", "/inventory/"]:
+        by_offset = test_client.get(url, params={"limit": 10_000}).json()
+        assert _walk_with_cursor(test_client, url, limit=2) == by_offset
+
+
+def test_invalid_cursor_is_rejected(test_client: TestClient):
+    res = test_client.get("/orders/", params={"cursor": "not-a-cursor"})
+    assert res.status_code == 400
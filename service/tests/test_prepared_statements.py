@@ -0,0 +1,48 @@
+import pytest
+from fastapi.testclient import TestClient
+from psycopg import AsyncConnection
+
+from db.session import DATABASE_URL, InstrumentedCursor, get_prepared_statements, prepared_statement
+
+_PREPARED = prepared_statement("test_prepared", "SELECT %s::int + 1")
+_UNPREPARED = prepared_statement("test_unprepared", "SELECT %s::int + 2", prepare=False)
+
+
+async def _prepared_on_new_connection() -> set[str]:
+    async with await AsyncConnection.connect(DATABASE_URL, cursor_factory=InstrumentedCursor) as conn:
+        for value in range(10):
+            assert (await (await conn.execute(_PREPARED, (value,))).fetchone())[0] == value + 1
+            assert (await (await conn.execute(_UNPREPARED, (value,))).fetchone())[0] == value + 2
+        rows = await (await conn.execute("SELECT statement FROM pg_prepared_statements")).fetchall()
+        return {row[0] for row in rows}
+
+
+def test_registered_statements_are_prepared_per_connection(test_client: TestClient):
+    # Каждое новое соединение (как после пересоздания в пуле) подготавливает запрос заново.
+    for _ in range(2):
+        prepared = test_client.portal.call(_prepared_on_new_connection)
+        assert any("+ 1" in statement for statement in prepared)
+        assert not any("+ 2" in statement for statement in prepared)
+
+
+def test_registry_rejects_conflicting_names():
+    assert prepared_statement("test_prepared", "SELECT %s::int + 1") is _PREPARED
+    with pytest.raises(ValueError):
+        prepared_statement("test_prepared", "SELECT 1")
+    names = {statement.name for statement in get_prepared_statements()}
+    assert {"get_product", "order_details", "lock_order", "change_order_status"} <= names
+
+
+def test_hot_endpoints_use_prepared_statements(test_client: TestClient):
+    client_id = test_client.post("/clients/", json={"name": "Prepared", "address": "Plan St"}).json()["id"]
+    category_id = test_client.post("/categories/", json={"name": "Prepared Statements"}).json()["id"]
+    product_id = test_client.post("/products/", json={
+        "name": "Prepared Product", "price": 5, "category_id": category_id, "initial_stock": 10,
+    }).json()["id"]
+    order_id = test_client.post("/orders/", json={"client_id": client_id}).json()["id"]
+    for _ in range(3):
+        response = test_client.post(f"/orders/{order_id}/items", json={"product_id": product_id, "quantity": 1})
+        assert response.status_code == 200
+    assert response.json()["items"][0]["quantity"] == 3
+    assert test_client.get(f"/products/{product_id}").json()["stock"] == 7
+    assert test_client.get(f"/orders/{order_id}").json()["total_amount"] == 15
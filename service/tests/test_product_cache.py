@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import psycopg
+from fastapi.testclient import TestClient
+
+from cache.ttl import CACHE_REQUESTS, TTLCache
+from db.session import DATABASE_URL
+
+
+def test_ttl_cache_evicts_least_recently_used_and_discards_keys():
+    async def scenario():
+        cache = TTLCache(ttl=60, max_size=2, name="test_lru")
+        for key in ("a", "b"):
+            await cache.get(key, lambda key=key: asyncio.sleep(0, key))
+        await cache.get("a", lambda: asyncio.sleep(0, "stale"))
+        await cache.get("c", lambda: asyncio.sleep(0, "c"))
+        cached = set(cache._entries)
+        cache.discard("a")
+        reloaded = await cache.get("a", lambda: asyncio.sleep(0, "new"))
+        return cached, reloaded.value
+
+    assert asyncio.run(scenario()) == ({"a", "c"}, "new")
+    assert CACHE_REQUESTS.value(("test_lru", "hit")) == 1
+    assert CACHE_REQUESTS.value(("test_lru", "miss")) == 4
+
+
+def _get_until(test_client: TestClient, url: str, expected: dict) -> dict:
+    # Уведомление приходит асинхронно, после COMMIT.
+    deadline = time.monotonic() + 5
+    while True:
+        body = test_client.get(url).json()
+        if all(body[key] == value for key, value in expected.items()) or time.monotonic() > deadline:
+            return body
+        time.sleep(0.05)
+
+
+def test_product_card_is_cached_and_invalidated(test_client: TestClient):
+    category_id = test_client.post("/categories/", json={"name": "Product Cache"}).json()["id"]
+    product_id = test_client.post("/products/", json={
+        "name": "Cached Product", "price": 10, "category_id": category_id, "initial_stock": 5,
+    }).json()["id"]
+    url = f"/products/{product_id}"
+    hits = CACHE_REQUESTS.value(("product_catalog", "hit"))
+    assert test_client.get(url).json()["name"] == "Cached Product"
+    assert test_client.get(url).json()["name"] == "Cached Product"
+    assert CACHE_REQUESTS.value(("product_catalog", "hit")) == hits + 1
+
+    # Остаток по умолчанию читается заново, даже когда каталог взят из кэша.
+    with psycopg.connect(DATABASE_URL) as conn:
+        conn.execute("UPDATE inventory SET stock = 3 WHERE product_id = %s", (product_id,))
+    assert test_client.get(url).json()["stock"] == 3
+
+    response = test_client.patch(url, json={"name": "Renamed Product", "price": 12, "category_id": category_id})
+    assert response.status_code == 200
+    assert test_client.get(url).json()["name"] == "Renamed Product"
+
+    # Изменение в обход сервиса (другой воркер, скрипт) доходит через product_changed.
+    with psycopg.connect(DATABASE_URL) as conn:
+        conn.execute("UPDATE products SET price = 99 WHERE id = %s", (product_id,))
+    assert _get_until(test_client, url, {"price": 99})["price"] == 99
+
+    assert test_client.delete(url).status_code == 204
+    assert test_client.get(url).status_code == 404
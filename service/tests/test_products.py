@@ -0,0 +1,87 @@
+from fastapi.testclient import TestClient
+
+from db import product_import
+
+
+def test_import_products_csv(test_client: TestClient):
+    category_id = test_client.post("/categories/", json={"name": "Import Category"}).json()["id"]
+    existing = test_client.post("/products/", json={
+        "name": "Old name", "price": 1.0, "category_id": category_id, "initial_stock": 3
+    }).json()
+
+    csv_body = "\n".join([
+        "id,name,price,category_id,initial_stock",
+        f",Imported A,10.50,{category_id},7",
+        f"{existing['id']},New name,2.00,{category_id},",
+        f",Broken price,abc,{category_id},1",
+        ",No category,1.00,999999999,1",
+        f",Too,many,fields,{category_id},1,extra",
+    ])
+    res = test_client.post("/products/import", content=csv_body, headers={"Content-Type": "text/csv"})
+    assert res.status_code == 200
+    result = res.json()
+    assert result["received"] == 5
+    assert result["inserted"] == 1
+    assert result["updated"] == 1
+    assert result["rejected"] == 3
+    assert [(e["line"], e["detail"]) for e in result["errors"]] == [
+        (4, "invalid price"), (5, "category not found"), (6, "malformed line"),
+    ]
+
+    # Остаток существующего товара не указан в файле и не меняется
+    updated = test_client.get(f"/products/{existing['id']}").json()
+    assert (updated["name"], updated["price"], updated["stock"]) == ("New name", 2.0, 3)
+
+
+def test_import_products_csv_multiline_field(test_client: TestClient):
+    category_id = test_client.post("/categories/", json={"name": "Import Multiline"}).json()["id"]
+    csv_body = "\n".join([
+        "name,price,category_id,initial_stock",
+        f'"Chair\nOak",3.00,{category_id},1',
+        f"Broken price,abc,{category_id},1",
+        f'"Table ""Nordic""\n\nOak ""XL""",4.00,{category_id},1',
+        # Кавычка в середине поля без кавычек - обычный символ, а не начало многострочной записи
+        f'12" pan,5.00,{category_id},1',
+        f"Lid,6.00,{category_id},1",
+    ])
+    res = test_client.post("/products/import", content=csv_body, headers={"Content-Type": "text/csv"})
+    assert res.status_code == 200
+    result = res.json()
+    assert (result["received"], result["inserted"], result["rejected"]) == (5, 4, 1)
+    # Номер строки ошибки - физический, с учетом перевода строки внутри кавычек
+    assert [(e["line"], e["detail"]) for e in result["errors"]] == [(4, "invalid price")]
+
+    names = [product["name"] for product in test_client.get(
+        "/products/search", params={"category_id": category_id, "sort": "price"}
+    ).json()]
+    assert names == ["Chair\nOak", 'Table "Nordic"\n\nOak "XL"', '12" pan', "Lid"]
+
+
+def test_import_products_csv_unterminated_quote_is_bounded(test_client: TestClient, monkeypatch):
+    category_id = test_client.post("/categories/", json={"name": "Import Unterminated"}).json()["id"]
+    monkeypatch.setattr(product_import, "MAX_RECORD_SIZE", 100)
+    csv_body = "\n".join([
+        "name,price,category_id",
+        f'"Open quote,1.00,{category_id}',
+        *(f"Filler {i},1.00,{category_id}" for i in range(10)),
+        f"After,2.00,{category_id}",
+    ])
+    res = test_client.post("/products/import", content=csv_body, headers={"Content-Type": "text/csv"})
+    result = res.json()
+    # Запись с незакрытой кавычкой обрывается на пределе размера, дальше разбор идет заново
+    assert [(e["line"], e["detail"]) for e in result["errors"]] == [(2, "malformed line")]
+    names = [product["name"] for product in test_client.get(
+        "/products/search", params={"category_id": category_id}
+    ).json()]
+    assert "After" in names
+
+
+def test_import_products_ndjson(test_client: TestClient):
+    category_id = test_client.post("/categories/", json={"name": "Import NDJSON"}).json()["id"]
+    body = (
+        f'{{"name": "Line A", "price": 5, "category_id": {category_id}, "initial_stock": 2}}\n'
+        "not json\n"
+    )
+    res = test_client.post("/products/import", params={"format": "ndjson"}, content=body)
+    assert res.status_code == 200
+    assert (res.json()["inserted"], res.json()["rejected"]) == (1, 1)
@@ -0,0 +1,73 @@
+import asyncio
+
+import psycopg
+from fastapi.testclient import TestClient
+
+from db import session
+from db.profiler import DB_PROFILER_SLOW_MS, ProfilerMiddleware, profiler, redact_params
+from db.session import DATABASE_URL
+
+
+def test_redact_params_keeps_ids_and_hides_strings():
+    assert redact_params((42, "secret address", [1, 2, 3], None)) == [42, "<str:14>", "<list:3>", None]
+    assert redact_params({"id": 7, "name": "Bob"}) == {"id": 7, "name": "<str:3>"}
+
+
+def test_slow_queries_are_captured_with_plans(test_client: TestClient):
+    profiler.enabled, profiler.slow_ms = True, 0
+    test_client.portal.call(profiler.start, DATABASE_URL)
+    try:
+        profiler.clear()
+        client_id = test_client.post("/clients/", json={"name": "Profiled", "address": "Slow St"}).json()["id"]
+        assert test_client.get(f"/clients/{client_id}").status_code == 200
+
+        async def wait_for_plans():
+            for _ in range(100):
+                if all(c["plan"] or c["plan_error"] for c in profiler.slow_queries):
+                    return
+                await asyncio.sleep(0.05)
+
+        test_client.portal.call(wait_for_plans)
+        report = test_client.get("/admin/slow-queries").json()
+    finally:
+        test_client.portal.call(profiler.stop)
+        profiler.enabled, profiler.slow_ms = False, DB_PROFILER_SLOW_MS
+
+    assert report["enabled"] is True
+    captures = report["slow_queries"]
+    insert = next(c for c in captures if c["query"].startswith("INSERT INTO clients"))
+    assert insert["params"] == ["<str:8>", "<str:7>"]
+    assert insert["route"] == "POST /clients/"
+    # INSERT не выполняется в READ ONLY транзакции, поэтому план без ANALYZE.
+    assert "actual time" not in insert["plan"]
+    select = next(c for c in captures if c["route"] == "GET /clients/{client_id}")
+    assert select["params"] == [client_id]
+    assert "actual time" in select["plan"] and "Buffers" in select["plan"]
+    # EXPLAIN не повторил вставку.
+    with psycopg.connect(DATABASE_URL) as conn:
+        assert conn.execute("SELECT count(*) FROM clients WHERE id = %s", (client_id,)).fetchone()[0] == 1
+
+    assert test_client.delete("/admin/slow-queries").status_code == 204
+    assert test_client.get("/admin/slow-queries").json()["slow_queries"] == []
+
+
+def test_repeated_statements_are_flagged_as_n_plus_one(test_client: TestClient):
+    async def handler(scope, receive, send):
+        async with session.connection_pool.connection() as conn:
+            for product_id in range(3):
+                await conn.execute("SELECT name FROM products WHERE id = %s", (product_id,))
+            await conn.execute("SELECT count(*) FROM clients")
+
+    app = ProfilerMiddleware(handler)
+    profiler.enabled, profiler.n_plus_one = True, 3
+    try:
+        profiler.clear()
+        test_client.portal.call(app, {"type": "http", "method": "GET", "path": "/loop"}, None, None)
+    finally:
+        profiler.enabled, profiler.n_plus_one = False, 10
+
+    [report] = profiler.n_plus_one_reports
+    assert report["route"] == "GET <unmatched>"
+    assert report["query"] == "SELECT name FROM products WHERE id = %s"
+    # Плюс проверка соединения пулом при выдаче.
+    assert report["repeats"] == 3 and report["statements"] >= 4
@@ -0,0 +1,55 @@
+from datetime import date
+
+import psycopg
+from fastapi.testclient import TestClient
+
+from db.session import DATABASE_URL
+from jobs.rollups import date_chunks, refresh_sales_rollups
+
+
+def _rollups(product_id: int) -> tuple[list, list]:
+    with psycopg.connect(DATABASE_URL) as conn:
+        hourly = conn.execute(
+            "SELECT total_qty_sold, total_amount_sold FROM hourly_product_sales WHERE product_id = %s", (product_id,)
+        ).fetchall()
+        daily = conn.execute(
+            "SELECT sale_date, total_qty_sold FROM daily_product_sales WHERE product_id = %s", (product_id,)
+        ).fetchall()
+    return [(qty, float(amount)) for qty, amount in hourly], daily
+
+
+def test_incremental_rollups_follow_order_changes(test_client: TestClient):
+    client_id = test_client.post("/clients/", json={"name": "Rollup Buyer", "address": "Rollup St"}).json()["id"]
+    category_id = test_client.post("/categories/", json={"name": "Rollup Category"}).json()["id"]
+    product_id = test_client.post("/products/", json={
+        "name": "Rollup Product", "price": 3, "category_id": category_id, "initial_stock": 100,
+    }).json()["id"]
+    order_id = test_client.post("/orders/", json={"client_id": client_id}).json()["id"]
+    test_client.post(f"/orders/{order_id}/items", json={"product_id": product_id, "quantity": 4})
+
+    # Заказы в статусе NEW в витрину не попадают.
+    test_client.portal.call(refresh_sales_rollups)
+    assert _rollups(product_id) == ([], [])
+
+    assert test_client.patch(f"/orders/{order_id}/status", json={"status": "PROCESSING"}).status_code == 200
+    with psycopg.connect(DATABASE_URL) as conn:
+        order_day = conn.execute("SELECT created_at::date FROM orders WHERE id = %s", (order_id,)).fetchone()[0]
+    assert test_client.portal.call(refresh_sales_rollups) >= 1
+    assert _rollups(product_id) == ([(4, 12.0)], [(order_day, 4)])
+
+    with psycopg.connect(DATABASE_URL) as conn:
+        conn.execute("UPDATE order_items SET qty = 6 WHERE order_id = %s", (order_id,))
+    test_client.portal.call(refresh_sales_rollups)
+    assert _rollups(product_id) == ([(6, 18.0)], [(order_day, 6)])
+
+    assert test_client.delete(f"/orders/{order_id}").status_code == 204
+    test_client.portal.call(refresh_sales_rollups)
+    assert _rollups(product_id) == ([], [])
+
+
+def test_backfill_date_chunks():
+    assert date_chunks(date(2024, 1, 1), date(2024, 1, 8), 3) == [
+        (date(2024, 1, 1), date(2024, 1, 4)),
+        (date(2024, 1, 4), date(2024, 1, 7)),
+        (date(2024, 1, 7), date(2024, 1, 8)),
+    ]
@@ -0,0 +1,43 @@
+import psycopg
+from fastapi.testclient import TestClient
+
+from db.session import DATABASE_URL
+from jobs.sales_counters import compact_sales_counters
+
+
+def _counters(product_id: int) -> tuple[int, int, int]:
+    """(products.total_sold, число несжатых дельт, product_total_sold)."""
+    with psycopg.connect(DATABASE_URL) as conn:
+        return conn.execute(
+            """
+            SELECT p.total_sold,
+                   (SELECT count(*) FROM product_sales_deltas d WHERE d.product_id = p.id),
+                   product_total_sold(p.id)
+            FROM products p WHERE p.id = %s
+            """,
+            (product_id,),
+        ).fetchone()
+
+
+def test_total_sold_is_exact_before_and_after_compaction(test_client: TestClient):
+    client_id = test_client.post("/clients/", json={"name": "Counter Buyer", "address": "Counter St"}).json()["id"]
+    category_id = test_client.post("/categories/", json={"name": "Counter Category"}).json()["id"]
+    product_id = test_client.post("/products/", json={
+        "name": "Counter Product", "price": 1, "category_id": category_id, "initial_stock": 100,
+    }).json()["id"]
+    order_id = test_client.post("/orders/", json={"client_id": client_id}).json()["id"]
+
+    test_client.post(f"/orders/{order_id}/items", json={"product_id": product_id, "quantity": 3})
+    test_client.post(f"/orders/{order_id}/items", json={"product_id": product_id, "quantity": 2})
+    assert _counters(product_id)[2] == 5
+    # Поиск отдает точное значение, хотя дельты еще не перенесены в products.total_sold
+    found = test_client.get("/products/search", params={"category_id": category_id, "sort": "-total_sold"}).json()
+    assert [product["total_sold"] for product in found] == [5]
+
+    assert test_client.portal.call(compact_sales_counters) >= 1
+    assert _counters(product_id) == (5, 0, 5)
+
+    assert test_client.delete(f"/orders/{order_id}").status_code == 204
+    assert _counters(product_id)[2] == 0
+    test_client.portal.call(compact_sales_counters)
+    assert _counters(product_id) == (0, 0, 0)
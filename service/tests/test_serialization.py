@@ -0,0 +1,28 @@
+from decimal import Decimal
+
+import orjson
+from fastapi.testclient import TestClient
+
+from schemas.product import ProductResponse
+from utils.serialization import rows_response
+
+
+def test_rows_response_uses_model_field_names():
+    response = rows_response([(1, "Чайник", Decimal("19.90"), 7, 3)], ProductResponse)
+    assert response.media_type == "application/json"
+    assert orjson.loads(response.body) == [
+        {"id": 1, "name": "Чайник", "price": 19.9, "category_id": 7, "stock": 3}
+    ]
+
+
+def test_list_endpoints_match_single_item_schema(test_client: TestClient):
+    products = test_client.get("/products/", params={"limit": 5}).json()
+    assert products
+    for item in products:
+        assert ProductResponse.model_validate(item) == ProductResponse.model_validate(
+            test_client.get(f"/products/{item['id']}").json()
+        )
+    # Схема OpenAPI осталась прежней: список описан через response_model.
+    schema = test_client.get("/openapi.json").json()
+    items = schema["paths"]["/products/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert items["items"]["$ref"].endswith("/ProductResponse")
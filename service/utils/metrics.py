@@ -0,0 +1,175 @@
+"""
+Метрики в текстовом формате Prometheus.
+
+Минимальные счетчики, gauge и гистограммы без внешних зависимостей: наблюдение - это
+поиск корзины bisect и пара сложений в словаре, без блокировок, поэтому метрики
+рассчитаны на один event loop в процессе. Метки передаются кортежем значений в
+порядке labelnames. При нескольких воркерах uvicorn каждый отдает свои значения, и
+Prometheus собирает их как отдельные цели.
+
+Здесь же ASGI-middleware с метриками HTTP: длительность запросов по шаблону маршрута
+(/orders/{order_id}, а не конкретный путь) и число запросов в обработке. Метрики БД
+определены в db/session.py, отдаются они через GET /metrics (routes/metrics_router.py).
+"""
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Iterable
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type}\n"
+        return header + "".join(line + "\n" for line in self._samples())
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: tuple = ()) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _samples(self):
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, labels: tuple = ()):
+        self._values[labels] = value
+
+    def dec(self, labels: tuple = (), amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # На каждый набор меток: счетчики по корзинам (последняя - +Inf), затем сумма.
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, labels: tuple = ()):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 2)
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def count(self, labels: tuple = ()) -> int:
+        state = self._values.get(labels)
+        return sum(state[:-1]) if state else 0
+
+    def _samples(self):
+        for labels, state in self._values.items():
+            cumulative = 0
+            for bound, observed in zip((*self.buckets, float("inf")), state):
+                cumulative += observed
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {repr(state[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric):
+        self._metrics.append(metric)
+
+    def on_collect(self, collector: Callable[[], None]):
+        """Регистрирует функцию, которая обновляет gauge перед каждой выгрузкой метрик."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        return "".join(metric.render() for metric in self._metrics)
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being processed.")
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    Чистое ASGI-middleware (не BaseHTTPMiddleware): не создает промежуточных объектов
+    запроса и задач, стоимость - единицы микросекунд на запрос. Шаблон маршрута FastAPI
+    кладет в scope["route"] при маршрутизации; время считается до отправки последнего
+    байта ответа, включая потоковые.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                perf_counter() - started,
+                (scope["method"], route.path if route is not None else UNMATCHED_ROUTE, status_code),
+            )
@@ -0,0 +1,52 @@
+"""
+Keyset-пагинация (курсоры).
+
+Курсор - это непрозрачная для клиента base64-строка с ключом сортировки последней
+строки страницы. Следующая страница выбирается условием "ключ строго после курсора",
+поэтому запрос идет по индексу и не зависит от глубины страницы, в отличие от OFFSET.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Sequence
+
+from fastapi import HTTPException, Response, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    # NUMERIC кладется строкой, чтобы ключ не терял точность во float.
+    payload = [
+        v.isoformat() if isinstance(v, datetime) else str(v) if isinstance(v, Decimal) else v
+        for v in values
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> list:
+    """Раскодирует курсор и приводит значения к ожидаемым типам (int, str, Decimal, datetime...)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return [
+            datetime.fromisoformat(value) if kind is datetime else kind(value)
+            for value, kind in zip(values, types)
+        ]
+    except (ValueError, TypeError, ArithmeticError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def set_next_cursor(response: Response, rows: Sequence, limit: int, *key_columns: int):
+    """
+    Если страница заполнена целиком, кладет в заголовок X-Next-Cursor курсор
+    по ключевым колонкам последней строки. Пустой заголовок не отправляется -
+    это признак последней страницы.
+    """
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*(last[i] for i in key_columns))
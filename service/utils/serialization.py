@@ -0,0 +1,55 @@
+"""
+Быстрая отдача списков.
+
+Списочные эндпоинты сериализуют кортежи строк прямо в JSON через orjson, не создавая
+Pydantic-модель на каждую строку и не проходя повторную валидацию по response_model
+(FastAPI пропускает ее, если обработчик вернул готовый Response). response_model у
+маршрутов остается, поэтому схема OpenAPI не меняется. Имена полей берутся из модели,
+так что порядок колонок в SELECT должен совпадать с порядком полей в схеме.
+"""
+from decimal import Decimal
+from typing import Any, Iterable, Mapping, Sequence, Type
+
+import orjson
+from fastapi import Response, status
+from pydantic import BaseModel
+
+
+def _default(value: Any) -> Any:
+    # NUMERIC приходит из psycopg как Decimal; в схемах такие поля объявлены float.
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def rows_json(rows: Sequence[Sequence[Any]], model: Type[BaseModel]) -> bytes:
+    """JSON-массив объектов из строк запроса с именами полей model."""
+    fields = tuple(model.model_fields)
+    return orjson.dumps([dict(zip(fields, row)) for row in rows], default=_default)
+
+
+def rows_response(
+    rows: Sequence[Sequence[Any]],
+    model: Type[BaseModel],
+    status_code: int = status.HTTP_200_OK,
+) -> Response:
+    """Собирает JSON-массив объектов из строк запроса, используя имена полей model."""
+    return Response(content=rows_json(rows, model), media_type="application/json", status_code=status_code)
+
+
+def batch_json(ids: Iterable[int], documents: Mapping[int, bytes]) -> bytes:
+    """
+    Тело ответа batch-get {"items": [...], "missing": [...]}: готовые JSON-документы
+    объектов в порядке ids (повторы - один раз), ненайденные id - в missing.
+    """
+    ids = dict.fromkeys(ids)
+    items = [documents[object_id] for object_id in ids if object_id in documents]
+    missing = [object_id for object_id in ids if object_id not in documents]
+    return b'{"items":[' + b",".join(items) + b'],"missing":' + orjson.dumps(missing) + b"}"
+
+
+def rows_batch_response(ids: Iterable[int], rows: Sequence[Sequence[Any]], model: Type[BaseModel]) -> Response:
+    """Ответ batch-get из строк запроса; первая колонка - id, остальные поля - как в rows_json."""
+    fields = tuple(model.model_fields)
+    documents = {row[0]: orjson.dumps(dict(zip(fields, row)), default=_default) for row in rows}
+    return Response(content=batch_json(ids, documents), media_type="application/json")